@@ -1,59 +1,138 @@
-from typing import Any, List, Optional
+from typing import Any, Callable, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from app.schemas.chat import ChatRequest, ChatResponse, ChatMessage
+from app.schemas.chat import ChatRequest, ChatResponse, ChatMessage, ConversationResponse
 from app.services.chat import ChatService
+from app.services.container import get_chat_service
 from app.services.auth import get_current_user, User
 
 
 router = APIRouter()
 
+async def resolve_messages(
+    request: ChatRequest,
+    current_user: User,
+    chat_service: ChatService
+) -> List[ChatMessage]:
+    """
+    대화 ID 모드면 저장된 이력에 새 메시지를 붙이고, 오래된 턴은 토큰 예산에 맞게 잘라내거나 요약으로 대체합니다.
+    """
+    messages = await chat_service.load_conversation(
+        request.conversation_id, request.messages, current_user.user_id, current_user.org_id
+    )
+    return await chat_service.prepare_history(
+        messages, request.model, request.max_tokens, current_user.org_id, current_user.user_id
+    )
+
+def conversation_saver(
+    request: ChatRequest,
+    current_user: User,
+    chat_service: ChatService
+) -> Optional[Callable[[str], None]]:
+    """
+    스트림 완료 시 새 메시지와 응답을 대화에 저장하는 콜백을 반환합니다. (대화 ID 모드가 아니면 None)
+    """
+    if request.conversation_id is None:
+        return None
+    return lambda reply: chat_service.save_conversation_turn(
+        request.conversation_id, request.messages, reply, current_user.user_id, current_user.org_id
+    )
+
+@router.post("/conversations", response_model=ConversationResponse)
+async def create_conversation(
+    current_user: User = Depends(get_current_user),
+    chat_service: ChatService = Depends(get_chat_service)
+) -> Any:
+    """
+    서버 측 대화를 생성합니다. 이후 요청에 conversation_id를 지정하면 새 메시지만 보내면 됩니다.
+    """
+    if chat_service.conversation_store is None:
+        raise HTTPException(status_code=400, detail="대화 저장소가 비활성화되어 있습니다.")
+    conversation_id = await chat_service.conversation_store.create(current_user.user_id, current_user.org_id)
+    return ConversationResponse(conversation_id=conversation_id)
+
+@router.delete("/conversations/{conversation_id}")
+async def delete_conversation(
+    conversation_id: str,
+    current_user: User = Depends(get_current_user),
+    chat_service: ChatService = Depends(get_chat_service)
+) -> Any:
+    """
+    서버 측 대화를 삭제합니다.
+    """
+    if chat_service.conversation_store is None:
+        raise HTTPException(status_code=400, detail="대화 저장소가 비활성화되어 있습니다.")
+    await chat_service.conversation_store.delete(conversation_id, current_user.user_id, current_user.org_id)
+    return {"success": True}
+
 @router.post("/completions", response_model=ChatResponse)
 async def create_chat_completion(
     request: ChatRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    chat_service: ChatService = Depends(get_chat_service)
 ) -> Any:
     """
     대화 메시지를 받아 AI의 응답을 반환합니다.
     """
     try:
-        chat_service = ChatService()
+        messages = await resolve_messages(request, current_user, chat_service)
         response = await chat_service.generate_completion(
-            messages=request.messages,
+            messages=messages,
             model=request.model,
             temperature=request.temperature,
             max_tokens=request.max_tokens,
             user_id=current_user.user_id,
             org_id=current_user.org_id
         )
+        chat_service.save_conversation_turn(
+            request.conversation_id, request.messages, response.choices[0].message.content,
+            current_user.user_id, current_user.org_id
+        )
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/stream")
 async def create_chat_stream(
     request: ChatRequest,
-    current_user: User = Depends(get_current_user)
+    http_request: Request,
+    current_user: User = Depends(get_current_user),
+    chat_service: ChatService = Depends(get_chat_service)
 ) -> StreamingResponse:
     """
     대화 메시지를 받아 AI의 응답을 스트리밍으로 반환합니다.
     """
     try:
-        chat_service = ChatService()
+        messages = await resolve_messages(request, current_user, chat_service)
+        # 스트림 시작 전에 한도 확인 (초과 시 429 응답)
+        admission = await chat_service.check_rate_limit(
+            messages=messages,
+            model=request.model,
+            max_tokens=request.max_tokens,
+            user_id=current_user.user_id,
+            org_id=current_user.org_id
+        )
         return StreamingResponse(
             chat_service.generate_stream(
-                messages=request.messages,
+                messages=messages,
                 model=request.model,
                 temperature=request.temperature,
                 max_tokens=request.max_tokens,
                 user_id=current_user.user_id,
-                org_id=current_user.org_id
+                org_id=current_user.org_id,
+                admission=admission,
+                is_disconnected=http_request.is_disconnected,
+                on_complete=conversation_saver(request, current_user, chat_service)
             ),
             media_type="text/event-stream"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -61,15 +140,16 @@ async def create_chat_stream(
 async def create_chat_with_context(
     request: ChatRequest, 
     background_tasks: BackgroundTasks,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    chat_service: ChatService = Depends(get_chat_service)
 ) -> Any:
     """
     대화 메시지와 함께 관련 문서 컨텍스트를 찾아 AI 응답을 생성합니다. (RAG)
     """
     try:
-        chat_service = ChatService()
+        messages = await resolve_messages(request, current_user, chat_service)
         response = await chat_service.generate_with_context(
-            messages=request.messages,
+            messages=messages,
             model=request.model,
             temperature=request.temperature,
             max_tokens=request.max_tokens,
@@ -77,6 +157,59 @@ async def create_chat_with_context(
             org_id=current_user.org_id,
             background_tasks=background_tasks
         )
+        chat_service.save_conversation_turn(
+            request.conversation_id, request.messages, response.choices[0].message.content,
+            current_user.user_id, current_user.org_id
+        )
         return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/with-context/stream")
+async def create_chat_with_context_stream(
+    request: ChatRequest,
+    http_request: Request,
+    current_user: User = Depends(get_current_user),
+    chat_service: ChatService = Depends(get_chat_service)
+) -> StreamingResponse:
+    """
+    관련 문서 컨텍스트를 찾아 AI 응답을 스트리밍으로 반환합니다. (RAG)
+    검색 결과는 답변보다 먼저 sources 이벤트로 전송됩니다.
+    """
+    try:
+        # 문서 검색을 먼저 시작하고, 검색과 병렬로 이력 정리/토큰 계산/한도 확인 (초과 시 429 응답)
+        search_task = await chat_service.start_context_search(request.messages, current_user.org_id)
+        try:
+            messages = await resolve_messages(request, current_user, chat_service)
+            admission = await chat_service.check_rate_limit(
+                messages=messages,
+                model=request.model,
+                max_tokens=request.max_tokens,
+                user_id=current_user.user_id,
+                org_id=current_user.org_id
+            )
+        except Exception:
+            if search_task is not None:
+                search_task.cancel()
+            raise
+        return StreamingResponse(
+            chat_service.generate_stream_with_context(
+                messages=messages,
+                model=request.model,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens,
+                user_id=current_user.user_id,
+                org_id=current_user.org_id,
+                admission=admission,
+                search_task=search_task,
+                is_disconnected=http_request.is_disconnected,
+                on_complete=conversation_saver(request, current_user, chat_service)
+            ),
+            media_type="text/event-stream"
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
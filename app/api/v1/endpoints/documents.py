@@ -1,4 +1,5 @@
 from typing import Any, List, Optional
+import hashlib
 import os
 from uuid import uuid4
 
@@ -10,7 +11,9 @@ from app.schemas.document import (
     DocumentSearchResponse, DocumentListResponse
 )
 from app.services.document import DocumentService
+from app.services.container import get_document_service
 from app.services.auth import get_current_user, User
+from app.core.config import settings
 
 router = APIRouter()
 
@@ -21,11 +24,13 @@ async def upload_document(
     description: Optional[str] = Form(None),
     category: Optional[str] = Form(None),
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    doc_service: DocumentService = Depends(get_document_service)
 ) -> Any:
     """
     지식 베이스용 문서를 업로드합니다.
     """
+    temp_file_path = None
     try:
         # 파일 확장자 검증
         file_ext = os.path.splitext(file.filename)[1].lower()
@@ -37,11 +42,23 @@ async def upload_document(
                 detail=f"지원되지 않는 파일 형식입니다. 지원: {', '.join(supported_formats)}"
             )
         
-        # 임시 파일로 저장
+        # 임시 파일로 저장 (고정 크기 조각 단위로 기록, 크기 제한 및 해시 계산)
         temp_file_path = f"temp_{uuid4()}{file_ext}"
+        hasher = hashlib.sha256()
+        file_size = 0
         with open(temp_file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                file_size += len(chunk)
+                if file_size > settings.UPLOAD_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"파일이 너무 큽니다. 최대 크기: {settings.UPLOAD_MAX_BYTES // (1024 * 1024)}MB"
+                    )
+                hasher.update(chunk)
+                buffer.write(chunk)
         
         # 문서 생성 요청 준비
         doc_create = DocumentCreate(
@@ -50,11 +67,12 @@ async def upload_document(
             category=category,
             file_path=temp_file_path,
             file_type=file_ext[1:],
-            file_name=file.filename
+            file_name=file.filename,
+            file_size=file_size,
+            content_hash=hasher.hexdigest()
         )
         
         # 문서 서비스 호출
-        doc_service = DocumentService()
         result = await doc_service.create_document(
             doc_create=doc_create,
             user_id=current_user.user_id,
@@ -67,10 +85,12 @@ async def upload_document(
     except Exception as e:
         # 에러 발생시 임시 파일 정리 시도
         try:
-            if os.path.exists(temp_file_path):
+            if temp_file_path and os.path.exists(temp_file_path):
                 os.remove(temp_file_path)
         except:
             pass
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/documents", response_model=DocumentListResponse)
@@ -78,13 +98,13 @@ async def list_documents(
     skip: int = 0,
     limit: int = 100,
     category: Optional[str] = None,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    doc_service: DocumentService = Depends(get_document_service)
 ) -> Any:
     """
     지식 베이스 문서 목록을 반환합니다.
     """
     try:
-        doc_service = DocumentService()
         return await doc_service.get_documents(
             org_id=current_user.org_id,
             skip=skip,
@@ -97,13 +117,13 @@ async def list_documents(
 @router.post("/search", response_model=DocumentSearchResponse)
 async def search_documents(
     query: DocumentSearchQuery,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    doc_service: DocumentService = Depends(get_document_service)
 ) -> Any:
     """
     벡터 DB를 사용하여 질문과 가장 관련 있는 문서 청크를 검색합니다.
     """
     try:
-        doc_service = DocumentService()
         return await doc_service.search_documents(
             query=query.query,
             org_id=current_user.org_id,
@@ -116,13 +136,13 @@ async def search_documents(
 @router.post("/query", response_model=DocumentSearchResponse)
 async def query_documents(
     query: DocumentSearchQuery,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    doc_service: DocumentService = Depends(get_document_service)
 ) -> Any:
     """
     질문에 대한 RAG 기반 응답을 생성합니다.
     """
     try:
-        doc_service = DocumentService()
         return await doc_service.query_documents(
             query=query.query,
             org_id=current_user.org_id,
@@ -134,13 +154,13 @@ async def query_documents(
 @router.delete("/documents/{document_id}", response_model=dict)
 async def delete_document(
     document_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    doc_service: DocumentService = Depends(get_document_service)
 ) -> Any:
     """
     지식 베이스 문서를 삭제합니다.
     """
     try:
-        doc_service = DocumentService()
         success = await doc_service.delete_document(
             document_id=document_id,
             org_id=current_user.org_id,
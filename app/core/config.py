@@ -52,6 +52,143 @@ class Settings(BaseSettings):
     MAX_TOKENS: int = 2048
     TEMPERATURE: float = 0.7
     
+    # OpenAI HTTP 커넥션 풀 설정
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_TIMEOUT: float = 600.0
+    
+    # 응답 캐시 설정
+    COMPLETION_CACHE_ENABLED: bool = False
+    COMPLETION_CACHE_MAX_ENTRIES: int = 1024
+    COMPLETION_CACHE_TTL: float = 300.0  # 초
+    COMPLETION_CACHE_MAX_TEMPERATURE: float = 0.0  # 이 온도 이하만 캐시 (결정적 설정, 시맨틱 캐시도 동일, 요청에 temperature=0 지정 필요)
+    
+    # 시맨틱 캐시 설정 (질문 임베딩 유사도 기반)
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # 코사인 유사도 임계값
+    SEMANTIC_CACHE_CAPACITY_PER_ORG: int = 512
+    SEMANTIC_CACHE_TTL: float = 3600.0  # 초
+    SEMANTIC_CACHE_MAX_ORGS: int = 64  # 메모리에 유지할 조직 인덱스 수 (초과 시 LRU 제거)
+    
+    # 진행 중인 동일 요청 병합 (singleflight)
+    SINGLEFLIGHT_ENABLED: bool = True
+    
+    # 사용량 로깅 배치 전송 설정
+    USAGE_LOG_QUEUE_SIZE: int = 10000
+    USAGE_LOG_BATCH_SIZE: int = 100
+    USAGE_LOG_FLUSH_INTERVAL: float = 1.0  # 초
+    USAGE_LOG_OVERFLOW_POLICY: str = "drop"  # drop: 즉시 폐기, block: 대기 후 폐기
+    USAGE_LOG_ENQUEUE_TIMEOUT: float = 0.05  # block 정책의 최대 대기 시간 (초)
+    USAGE_LOG_MAX_ATTEMPTS: int = 3  # 전송 실패한 이벤트의 최대 시도 횟수 (초과 시 로그를 남기고 폐기)
+    USAGE_LOG_BATCH_ENDPOINT: bool = False  # 백엔드 usage/log/batch 라우트 사용 (없으면 기록마다 usage/log 호출)
+    
+    # 사용량 아웃박스 설정 (디스크 기반, 유실 방지)
+    USAGE_OUTBOX_ENABLED: bool = False  # BACKEND_SERVICE_TOKEN 필요 (재전송에 사용)
+    USAGE_OUTBOX_PATH: str = "data/usage_outbox.db"
+    USAGE_OUTBOX_RETRY_BASE: float = 1.0  # 초
+    USAGE_OUTBOX_RETRY_MAX: float = 60.0  # 초
+    USAGE_OUTBOX_MAX_ATTEMPTS: int = 20
+    
+    # 사용자/조직별 요청 및 토큰 한도 (토큰 버킷)
+    RATE_LIMIT_ENABLED: bool = False
+    RATE_LIMIT_USER_RPM: int = 60
+    RATE_LIMIT_USER_TPM: int = 100000
+    RATE_LIMIT_ORG_RPM: int = 600
+    RATE_LIMIT_ORG_TPM: int = 1000000
+    RATE_LIMIT_SYNC_ENABLED: bool = False  # 백엔드 usage/limits/sync 라우트 사용 (BACKEND_SERVICE_TOKEN 필요, .env.example 참고)
+    RATE_LIMIT_SYNC_INTERVAL: float = 30.0  # 백엔드 카운터 동기화 주기 (초)
+    BACKEND_SERVICE_TOKEN: Optional[str] = os.getenv("BACKEND_SERVICE_TOKEN")  # 서비스 간 호출용 토큰
+    
+    # 업스트림 동시 호출 스케줄러 (조직 가중치 공정 큐잉)
+    SCHEDULER_ENABLED: bool = False
+    SCHEDULER_MAX_CONCURRENCY: int = 32  # 전체 동시 업스트림 호출 수
+    SCHEDULER_MAX_WAIT: float = 30.0  # 최대 대기 시간 (초), 초과 시 503
+    SCHEDULER_TIER_TTL: float = 600.0  # 조직 플랜 캐시 기간 (초), 만료 후 다시 조회
+    SCHEDULER_TIER_WEIGHTS: Dict[str, float] = {
+        "TEAM_BASIC": 1.0,
+        "TEAM_PRO": 2.0,
+        "ENTERPRISE": 4.0,
+    }
+    
+    # OpenAI 호출 복원력 설정 (재시도/헤징/회로 차단)
+    RESILIENCE_ENABLED: bool = True
+    RESILIENCE_MAX_RETRIES: int = 3  # 일시적 오류/429 재시도 횟수
+    RESILIENCE_BACKOFF_BASE: float = 0.5  # 지수 백오프 기본 간격 (초)
+    RESILIENCE_BACKOFF_MAX: float = 20.0  # 백오프 최대 간격 (초), Retry-After도 이 값으로 제한
+    RESILIENCE_HEDGE_ENABLED: bool = False  # 비스트리밍 호출 헤징 (업스트림 비용 증가에 유의)
+    RESILIENCE_HEDGE_PERCENTILE: float = 0.95  # 이 백분위수 지연을 넘으면 헤지 요청 전송
+    RESILIENCE_HEDGE_MIN_SAMPLES: int = 50  # 헤징 시작 전 필요한 지연 샘플 수
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5  # 연속 실패 시 회로 open
+    CIRCUIT_BREAKER_RECOVERY_TIMEOUT: float = 30.0  # open 유지 시간 (초)
+    
+    # 업스트림 대상 풀 (여러 OpenAI 호환 엔드포인트/API 키 로드 밸런싱)
+    # 예: OPENAI_UPSTREAMS='[{"name": "primary", "api_key": "sk-..."}, {"name": "azure", "base_url": "https://.../v1", "api_key": "..."}]'
+    OPENAI_UPSTREAMS: List[Dict[str, str]] = []  # 비어 있으면 OPENAI_API_KEY/OPENAI_API_BASE 단일 대상
+    UPSTREAM_EWMA_ALPHA: float = 0.2  # 지연 시간/오류율 EWMA 가중치
+    UPSTREAM_EJECT_CONSECUTIVE_FAILURES: int = 3  # 연속 실패 시 대상 제외
+    UPSTREAM_EJECT_ERROR_RATE: float = 0.5  # 오류율(EWMA)이 이 값 이상이면 대상 제외
+    UPSTREAM_EJECT_BASE_DURATION: float = 10.0  # 제외 기간 (초), 반복 제외 시 두 배씩 증가
+    UPSTREAM_EJECT_MAX_DURATION: float = 300.0  # 최대 제외 기간 (초)
+    UPSTREAM_EJECT_RESET_AFTER: float = 600.0  # 이 시간 동안 오류가 없으면 제외 기간을 기본값으로 초기화 (초)
+    
+    # 토큰 계산 설정
+    TOKEN_COUNT_MEMO_SIZE: int = 10000  # 메시지별 토큰 수 메모 항목 수
+    TOKEN_COUNT_OFFLOAD_THRESHOLD: int = 8192  # 캐시되지 않은 내용이 이 문자 수 이상이면 스레드 풀에서 인코딩
+    TOKEN_COUNT_THREADS: int = 4
+    TOKEN_WARMUP_MODELS: List[str] = ["gpt-4o", "gpt-3.5-turbo"]  # 시작 시 인코딩을 미리 로드할 모델
+    
+    # 스트리밍 사용량 청크 요청 (stream_options.include_usage, 미지원 업스트림이면 False)
+    STREAM_INCLUDE_USAGE: bool = True
+    
+    # SSE 프레임 병합 (첫 델타는 즉시 전송, 이후 델타는 창 단위로 묶어 전송)
+    SSE_COALESCE_WINDOW: float = 0.02  # 병합 시간 창 (초), 0이면 델타마다 전송
+    SSE_COALESCE_MAX_BYTES: int = 512  # 이 크기 이상 모이면 즉시 전송
+    
+    # RAG 컨텍스트 패킹 (중복 제거, MMR 다양성 선택, 토큰 예산)
+    RAG_SEARCH_CANDIDATES: int = 10  # 패킹 전에 검색할 후보 청크 수
+    RAG_CONTEXT_MAX_TOKENS: int = 3000  # 컨텍스트 최대 토큰 수 (컨텍스트 창 여유분보다 작으면 이 값 사용)
+    RAG_MMR_LAMBDA: float = 0.7  # 1이면 관련도만, 0이면 다양성만 고려
+    RAG_DUPLICATE_THRESHOLD: float = 0.97  # 청크 임베딩 코사인 유사도가 이 값 이상이면 중복
+    MODEL_CONTEXT_WINDOWS: Dict[str, int] = {  # 모델 이름 접두사별 컨텍스트 창 크기 (토큰)
+        "gpt-4o": 128000,
+        "gpt-4-turbo": 128000,
+        "gpt-4": 8192,
+        "gpt-3.5-turbo": 16385,
+    }
+    DEFAULT_CONTEXT_WINDOW: int = 8192
+    
+    # 대화 이력 관리 (오래된 턴 잘라내기, 선택적으로 누적 요약으로 대체)
+    HISTORY_TRIM_ENABLED: bool = False  # 켜면 HISTORY_MAX_TOKENS를 넘는 오래된 턴이 업스트림 요청에서 빠짐 (응답 내용이 달라질 수 있음)
+    HISTORY_MAX_TOKENS: int = 8000  # 대화 이력 최대 토큰 수 (컨텍스트 창 - max_tokens가 더 작으면 그 값)
+    HISTORY_SUMMARY_ENABLED: bool = False  # 잘린 턴을 요약으로 대체 (백그라운드 요약 호출 비용 발생)
+    HISTORY_SUMMARY_MODEL: str = "gpt-4o-mini"
+    HISTORY_SUMMARY_MAX_TOKENS: int = 512
+    HISTORY_SUMMARY_CACHE_SIZE: int = 10000  # 저장할 요약 수
+    
+    # 서버 측 대화 저장소 (conversation_id 모드: 클라이언트는 새 메시지만 전송)
+    CONVERSATION_STORE_ENABLED: bool = False
+    CONVERSATION_STORE_PATH: str = "data/conversations.db"
+    CONVERSATION_CACHE_SIZE: int = 1000  # 메모리에 유지할 대화 수 (초과 시 SQLite로 내보냄)
+    CONVERSATION_TTL: float = 604800.0  # 마지막 사용 후 보관 기간 (초)
+    
+    # 검색 질의 임베딩 마이크로 배칭 (동시 검색의 임베딩 호출을 묶음)
+    EMBEDDING_BATCH_ENABLED: bool = True
+    EMBEDDING_BATCH_WINDOW: float = 0.005  # 질의를 모으는 시간 창 (초)
+    EMBEDDING_BATCH_MAX_SIZE: int = 64  # 이 개수가 모이면 즉시 호출
+    EMBEDDING_BATCH_MAX_CONCURRENCY: int = 4  # 동시에 진행되는 배치 호출 수
+    
+    # 벡터 검색 (Chroma 호출은 전용 스레드 풀에서 실행)
+    SEARCH_MAX_WORKERS: int = 8  # 동시에 실행되는 Chroma 호출 수
+    COLLECTION_CACHE_SIZE: int = 256  # 캐시할 조직별 컬렉션 핸들 수
+    COLLECTION_CACHE_TTL: float = 300.0  # 컬렉션 핸들 유지 시간 (초, 다른 워커의 변경 반영 주기)
+    COLLECTION_NEGATIVE_TTL: float = 30.0  # 없는 컬렉션을 기억하는 시간 (초)
+    
+    # 질의 임베딩 캐시 ((모델, 정규화 텍스트) 해시 → float32 벡터 LRU)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 10000  # 메모리 LRU 항목 수 (1536차원 기준 약 6KB/항목)
+    EMBEDDING_CACHE_PATH: Optional[str] = None  # 지정 시 메모리 맵 파일에도 저장 (재시작 후 유지), 예: data/query_embeddings. 프로세스 간 잠금이 없으므로 워커마다 다른 경로 사용
+    EMBEDDING_CACHE_DISK_CAPACITY: int = 100000  # 파일에 유지할 항목 수 (오래된 항목부터 덮어씀)
+    
     # ChromaDB 설정
     CHROMA_DB_DIR: str = "chroma_db"
     CHROMA_DB_HOST: Optional[str] = None  # 클라이언트 모드에서 사용
@@ -60,6 +197,14 @@ class Settings(BaseSettings):
     # 문서 처리 설정
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    CHUNK_TOKENS: int = 500  # 청크 목표 토큰 수 (0이면 문자 기준 CHUNK_SIZE/CHUNK_OVERLAP 사용)
+    CHUNK_OVERLAP_TOKENS: int = 50  # 이웃 청크와 겹치는 최대 토큰 수
+    CHUNK_TOKEN_MODEL: str = "gpt-4o"  # 토큰 수 계산에 사용할 모델 인코딩 (채팅 모델과 동일하게)
+    INGEST_PROCESS_WORKERS: int = 2  # 텍스트 추출/청킹 프로세스 수
+    INGEST_EMBED_BATCH_SIZE: int = 256  # 임베딩 호출/Chroma add 한 번에 넣는 청크 수
+    INGEST_EMBED_CONCURRENCY: int = 2  # 인덱싱 중 동시에 진행되는 임베딩 호출 수
+    UPLOAD_MAX_BYTES: int = 200 * 1024 * 1024  # 업로드 파일 최대 크기 (바이트)
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024  # 업로드를 디스크에 기록하는 조각 크기 (바이트)
     
     # 음성 API 설정
     ELEVENLABS_API_KEY: Optional[str] = os.getenv("ELEVENLABS_API_KEY", "")
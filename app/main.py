@@ -1,9 +1,11 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.api import api_router
 from app.core.config import settings
+from app.services.auth import User, verify_admin
 from app.services.backend_client import backend_client
+from app.services.container import container
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -31,14 +33,17 @@ async def startup_event():
     """
     애플리케이션 시작 시 실행되는 이벤트 핸들러
     """
-    # 필요한 시작 코드 추가
-    pass
+    # 공유 서비스 및 클라이언트 생성
+    await container.startup()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """
     애플리케이션 종료 시 실행되는 이벤트 핸들러
     """
+    # 공유 서비스 및 클라이언트 연결 종료
+    await container.shutdown()
+    
     # 백엔드 클라이언트 연결 종료
     await backend_client.close()
 
@@ -52,4 +57,9 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"} 
\ No newline at end of file
+    return {"status": "ok"}
+
+@app.get("/metrics")
+async def metrics(current_user: User = Depends(verify_admin)):
+    # 내부 구성과 사용량이 드러나므로 관리자만 조회
+    return container.stats()
@@ -22,6 +22,10 @@ class ChatRequest(BaseModel):
     temperature: Optional[float] = Field(DEFAULT_TEMPERATURE, description="응답 온도 (높을수록 창의적)")
     max_tokens: Optional[int] = Field(DEFAULT_MAX_TOKENS, description="최대 토큰 수")
     stream: Optional[bool] = Field(DEFAULT_STREAM, description="스트리밍 여부")
+    conversation_id: Optional[str] = Field(None, description="서버 측 대화 ID (지정 시 messages에는 새 메시지만 전송)")
+
+class ConversationResponse(BaseModel):
+    conversation_id: str = Field(..., description="대화 ID")
 
 class ChatUsage(BaseModel):
     prompt_tokens: int = Field(..., description="입력 메시지 토큰 수")
@@ -11,6 +11,8 @@ class DocumentCreate(DocumentBase):
     file_path: str = Field(..., description="임시 파일 경로")
     file_type: str = Field(..., description="파일 타입 (pdf, docx, txt, md, html)")
     file_name: str = Field(..., description="원본 파일명")
+    file_size: Optional[int] = Field(None, description="파일 크기 (바이트)")
+    content_hash: Optional[str] = Field(None, description="파일 내용 SHA-256 해시")
 
 class DocumentChunk(BaseModel):
     id: str = Field(..., description="청크 ID")
@@ -53,12 +55,14 @@ class DocumentSearchResult(BaseModel):
     content: str = Field(..., description="청크 내용")
     score: float = Field(..., description="검색 점수")
     metadata: Dict[str, Any] = Field({}, description="메타데이터")
+    embedding: Optional[List[float]] = Field(None, exclude=True, description="청크 임베딩 (내부용, 응답에서 제외)")
 
 class DocumentSearchResponse(BaseModel):
     results: List[DocumentSearchResult] = Field(..., description="검색 결과")
     query: str = Field(..., description="검색 쿼리")
     total: int = Field(..., description="총 결과 수")
     answer: Optional[str] = Field(None, description="AI 생성 응답 (query 엔드포인트에서만 사용)")
+    query_embedding: Optional[List[float]] = Field(None, exclude=True, description="질의 임베딩 (내부용, 응답에서 제외)")
     
 class ChunkProcessResult(BaseModel):
     document_id: str
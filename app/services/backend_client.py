@@ -1,3 +1,4 @@
+import asyncio
 import json
 from typing import Dict, Any, Optional, List, Union
 
@@ -128,20 +129,19 @@ class BackendClient:
         return await self.get(f"organizations/{org_id}", token)
 
     # 사용량 로깅 API
-    async def log_api_usage(
-        self, 
+    @staticmethod
+    def build_usage_record(
         user_id: int,
         org_id: int,
-        token: str,
         api_type: str,
         tokens_used: int,
         estimated_cost: float,
         metadata: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
-        API 사용량을 로깅합니다.
+        사용량 로깅 API의 요청 본문을 생성합니다.
         """
-        data = {
+        return {
             "userId": user_id,
             "orgId": org_id,
             "apiType": api_type,
@@ -149,7 +149,83 @@ class BackendClient:
             "estimatedCost": estimated_cost,
             "metadata": metadata or {}
         }
+
+    async def log_api_usage(
+        self, 
+        user_id: int,
+        org_id: int,
+        token: str,
+        api_type: str,
+        tokens_used: int,
+        estimated_cost: float,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        API 사용량을 로깅합니다.
+        """
+        data = self.build_usage_record(
+            user_id=user_id,
+            org_id=org_id,
+            api_type=api_type,
+            tokens_used=tokens_used,
+            estimated_cost=estimated_cost,
+            metadata=metadata
+        )
         return await self.post("usage/log", token, json_data=data)
 
+    async def log_api_usage_batch(
+        self,
+        token: str,
+        records: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        여러 API 사용량 기록을 한 번에 로깅합니다. (백엔드에 usage/log/batch 라우트가 있어야 함)
+        """
+        return await self.post("usage/log/batch", token, json_data={"records": records})
+
+    async def log_api_usage_records(
+        self,
+        token: str,
+        records: List[Dict[str, Any]]
+    ) -> List[Optional[Exception]]:
+        """
+        사용량 기록을 전송하고 기록별 오류 목록(성공 시 None)을 반환합니다.
+        USAGE_LOG_BATCH_ENDPOINT가 꺼져 있으면 기록마다 usage/log로 전송합니다.
+        """
+        if settings.USAGE_LOG_BATCH_ENDPOINT:
+            try:
+                await self.log_api_usage_batch(token=token, records=records)
+                return [None] * len(records)
+            except Exception as e:
+                return [e] * len(records)
+
+        results = await asyncio.gather(
+            *(self.post("usage/log", token, json_data=record) for record in records),
+            return_exceptions=True
+        )
+        return [result if isinstance(result, Exception) else None for result in results]
+
+    @staticmethod
+    def is_retryable_error(error: BaseException) -> bool:
+        """
+        다시 보내면 성공할 수 있는 오류인지 판단합니다. (5xx, 408, 429, 연결 오류)
+        요청/인증 자체의 오류(그 외 4xx)는 재시도해도 실패합니다.
+        """
+        status_code = getattr(error, "status_code", None)
+        if status_code is None:
+            return True
+        return status_code >= 500 or status_code in (408, 429)
+
+    async def sync_usage_counters(
+        self,
+        token: str,
+        counters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        인스턴스의 누적 토큰 사용량을 보내고 사용자/조직별 최신 한도를 받아옵니다.
+        백엔드에 usage/limits/sync 라우트가 있어야 합니다. (RATE_LIMIT_SYNC_ENABLED, 요청/응답 형식은 .env.example 참고)
+        """
+        return await self.post("usage/limits/sync", token, json_data=counters)
+
 # 싱글턴 인스턴스
 backend_client = BackendClient() 
\ No newline at end of file
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any
+
+from app.schemas.chat import ChatMessage, ChatResponse, ChatUsage
+
+
+def copy_without_usage(response: ChatResponse) -> ChatResponse:
+    """
+    캐시 또는 공유된 응답을 업스트림 사용량이 0인 새 응답으로 복사합니다.
+    """
+    return response.model_copy(update={
+        "id": f"chatcmpl-cache-{uuid.uuid4().hex}",
+        "created": int(time.time()),
+        "usage": ChatUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0, estimated_cost=0.0),
+    })
+
+
+class CompletionCache:
+    """
+    채팅 완성 응답의 완전 일치(exact-match) 캐시
+
+    (model, messages, temperature, max_tokens)의 정규화 해시를 키로 사용하며,
+    조직별로 키 공간을 분리합니다. 전체 크기는 LRU로 제한되고 항목마다 TTL이 적용됩니다.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0, max_temperature: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_temperature = max_temperature
+        self._entries: "OrderedDict[tuple[Optional[int], str], tuple[float, ChatResponse]]" = OrderedDict()
+
+        # 통계 카운터
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: List[ChatMessage],
+        temperature: Optional[float],
+        max_tokens: Optional[int]
+    ) -> str:
+        """
+        요청 파라미터의 정규화 해시 키를 생성합니다.
+        """
+        payload = {
+            "model": model,
+            "messages": [[m.role, m.content] for m in messages],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, temperature: Optional[float]) -> bool:
+        """
+        결정적(deterministic) 설정인 경우에만 캐시 대상으로 판단합니다.
+        """
+        return temperature is not None and temperature <= self.max_temperature
+
+    def get(self, org_id: Optional[int], key: str) -> Optional[ChatResponse]:
+        """
+        캐시된 응답을 반환합니다. 적중 시 업스트림 사용량이 0인 새 응답을 돌려줍니다.
+        """
+        entry_key = (org_id, key)
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            del self._entries[entry_key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(entry_key)
+        self.hits += 1
+        return copy_without_usage(response)
+
+    def set(self, org_id: Optional[int], key: str, response: ChatResponse) -> None:
+        """
+        응답을 캐시에 저장하고 용량 초과 시 가장 오래된 항목을 제거합니다.
+        """
+        entry_key = (org_id, key)
+        self._entries[entry_key] = (time.monotonic() + self.ttl_seconds, response)
+        self._entries.move_to_end(entry_key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate_org(self, org_id: Optional[int]) -> int:
+        """
+        특정 조직의 캐시 항목을 모두 제거합니다.
+        """
+        keys = [k for k in self._entries if k[0] == org_id]
+        for k in keys:
+            del self._entries[k]
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        캐시 통계를 반환합니다.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
@@ -1,19 +1,38 @@
-import json
+import math
 import time
 import asyncio
 import os
 import logging
 import traceback
-from typing import Dict, List, Any, Optional, AsyncGenerator
+from contextlib import nullcontext
+from typing import Awaitable, Callable, Dict, List, Any, Optional, Set, Union, AsyncGenerator
 
 from fastapi import BackgroundTasks, HTTPException
+import httpx
 import openai
 import tiktoken
 
 from app.core.config import settings
 from app.schemas.chat import ChatMessage, ChatResponse, ChatChoice, ChatUsage
+from app.schemas.document import DocumentSearchResponse, DocumentSearchResult
 from app.services.backend_client import backend_client
+from app.services.cache import CompletionCache, copy_without_usage
+from app.services.context_packer import ContextPacker
+from app.services.conversations import ConversationStore
 from app.services.document import DocumentService
+from app.services.history import HistoryManager
+from app.services.semantic_cache import SemanticCache
+from app.services.singleflight import SingleFlight
+from app.services.sse import DONE_FRAME, SSEFrameWriter, error_frame, named_event_frame
+from app.services.tokens import TokenCounter
+from app.services.outbox import UsageOutbox
+from app.services.rate_limit import Admission, RateLimiter
+from app.services.resilience import CircuitOpenError, ResiliencePolicy
+from app.services.upstream_pool import UpstreamPool
+from app.services.scheduler import (
+    UpstreamScheduler, PRIORITY_INTERACTIVE, PRIORITY_STANDARD, PRIORITY_BATCH
+)
+from app.services.usage import UsageLogPipeline
 
 # 디버깅을 위한 로거 설정
 logging.basicConfig(
@@ -31,9 +50,98 @@ class ChatService:
     OpenAI API를 사용한 채팅 서비스
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        openai_client: Optional[openai.AsyncOpenAI] = None,
+        doc_service: Optional[DocumentService] = None,
+        completion_cache: Optional[CompletionCache] = None,
+        semantic_cache: Optional[SemanticCache] = None,
+        completion_flight: Optional[SingleFlight] = None,
+        usage_pipeline: Optional[Union[UsageLogPipeline, UsageOutbox]] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        scheduler: Optional[UpstreamScheduler] = None,
+        resilience: Optional[ResiliencePolicy] = None,
+        upstream_pool: Optional[UpstreamPool] = None,
+        token_counter: Optional[TokenCounter] = None,
+        frame_writer: Optional[SSEFrameWriter] = None,
+        context_packer: Optional[ContextPacker] = None,
+        history_manager: Optional[HistoryManager] = None,
+        conversation_store: Optional[ConversationStore] = None
+    ):
+        # 공유 클라이언트가 주어지지 않은 경우에만 새로 생성
+        self.openai_client = openai_client or self.create_openai_client()
+        self.doc_service = doc_service or DocumentService()
+        
+        # 응답 캐시 (선택)
+        self.completion_cache = completion_cache
+        self.semantic_cache = semantic_cache
+        
+        # 동일 요청 병합 (선택)
+        self.completion_flight = completion_flight
+        
+        # 사용량 배치 전송 파이프라인 (첫 적재 시 플러셔 시작)
+        self.usage_pipeline = usage_pipeline or UsageLogPipeline(backend_client)
+        self._usage_token_warned = False
+        
+        # 사용자/조직별 요청 및 토큰 한도 (선택)
+        self.rate_limiter = rate_limiter
+        
+        # 업스트림 동시 호출 스케줄러 (선택)
+        self.scheduler = scheduler
+        
+        # 재시도/헤징/회로 차단 정책 (선택)
+        self.resilience = resilience
+        
+        # 여러 엔드포인트/API 키 로드 밸런싱 (선택, 없으면 openai_client 단일 대상)
+        self.upstream_pool = upstream_pool
+        
+        # 인코딩 캐시와 메시지별 토큰 수 메모이즈
+        self.token_counter = token_counter or TokenCounter()
+        
+        # 스트리밍 델타를 모아 SSE 프레임 수를 줄이는 작성기
+        self.frame_writer = frame_writer or SSEFrameWriter(
+            window=settings.SSE_COALESCE_WINDOW,
+            max_bytes=settings.SSE_COALESCE_MAX_BYTES
+        )
+        
+        # RAG 검색 결과를 토큰 예산에 맞춰 고르는 패커
+        self.context_packer = context_packer or ContextPacker(
+            self.token_counter,
+            max_context_tokens=settings.RAG_CONTEXT_MAX_TOKENS,
+            mmr_lambda=settings.RAG_MMR_LAMBDA,
+            duplicate_threshold=settings.RAG_DUPLICATE_THRESHOLD,
+            context_windows=settings.MODEL_CONTEXT_WINDOWS,
+            default_context_window=settings.DEFAULT_CONTEXT_WINDOW
+        )
+        
+        # 대화 이력 잘라내기/요약 (선택)
+        self.history_manager = history_manager
+        
+        # 서버 측 대화 저장소 (선택)
+        self.conversation_store = conversation_store
+        
+        # 스트리밍 통계와 중단된 스트림 정리 태스크
+        self.streams_started = 0
+        self.streams_aborted = 0
+        self.aborted_completion_tokens = 0
+        self.tokens_saved_estimate = 0
+        self._background_tasks: Set[asyncio.Task] = set()
+        
+    @staticmethod
+    def create_openai_client(
+        http_client: Optional[httpx.AsyncClient] = None,
+        max_retries: Optional[int] = None,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None
+    ) -> openai.AsyncOpenAI:
+        """
+        OpenAI 비동기 클라이언트를 생성합니다.
+        http_client가 주어지면 해당 커넥션 풀을 공유합니다.
+        max_retries를 0으로 지정하면 SDK 자체 재시도를 끄고 ResiliencePolicy에 맡깁니다.
+        api_key/base_url을 지정하지 않으면 OPENAI_API_KEY/OPENAI_API_BASE를 사용합니다.
+        """
         # API 키 로깅 (마스킹 처리)
-        api_key = settings.OPENAI_API_KEY
+        api_key = api_key or settings.OPENAI_API_KEY
         if api_key:
             masked_key = f"{api_key[:8]}{'*' * (len(api_key) - 12)}{api_key[-4:]}"
             logger.info(f"OpenAI API 키 설정됨: {masked_key}")
@@ -45,60 +153,50 @@ class ChatService:
             logger.error("OpenAI API 키가 설정되지 않았습니다!")
         
         # 베이스 URL 확인
-        base_url = os.getenv("OPENAI_API_BASE")
+        base_url = base_url or os.getenv("OPENAI_API_BASE")
         if base_url:
             logger.info(f"OpenAI API Base URL: {base_url}")
-            self.openai_client = openai.AsyncOpenAI(
-                api_key=settings.OPENAI_API_KEY,
-                base_url=base_url
-            )
         else:
             logger.info("기본 OpenAI API URL 사용")
-            self.openai_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
             
         # 환경 변수 디버깅
         logger.debug(f"OPENAI_API_KEY 설정 여부: {bool(settings.OPENAI_API_KEY)}")
         logger.debug(f"DEFAULT_MODEL: {settings.DEFAULT_MODEL}")
         
-        self.doc_service = DocumentService()
+        client_options: Dict[str, Any] = {}
+        if max_retries is not None:
+            client_options["max_retries"] = max_retries
+        
+        return openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url or None,
+            http_client=http_client,
+            **client_options
+        )
         
     def _get_encoding(self, model: str) -> tiktoken.Encoding:
         """
-        모델에 맞는 토큰 인코딩을 가져옵니다.
+        모델에 맞는 토큰 인코딩을 가져옵니다. (모델별 캐시)
         """
-        try:
-            if "gpt-4" in model:
-                return tiktoken.encoding_for_model("gpt-4o")
-            elif "gpt-3.5" in model:
-                return tiktoken.encoding_for_model("gpt-3.5-turbo")
-            else:
-                return tiktoken.get_encoding("cl100k_base")  # 기본 인코딩
-        except Exception:
-            return tiktoken.get_encoding("cl100k_base")  # 오류 시 기본 인코딩
+        return self.token_counter.encoding_for(model)
     
     def _count_tokens(self, text: str, model: str) -> int:
         """
         텍스트의 토큰 수를 계산합니다.
         """
-        encoding = self._get_encoding(model)
-        return len(encoding.encode(text))
+        return self.token_counter.count(text, model)
     
     def _count_message_tokens(self, messages: List[ChatMessage], model: str) -> int:
         """
-        메시지 리스트의 토큰 수를 계산합니다.
+        메시지 리스트의 토큰 수를 계산합니다. (메시지별 토큰 수 메모이즈)
         """
-        encoding = self._get_encoding(model)
-        tokens_per_message = 3  # 메시지당 기본 토큰 수
-        tokens_per_name = 1     # 이름당 추가 토큰 수
-        
-        total_tokens = 0
-        for message in messages:
-            total_tokens += tokens_per_message
-            total_tokens += len(encoding.encode(message.content))
-            total_tokens += len(encoding.encode(message.role))
-            
-        total_tokens += 3  # 마지막 assistant 메시지를 위한 추가 토큰
-        return total_tokens
+        return self.token_counter.count_messages(messages, model)
+    
+    async def _count_message_tokens_async(self, messages: List[ChatMessage], model: str) -> int:
+        """
+        메시지 리스트의 토큰 수를 계산합니다. 큰 입력은 스레드 풀에서 인코딩합니다.
+        """
+        return await self.token_counter.count_messages_async(messages, model)
     
     def _calculate_cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
         """
@@ -129,6 +227,235 @@ class ChatService:
         
         return prompt_cost + completion_cost
     
+    async def check_rate_limit(
+        self,
+        messages: List[ChatMessage],
+        model: Optional[str],
+        max_tokens: Optional[int],
+        user_id: Optional[int],
+        org_id: Optional[int]
+    ) -> Optional[Admission]:
+        """
+        요청/토큰 한도를 확인하고 예상 토큰을 예약합니다.
+        한도 초과 시 429 오류(Retry-After 포함)를 발생시킵니다.
+        """
+        if self.rate_limiter is None:
+            return None
+        
+        model = model or settings.DEFAULT_MODEL
+        max_tokens = max_tokens or settings.MAX_TOKENS
+        
+        # 예상 사용량 = 프롬프트 토큰 + 최대 완성 토큰 (응답 후 실제 사용량으로 정산)
+        estimated_tokens = await self._count_message_tokens_async(messages, model) + max_tokens
+        return self.rate_limiter.admit(user_id, org_id, estimated_tokens)
+    
+    async def load_conversation(
+        self,
+        conversation_id: Optional[str],
+        messages: List[ChatMessage],
+        user_id: int,
+        org_id: Optional[int]
+    ) -> List[ChatMessage]:
+        """
+        conversation_id가 있으면 저장된 대화 이력 뒤에 새 메시지를 붙여 반환합니다.
+        """
+        if conversation_id is None:
+            return messages
+        if self.conversation_store is None:
+            raise HTTPException(status_code=400, detail="대화 저장소가 비활성화되어 있습니다.")
+        
+        history = await self.conversation_store.get_messages(conversation_id, user_id, org_id)
+        return history + list(messages)
+    
+    def save_conversation_turn(
+        self,
+        conversation_id: Optional[str],
+        messages: List[ChatMessage],
+        reply: str,
+        user_id: int,
+        org_id: Optional[int]
+    ) -> None:
+        """
+        응답이 끝난 턴(새 메시지 + 응답)을 대화에 추가합니다. 실패한 턴은 저장하지 않습니다.
+        백그라운드로 실행되며, 같은 대화의 턴은 저장소에서 호출 순서대로 기록됩니다.
+        """
+        if conversation_id is None or self.conversation_store is None:
+            return
+        self._spawn(self.conversation_store.append(
+            conversation_id, user_id, org_id,
+            list(messages) + [ChatMessage(role="assistant", content=reply)]
+        ))
+    
+    async def prepare_history(
+        self,
+        messages: List[ChatMessage],
+        model: Optional[str],
+        max_tokens: Optional[int],
+        org_id: Optional[int],
+        user_id: Optional[int] = None
+    ) -> List[ChatMessage]:
+        """
+        대화 이력을 토큰 예산에 맞게 줄입니다. (오래된 턴은 잘라내거나 요약으로 대체)
+        """
+        if self.history_manager is None:
+            return messages
+        
+        model = model or settings.DEFAULT_MODEL
+        max_tokens = max_tokens or settings.MAX_TOKENS
+        
+        budget = min(settings.HISTORY_MAX_TOKENS, self.context_packer.context_window(model) - max_tokens)
+        return await self.history_manager.fit(messages, model, budget, org_id, user_id)
+    
+    async def summarize_history(
+        self,
+        previous_summary: Optional[str],
+        messages: List[ChatMessage],
+        org_id: Optional[int] = None,
+        user_id: Optional[int] = None
+    ) -> str:
+        """
+        잘린 대화 턴을 이전 요약과 합쳐 새 요약을 만듭니다. (HistoryManager의 백그라운드 태스크에서 호출)
+        요약 호출도 조직 토큰 한도에서 예약/정산하고 사용량을 기록합니다. (한도 초과 시 429로 요약 생략)
+        """
+        model = settings.HISTORY_SUMMARY_MODEL
+        max_tokens = settings.HISTORY_SUMMARY_MAX_TOKENS
+        transcript = "\n".join(f"{message.role}: {message.content}" for message in messages)
+        prompt = [
+            ChatMessage(
+                role="system",
+                content="다음 대화를 이후 대화에 필요한 사실, 결정 사항, 사용자 선호 위주로 간결하게 요약하세요. "
+                        "기존 요약이 있으면 새 대화 내용을 합쳐 하나의 요약으로 갱신하세요."
+            ),
+            ChatMessage(
+                role="user",
+                content=f"기존 요약:\n{previous_summary or '(없음)'}\n\n대화:\n{transcript}"
+            ),
+        ]
+        
+        # 사용자가 직접 보낸 요청이 아니므로 조직 한도에서만 예약
+        admission = await self.check_rate_limit(prompt, model, max_tokens, None, org_id)
+        try:
+            # 요약은 배치 우선순위로 실행 (대화형 요청 우선)
+            async with self._upstream_slot(org_id, PRIORITY_BATCH, None) as lease:
+                response = await self._call_upstream(
+                    "chat.completions.summary",
+                    lambda client: client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": m.role, "content": m.content} for m in prompt],
+                        temperature=0,
+                        max_tokens=max_tokens,
+                        n=1
+                    ),
+                    lease=lease
+                )
+            
+            usage = response.usage
+            if usage is not None:
+                self._reconcile_usage(admission, usage.total_tokens)
+                if user_id and org_id:
+                    await self._log_usage(
+                        user_id=user_id,
+                        org_id=org_id,
+                        model=model,
+                        prompt_tokens=usage.prompt_tokens,
+                        completion_tokens=usage.completion_tokens,
+                        request_id=response.id
+                    )
+            return response.choices[0].message.content or ""
+        finally:
+            # 실패 시 예약 토큰 반환 (이미 정산된 경우 무시됨)
+            self._reconcile_usage(admission, 0)
+    
+    def _reconcile_usage(self, admission: Optional[Admission], actual_tokens: int) -> None:
+        """
+        예약한 토큰을 실제 사용량으로 정산합니다.
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.reconcile(admission, actual_tokens)
+    
+    def _upstream_slot(self, org_id: Optional[int], priority: int, token: Optional[str]):
+        """
+        업스트림 호출 슬롯 컨텍스트를 반환합니다. 스케줄러가 없으면 제한하지 않습니다.
+        """
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(org_id, priority, token)
+    
+    async def _call_upstream(
+        self,
+        operation: str,
+        request_fn,
+        hedge: bool = False,
+        lease=None,
+        on_discarded: Optional[Callable[[Any], None]] = None
+    ):
+        """
+        request_fn(client)으로 업스트림을 호출합니다.
+        대상 풀이 있으면 시도마다 대상을 새로 선택하고, 복원력 정책이 있으면 재시도/헤징을 적용합니다.
+        lease(스케줄러 슬롯)가 있으면 재시도 대기 동안 슬롯을 반납합니다.
+        """
+        async def attempt():
+            if self.upstream_pool is not None:
+                return await self.upstream_pool.call(request_fn)
+            return await request_fn(self.openai_client)
+        
+        if self.resilience is None:
+            return await attempt()
+        # 대상별 상태는 풀이 관리하고 단일 클라이언트는 대상이 하나이므로 회로 차단기는 작업 단위로 둠
+        # (차단기 이름은 /metrics에 노출되므로 base URL을 넣지 않음)
+        return await self.resilience.call(
+            operation, attempt, hedge=hedge,
+            pause=lease.paused if lease is not None else None,
+            on_discarded=on_discarded
+        )
+    
+    def _record_discarded_usage(
+        self,
+        response: Any,
+        model: str,
+        user_id: Optional[int],
+        org_id: Optional[int],
+        token: Optional[str]
+    ) -> None:
+        """
+        헤징에서 진 요청의 사용량을 한도에 반영하고 기록합니다. (응답은 버려도 과금은 발생)
+        """
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        if self.rate_limiter is not None:
+            self.rate_limiter.charge(user_id, org_id, usage.total_tokens)
+        if user_id and org_id:
+            self._spawn(self._log_usage(
+                user_id=user_id,
+                org_id=org_id,
+                model=model,
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                request_id=response.id,
+                token=token
+            ))
+    
+    @staticmethod
+    def _upstream_error_to_http(e: Exception) -> Optional[HTTPException]:
+        """
+        회로 차단/업스트림 한도 초과를 Retry-After가 포함된 HTTP 오류로 변환합니다.
+        """
+        if isinstance(e, CircuitOpenError):
+            return HTTPException(
+                status_code=503,
+                detail="OpenAI API를 일시적으로 사용할 수 없습니다. 잠시 후 다시 시도하세요.",
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+            )
+        if isinstance(e, openai.RateLimitError):
+            retry_after = ResiliencePolicy.retry_after_from(e)
+            return HTTPException(
+                status_code=429,
+                detail="OpenAI API 요청 한도에 도달했습니다. 잠시 후 다시 시도하세요.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after or 1)))}
+            )
+        return None
+    
     async def _log_usage(
         self, 
         user_id: int, 
@@ -140,30 +467,129 @@ class ChatService:
         token: Optional[str] = None
     ) -> None:
         """
-        API 사용량을 로깅합니다.
+        API 사용량을 사용량 큐에 적재합니다. (백그라운드 배치 전송)
         """
+        # 사용량은 만료되지 않는 서비스 토큰으로 기록 (없으면 요청의 인증 토큰 사용)
+        token = settings.BACKEND_SERVICE_TOKEN or token
+        if not token:
+            if not self._usage_token_warned:
+                self._usage_token_warned = True
+                logger.warning("BACKEND_SERVICE_TOKEN이 설정되지 않아 사용량을 기록하지 않습니다.")
+            return
+        
         cost = self._calculate_cost(model, prompt_tokens, completion_tokens)
+        record = backend_client.build_usage_record(
+            user_id=user_id,
+            org_id=org_id,
+            api_type="chat",
+            tokens_used=prompt_tokens + completion_tokens,
+            estimated_cost=cost,
+            metadata={
+                "model": model,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "request_id": request_id
+            }
+        )
         
-        try:
-            # 사용량 데이터를 백엔드에 기록
-            if token:
-                await backend_client.log_api_usage(
-                    user_id=user_id,
-                    org_id=org_id,
-                    token=token,
-                    api_type="chat",
-                    tokens_used=prompt_tokens + completion_tokens,
-                    estimated_cost=cost,
-                    metadata={
-                        "model": model,
-                        "prompt_tokens": prompt_tokens,
-                        "completion_tokens": completion_tokens,
-                        "request_id": request_id
-                    }
+        # 큐 적재 실패(폐기)는 사용자 응답에 영향을 주지 않도록 처리
+        await self.usage_pipeline.submit(token, record)
+    
+    async def _request_completion(
+        self,
+        messages: List[ChatMessage],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        user_id: Optional[int],
+        org_id: Optional[int],
+        token: Optional[str],
+        priority: int = PRIORITY_STANDARD
+    ) -> ChatResponse:
+        """
+        OpenAI API를 호출하여 채팅 응답을 생성하고 사용량을 기록합니다.
+        """
+        # API 요청 준비 로깅
+        formatted_messages = [{"role": m.role, "content": m.content} for m in messages]
+        if len(formatted_messages) > 0:
+            logger.debug(f"첫 번째 메시지 역할: {formatted_messages[0]['role']}")
+            logger.debug(f"마지막 메시지 역할: {formatted_messages[-1]['role']}")
+        
+        logger.info("OpenAI API 호출 시작...")
+        
+        # OpenAI API 호출 (스케줄러 슬롯 점유, 재시도/헤징 적용)
+        async with self._upstream_slot(org_id, priority, token) as lease:
+            api_start_time = time.time()
+            response = await self._call_upstream(
+                "chat.completions",
+                lambda client: client.chat.completions.create(
+                    model=model,
+                    messages=formatted_messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    n=1,
+                    stream=False
+                ),
+                hedge=True,
+                lease=lease,
+                on_discarded=lambda discarded: self._record_discarded_usage(
+                    discarded, model, user_id, org_id, token
                 )
-        except Exception as e:
-            # 로깅 실패는 사용자 응답에 영향을 주지 않도록 처리
-            print(f"Usage logging error: {str(e)}")
+            )
+            api_end_time = time.time()
+        
+        # API 응답 시간 로깅
+        logger.info(f"OpenAI API 호출 완료: {(api_end_time - api_start_time):.2f}초 소요")
+        
+        # 응답 파싱
+        completion = response.choices[0].message
+        chat_message = ChatMessage(role=completion.role, content=completion.content)
+        
+        # 응답 내용 요약 로깅 (너무 길면 잘라서)
+        content_preview = completion.content[:100] + "..." if len(completion.content) > 100 else completion.content
+        logger.debug(f"응답 내용 (요약): {content_preview}")
+        
+        # 사용량 정보
+        prompt_tokens = response.usage.prompt_tokens
+        completion_tokens = response.usage.completion_tokens
+        total_tokens = response.usage.total_tokens
+        cost = self._calculate_cost(model, prompt_tokens, completion_tokens)
+        
+        # 토큰 사용량 로깅
+        logger.info(f"토큰 사용량: model={model}, 프롬프트={prompt_tokens}, 완성={completion_tokens}, 총={total_tokens}, 비용=${cost:.6f}")
+        
+        # 사용량 로깅 (큐에 적재 후 백그라운드 배치 전송)
+        if user_id and org_id:
+            await self._log_usage(
+                user_id=user_id,
+                org_id=org_id,
+                model=model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                request_id=response.id,
+                token=token
+            )
+        
+        # 응답 객체 생성
+        return ChatResponse(
+            id=response.id,
+            object="chat.completion",
+            created=int(time.time()),
+            model=model,
+            choices=[
+                ChatChoice(
+                    index=0,
+                    message=chat_message,
+                    finish_reason=response.choices[0].finish_reason
+                )
+            ],
+            usage=ChatUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=total_tokens,
+                estimated_cost=cost
+            )
+        )
     
     async def generate_completion(
         self,
@@ -173,99 +599,82 @@ class ChatService:
         max_tokens: Optional[int] = None,
         user_id: Optional[int] = None,
         org_id: Optional[int] = None,
-        token: Optional[str] = None
+        token: Optional[str] = None,
+        priority: int = PRIORITY_STANDARD
     ) -> ChatResponse:
         """
         채팅 응답을 생성합니다.
         """
-        # 기본값 설정
-        # model = model or settings.DEFAULT_MODEL
-        # temperature = temperature or settings.TEMPERATURE
-        # max_tokens = max_tokens or settings.MAX_TOKENS
-
-        model = "gpt-4o" or settings.DEFAULT_MODEL
-        temperature = 0.7 or settings.TEMPERATURE
-        max_tokens = 2048 or settings.MAX_TOKENS
- 
+        # 기본값 설정 (temperature=0은 유효한 값이므로 None일 때만 기본값 사용)
+        model = model or settings.DEFAULT_MODEL
+        temperature = settings.TEMPERATURE if temperature is None else temperature
+        max_tokens = max_tokens or settings.MAX_TOKENS
 
         # 디버깅 정보 기록
         logger.info(f"채팅 완성 생성 요청: 모델={model}, 온도={temperature}, 최대 토큰={max_tokens}")
         logger.debug(f"메시지 개수: {len(messages)}")
         
+        # 캐시 조회 (결정적 설정인 경우에만)
+        cache_key = None
+        if self.completion_cache and self.completion_cache.is_cacheable(temperature):
+            cache_key = self.completion_cache.make_key(model, messages, temperature, max_tokens)
+            cached_response = self.completion_cache.get(org_id, cache_key)
+            if cached_response is not None:
+                logger.info("캐시된 응답 반환 (업스트림 호출 생략)")
+                return cached_response
+        
+        # 시맨틱 캐시 조회 (유사 질문)
+        semantic_scope = None
+        semantic_vector = None
+        if self.semantic_cache and self.semantic_cache.is_eligible(messages, temperature):
+            semantic_vector = await self.semantic_cache.embed(messages[-1].content)
+            if semantic_vector is not None:
+                semantic_scope = self.semantic_cache.make_scope_id(model, messages, max_tokens)
+                cached_response = self.semantic_cache.get(org_id, semantic_scope, semantic_vector)
+                if cached_response is not None:
+                    logger.info("시맨틱 캐시 응답 반환 (업스트림 호출 생략)")
+                    if cache_key is not None:
+                        self.completion_cache.set(org_id, cache_key, cached_response)
+                    return cached_response
+        
+        # 요청/토큰 한도 확인 (캐시 적중 시에는 소비하지 않음)
+        admission = await self.check_rate_limit(messages, model, max_tokens, user_id, org_id)
+        
         try:
-            # API 요청 준비 로깅
-            formatted_messages = [{"role": m.role, "content": m.content} for m in messages]
-            if len(formatted_messages) > 0:
-                logger.debug(f"첫 번째 메시지 역할: {formatted_messages[0]['role']}")
-                logger.debug(f"마지막 메시지 역할: {formatted_messages[-1]['role']}")
-            
-            logger.info("OpenAI API 호출 시작...")
-            
-            # OpenAI API 호출
-            api_start_time = time.time()
-            response = await self.openai_client.chat.completions.create(
-                model=model,
-                messages=formatted_messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                n=1,
-                stream=False
-            )
-            api_end_time = time.time()
-            
-            # API 응답 시간 로깅
-            logger.info(f"OpenAI API 호출 완료: {(api_end_time - api_start_time):.2f}초 소요")
-            
-            # 응답 파싱
-            completion = response.choices[0].message
-            chat_message = ChatMessage(role=completion.role, content=completion.content)
-            
-            # 응답 내용 요약 로깅 (너무 길면 잘라서)
-            content_preview = completion.content[:100] + "..." if len(completion.content) > 100 else completion.content
-            logger.debug(f"응답 내용 (요약): {content_preview}")
+            if self.completion_flight is not None:
+                # 동일한 요청이 진행 중이면 하나의 업스트림 호출을 공유
+                flight_key = (org_id, cache_key or CompletionCache.make_key(model, messages, temperature, max_tokens))
+                chat_response, shared = await self.completion_flight.do(
+                    flight_key,
+                    lambda: self._request_completion(
+                        messages, model, temperature, max_tokens, user_id, org_id, token, priority
+                    )
+                )
+                if shared:
+                    logger.info("진행 중인 동일 요청의 응답 공유 (업스트림 호출 생략)")
+                    return copy_without_usage(chat_response)
+            else:
+                chat_response = await self._request_completion(
+                    messages, model, temperature, max_tokens, user_id, org_id, token, priority
+                )
             
-            # 사용량 정보
-            prompt_tokens = response.usage.prompt_tokens
-            completion_tokens = response.usage.completion_tokens
-            total_tokens = response.usage.total_tokens
-            cost = self._calculate_cost(model, prompt_tokens, completion_tokens)
+            # 예약 토큰 정산
+            self._reconcile_usage(admission, chat_response.usage.total_tokens)
             
-            # 토큰 사용량 로깅
-            logger.info(f"토큰 사용량: model={model}, 프롬프트={prompt_tokens}, 완성={completion_tokens}, 총={total_tokens}, 비용=${cost:.6f}")
+            # 캐시 저장
+            if cache_key is not None:
+                self.completion_cache.set(org_id, cache_key, chat_response)
+            if semantic_vector is not None:
+                self.semantic_cache.set(org_id, semantic_scope, semantic_vector, chat_response)
             
-            # 사용량 로깅 (백그라운드로 처리)
-            if user_id and org_id:
-                asyncio.create_task(self._log_usage(
-                    user_id=user_id,
-                    org_id=org_id,
-                    model=model,
-                    prompt_tokens=prompt_tokens,
-                    completion_tokens=completion_tokens,
-                    request_id=response.id,
-                    token=token
-                ))
-            
-            # 응답 객체 생성
-            return ChatResponse(
-                id=response.id,
-                object="chat.completion",
-                created=int(time.time()),
-                model=model,
-                choices=[
-                    ChatChoice(
-                        index=0,
-                        message=chat_message,
-                        finish_reason=response.choices[0].finish_reason
-                    )
-                ],
-                usage=ChatUsage(
-                    prompt_tokens=prompt_tokens,
-                    completion_tokens=completion_tokens,
-                    total_tokens=total_tokens,
-                    estimated_cost=cost
-                )
-            )
+            return chat_response
             
+        except HTTPException:
+            # 스케줄러 대기 시간 초과(503) 등은 그대로 전달
+            raise
+        except (CircuitOpenError, openai.RateLimitError) as e:
+            logger.error(f"OpenAI API 호출 불가: {str(e)}")
+            raise self._upstream_error_to_http(e)
         except openai.APIError as e:
             # OpenAI API 오류 상세 로깅
             logger.error(f"OpenAI API 오류: {str(e)}")
@@ -286,6 +695,9 @@ class ChatService:
             logger.error(f"채팅 완성 생성 중 일반 오류: {str(e)}")
             logger.error(f"상세 오류 추적: {traceback.format_exc()}")
             raise HTTPException(status_code=500, detail=f"내부 서버 오류: {str(e)}")
+        finally:
+            # 실패/공유 응답은 예약 토큰을 반환 (이미 정산된 경우 무시됨)
+            self._reconcile_usage(admission, 0)
     
     async def generate_stream(
         self,
@@ -295,46 +707,103 @@ class ChatService:
         max_tokens: Optional[int] = None,
         user_id: Optional[int] = None,
         org_id: Optional[int] = None,
-        token: Optional[str] = None
-    ) -> AsyncGenerator[str, None]:
+        token: Optional[str] = None,
+        admission: Optional[Admission] = None,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        on_complete: Optional[Callable[[str], None]] = None
+    ) -> AsyncGenerator[bytes, None]:
         """
         채팅 응답을 스트리밍으로 생성합니다.
+        admission이 없으면 스트림 시작 전에 한도를 확인합니다.
+        on_complete가 있으면 스트림이 끝까지 완료된 경우 전체 응답 내용으로 호출합니다.
+        클라이언트 연결이 끊기면(is_disconnected 또는 스트림 취소) 업스트림 스트림을 즉시 닫고
+        실제 소비한 사용량만 기록합니다.
         """
         # 기본값 설정
         model = model or settings.DEFAULT_MODEL
-        temperature = temperature or settings.TEMPERATURE
+        temperature = settings.TEMPERATURE if temperature is None else temperature
         max_tokens = max_tokens or settings.MAX_TOKENS
         
+        if admission is None:
+            try:
+                admission = await self.check_rate_limit(messages, model, max_tokens, user_id, org_id)
+            except HTTPException as e:
+                yield error_frame(e.detail)
+                return
+        
+        # 토큰 사용량 추적 (업스트림 사용량 청크가 없을 때의 추정치)
+        prompt_tokens = 0
+        completion_tokens = 0
+        upstream_usage = None
+        request_id = None
+        reply_parts: List[str] = []
+        
+        stream = None
+        frames = None
+        finished = False
+        aborted = False
+        
         try:
-            # 토큰 사용량 추적
-            prompt_tokens = self._count_message_tokens(messages, model)
-            completion_tokens = 0
+            prompt_tokens = await self._count_message_tokens_async(messages, model)
             
-            # OpenAI API 스트림 호출
-            stream = await self.openai_client.chat.completions.create(
-                model=model,
-                messages=[{"role": m.role, "content": m.content} for m in messages],
-                temperature=temperature,
-                max_tokens=max_tokens,
-                n=1,
-                stream=True
-            )
+            # 과금용 최종 사용량 청크 요청
+            stream_options = {"include_usage": True} if settings.STREAM_INCLUDE_USAGE else openai.NOT_GIVEN
+            
+            # OpenAI API 스트림 호출 (스트림이 끝날 때까지 스케줄러 슬롯 점유, 대화형 우선순위)
+            # 재시도는 첫 토큰 전 스트림 생성 단계에서만 수행 (헤징 없음)
+            async with self._upstream_slot(org_id, PRIORITY_INTERACTIVE, token) as lease:
+                stream = await self._call_upstream(
+                    "chat.completions.stream",
+                    lambda client: client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": m.role, "content": m.content} for m in messages],
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        n=1,
+                        stream=True,
+                        stream_options=stream_options
+                    ),
+                    lease=lease
+                )
+                self.streams_started += 1
+                
+                async def upstream_deltas():
+                    nonlocal request_id, upstream_usage, completion_tokens
+                    async for chunk in stream:
+                        if request_id is None:
+                            request_id = chunk.id
+                        if chunk.usage is not None:
+                            # 마지막 청크 (choices 없음)
+                            upstream_usage = chunk.usage
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            # 델타는 대부분 1토큰이므로 인코딩 없이 개수로 추정
+                            completion_tokens += 1
+                            if on_complete is not None:
+                                reply_parts.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                
+                # 델타를 모아 더 적은 수의 SSE 프레임으로 응답
+                frames = self.frame_writer.coalesce(upstream_deltas())
+                async for frame in frames:
+                    yield frame
+                    if is_disconnected is not None and await is_disconnected():
+                        aborted = True
+                        return
+                finished = True
             
-            request_id = f"chatcmpl-{int(time.time())}"
-            async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    delta_content = chunk.choices[0].delta.content
-                    completion_tokens += self._count_tokens(delta_content, model)
-                    
-                    # SSE 형식으로 응답
-                    yield f"data: {json.dumps({'content': delta_content})}\n\n"
+            request_id = request_id or f"chatcmpl-{int(time.time())}"
+            if upstream_usage is not None:
+                prompt_tokens = upstream_usage.prompt_tokens
+                completion_tokens = upstream_usage.completion_tokens
+            else:
+                logger.warning(f"스트림 사용량 청크 없음, 추정치로 기록: 프롬프트={prompt_tokens}, 완성={completion_tokens}")
             
-            # 스트림 종료
-            yield f"data: [DONE]\n\n"
+            # 예약 토큰 정산
+            self._reconcile_usage(admission, prompt_tokens + completion_tokens)
             
-            # 사용량 로깅 (백그라운드로 처리)
+            # 사용량 로깅 (큐에 적재 후 백그라운드 배치 전송)
             if user_id and org_id:
-                asyncio.create_task(self._log_usage(
+                await self._log_usage(
                     user_id=user_id,
                     org_id=org_id,
                     model=model,
@@ -342,12 +811,190 @@ class ChatService:
                     completion_tokens=completion_tokens,
                     request_id=request_id,
                     token=token
-                ))
+                )
+            
+            if on_complete is not None:
+                on_complete("".join(reply_parts))
+            
+            # 스트림 종료 (사용량 기록 후 전송하여 마지막 전송 중 연결이 끊겨도 기록 유지)
+            yield DONE_FRAME
                 
+        except (asyncio.CancelledError, GeneratorExit):
+            # 클라이언트 연결 종료로 스트림 태스크가 취소되거나 제너레이터가 닫힘
+            aborted = True
+            raise
+        except HTTPException as e:
+            yield error_frame(e.detail)
+        except (CircuitOpenError, openai.RateLimitError) as e:
+            yield error_frame(self._upstream_error_to_http(e).detail)
         except openai.APIError as e:
-            yield f"data: {json.dumps({'error': f'OpenAI API 오류: {str(e)}'})}\n\n"
+            yield error_frame(f"OpenAI API 오류: {str(e)}")
         except Exception as e:
-            yield f"data: {json.dumps({'error': f'내부 서버 오류: {str(e)}'})}\n\n"
+            yield error_frame(f"내부 서버 오류: {str(e)}")
+        finally:
+            if stream is not None and not finished:
+                # 중단된 스트림: 소비한 만큼만 정산하고, 업스트림 종료와 사용량 기록은 취소 영향이 없는 별도 태스크에서 수행
+                self._reconcile_usage(admission, prompt_tokens + completion_tokens)
+                if aborted:
+                    tokens_saved = max(0, max_tokens - completion_tokens)
+                    self.streams_aborted += 1
+                    self.aborted_completion_tokens += completion_tokens
+                    self.tokens_saved_estimate += tokens_saved
+                    logger.info(f"클라이언트 연결 종료로 스트림 중단: 완성 {completion_tokens} 토큰 소비, 최대 {tokens_saved} 토큰 절약")
+                self._spawn(self._close_interrupted_stream(
+                    frames, stream, model, prompt_tokens, completion_tokens,
+                    request_id or f"chatcmpl-{int(time.time())}", user_id, org_id, token
+                ))
+            self._reconcile_usage(admission, 0)
+    
+    def _spawn(self, coro) -> None:
+        """
+        요청 수명과 무관하게 끝까지 실행되어야 하는 정리 작업을 시작합니다.
+        """
+        task = asyncio.ensure_future(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def close(self, timeout: float = 10.0) -> None:
+        """
+        진행 중인 정리 작업(중단된 스트림 종료/사용량 기록, 대화 저장)이 끝나기를 기다리고,
+        timeout 안에 끝나지 않은 작업은 취소합니다. 사용량 파이프라인 종료 전에 호출해야 합니다.
+        """
+        if not self._background_tasks:
+            return
+        _, pending = await asyncio.wait(set(self._background_tasks), timeout=timeout)
+        if pending:
+            logger.warning(f"종료 시간 초과로 백그라운드 작업 {len(pending)}건 취소")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+    
+    async def _close_interrupted_stream(
+        self,
+        frames,
+        stream,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        request_id: str,
+        user_id: Optional[int],
+        org_id: Optional[int],
+        token: Optional[str]
+    ) -> None:
+        """
+        중단된 업스트림 스트림을 닫고(생성 중단) 실제 소비한 사용량을 기록합니다.
+        """
+        try:
+            if frames is not None:
+                await frames.aclose()
+            await stream.close()
+        except Exception as e:
+            logger.warning(f"업스트림 스트림 종료 실패: {str(e)}")
+        
+        if user_id and org_id:
+            await self._log_usage(
+                user_id=user_id,
+                org_id=org_id,
+                model=model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                request_id=request_id,
+                token=token
+            )
+    
+    def stream_stats(self) -> Dict[str, Any]:
+        """
+        스트리밍 통계를 반환합니다. (tokens_saved_estimate는 max_tokens 기준 상한 추정치)
+        """
+        return {
+            "started": self.streams_started,
+            "aborted": self.streams_aborted,
+            "aborted_completion_tokens": self.aborted_completion_tokens,
+            "tokens_saved_estimate": self.tokens_saved_estimate,
+        }
+    
+    @staticmethod
+    def _last_user_message(messages: List[ChatMessage]) -> Optional[str]:
+        """
+        마지막 사용자 메시지 내용을 반환합니다.
+        """
+        for message in reversed(messages):
+            if message.role == "user":
+                return message.content
+        return None
+    
+    @staticmethod
+    def _context_system_prompt(context: str) -> str:
+        """
+        검색 컨텍스트를 넣은 RAG 시스템 프롬프트를 만듭니다.
+        """
+        return f"""다음 정보를 참고하여 질문에 답변하세요:
+
+{context}
+
+위 정보에 답이 없는 경우, 알고 있는 정보를 기반으로 답변하세요. 
+참고한 문서 제목을 응답 끝에 출처로 명시하세요."""
+    
+    async def _pack_context(
+        self,
+        messages: List[ChatMessage],
+        search_result: DocumentSearchResponse,
+        model: str,
+        max_tokens: int
+    ) -> List[DocumentSearchResult]:
+        """
+        검색 결과를 토큰 예산에 맞춰 고릅니다.
+        예산 = 모델 컨텍스트 창 - (시스템 프롬프트를 제외한 대화 이력 + RAG 프롬프트 틀) - max_tokens
+        """
+        if not search_result.results:
+            return []
+        
+        # 기존 시스템 메시지는 RAG 시스템 프롬프트로 대체됨
+        prompt_messages = [ChatMessage(role="system", content=self._context_system_prompt(""))]
+        prompt_messages.extend(message for message in messages if message.role != "system")
+        reserved = await self._count_message_tokens_async(prompt_messages, model) + max_tokens
+        
+        budget = self.context_packer.context_window(model) - reserved
+        return self.context_packer.pack(search_result.results, model, budget, search_result.query_embedding)
+    
+    def _build_context_messages(
+        self,
+        messages: List[ChatMessage],
+        results: List[DocumentSearchResult]
+    ) -> Optional[List[ChatMessage]]:
+        """
+        검색 결과를 시스템 메시지로 넣은 메시지 목록을 만듭니다. 컨텍스트가 없으면 None을 반환합니다.
+        """
+        # 컨텍스트 구성
+        context = "".join(self.context_packer.format_chunk(result) for result in results)
+        
+        if not context:
+            return None
+        
+        # 시스템 메시지 추가 또는 업데이트
+        system_message = self._context_system_prompt(context)
+        
+        # 메시지 목록 업데이트
+        updated_messages = []
+        has_system = False
+        
+        for message in messages:
+            if message.role == "system":
+                updated_messages.append(ChatMessage(
+                    role="system",
+                    content=system_message
+                ))
+                has_system = True
+            else:
+                updated_messages.append(message)
+        
+        if not has_system:
+            updated_messages.insert(0, ChatMessage(
+                role="system",
+                content=system_message
+            ))
+        
+        return updated_messages
     
     async def generate_with_context(
         self,
@@ -365,15 +1012,11 @@ class ChatService:
         """
         # 기본값 설정
         model = model or settings.DEFAULT_MODEL
-        temperature = temperature or settings.TEMPERATURE
+        temperature = settings.TEMPERATURE if temperature is None else temperature
         max_tokens = max_tokens or settings.MAX_TOKENS
         
         # 마지막 사용자 메시지 추출
-        last_user_message = None
-        for message in reversed(messages):
-            if message.role == "user":
-                last_user_message = message.content
-                break
+        last_user_message = self._last_user_message(messages)
         
         if not last_user_message:
             return await self.generate_completion(
@@ -386,52 +1029,122 @@ class ChatService:
                 search_result = await self.doc_service.search_documents(
                     query=last_user_message,
                     org_id=org_id,
-                    limit=5
+                    limit=settings.RAG_SEARCH_CANDIDATES,
+                    include_embeddings=True
                 )
                 
-                # 컨텍스트 구성
-                context = ""
-                for result in search_result.results:
-                    context += f"--- {result.document_title} ---\n{result.content}\n\n"
-                
-                if context:
-                    # 시스템 메시지 추가 또는 업데이트
-                    system_message = f"""다음 정보를 참고하여 질문에 답변하세요:
-
-{context}
-
-위 정보에 답이 없는 경우, 알고 있는 정보를 기반으로 답변하세요. 
-참고한 문서 제목을 응답 끝에 출처로 명시하세요."""
-                    
-                    # 메시지 목록 업데이트
-                    updated_messages = []
-                    has_system = False
-                    
-                    for message in messages:
-                        if message.role == "system":
-                            updated_messages.append(ChatMessage(
-                                role="system",
-                                content=system_message
-                            ))
-                            has_system = True
-                        else:
-                            updated_messages.append(message)
-                    
-                    if not has_system:
-                        updated_messages.insert(0, ChatMessage(
-                            role="system",
-                            content=system_message
-                        ))
-                    
-                    # 업데이트된 메시지로 응답 생성
+                # 토큰 예산에 맞춰 중복 제거/다양성 선택 후 컨텍스트 구성
+                packed_results = await self._pack_context(messages, search_result, model, max_tokens)
+                updated_messages = self._build_context_messages(messages, packed_results)
+                if updated_messages is not None:
+                    # 업데이트된 메시지로 응답 생성 (RAG는 배치 우선순위)
                     return await self.generate_completion(
-                        updated_messages, model, temperature, max_tokens, user_id, org_id, token
+                        updated_messages, model, temperature, max_tokens, user_id, org_id, token,
+                        priority=PRIORITY_BATCH
                     )
             
             # 컨텍스트 없이 기본 응답 생성
             return await self.generate_completion(
-                messages, model, temperature, max_tokens, user_id, org_id, token
+                messages, model, temperature, max_tokens, user_id, org_id, token,
+                priority=PRIORITY_BATCH
+            )
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"컨텍스트 검색 오류: {str(e)}")
+    
+    async def start_context_search(
+        self,
+        messages: List[ChatMessage],
+        org_id: Optional[int]
+    ) -> Optional[asyncio.Task]:
+        """
+        마지막 사용자 메시지로 문서 검색을 즉시 시작합니다.
+        검색이 첫 I/O까지 진행하도록 한 번 양보하므로, 이후의 토큰 계산/한도 확인과 겹쳐 실행됩니다.
+        """
+        last_user_message = self._last_user_message(messages)
+        if not org_id or not last_user_message:
+            return None
+        
+        search_task = asyncio.ensure_future(self.doc_service.search_documents(
+            query=last_user_message,
+            org_id=org_id,
+            limit=settings.RAG_SEARCH_CANDIDATES,
+            include_embeddings=True
+        ))
+        await asyncio.sleep(0)
+        return search_task
+    
+    async def generate_stream_with_context(
+        self,
+        messages: List[ChatMessage],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        user_id: Optional[int] = None,
+        org_id: Optional[int] = None,
+        token: Optional[str] = None,
+        admission: Optional[Admission] = None,
+        search_task: Optional[asyncio.Task] = None,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        on_complete: Optional[Callable[[str], None]] = None
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        관련 문서 컨텍스트를 포함한 채팅 응답을 스트리밍으로 생성합니다. (RAG)
+        검색이 끝나는 즉시 sources 이벤트를 보내고, 이어서 응답 토큰을 스트리밍합니다.
+        """
+        # 기본값 설정
+        model = model or settings.DEFAULT_MODEL
+        temperature = settings.TEMPERATURE if temperature is None else temperature
+        max_tokens = max_tokens or settings.MAX_TOKENS
+        
+        answer_stream = None
+        try:
+            if search_task is None:
+                search_task = await self.start_context_search(messages, org_id)
+            
+            # 검색과 병렬로 한도 확인
+            if admission is None:
+                admission = await self.check_rate_limit(messages, model, max_tokens, user_id, org_id)
+            
+            updated_messages = None
+            if search_task is not None:
+                search_result = await search_task
+                packed_results = await self._pack_context(messages, search_result, model, max_tokens)
+                
+                # 검색 결과를 답변보다 먼저 전송
+                yield named_event_frame("sources", {
+                    "sources": [
+                        {
+                            "id": result.id,
+                            "document_id": result.document_id,
+                            "document_title": result.document_title,
+                            "score": result.score,
+                        }
+                        for result in packed_results
+                    ]
+                })
+                updated_messages = self._build_context_messages(messages, packed_results)
+            
+            answer_stream = self.generate_stream(
+                updated_messages or messages, model, temperature, max_tokens, user_id, org_id, token,
+                admission=admission,
+                is_disconnected=is_disconnected,
+                on_complete=on_complete
             )
+            async for frame in answer_stream:
+                yield frame
             
+        except HTTPException as e:
+            yield error_frame(e.detail)
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"컨텍스트 검색 오류: {str(e)}") 
+            yield error_frame(f"컨텍스트 검색 오류: {str(e)}")
+        finally:
+            if search_task is not None and not search_task.done():
+                search_task.cancel()
+            if answer_stream is not None:
+                # 연결 종료 시 내부 스트림도 바로 닫아 업스트림 스트림을 정리
+                await answer_stream.aclose()
+            # 스트림 시작 전에 끝난 경우 예약 토큰 반환 (이미 정산된 경우 무시됨)
+            self._reconcile_usage(admission, 0)
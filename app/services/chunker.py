@@ -0,0 +1,102 @@
+import re
+from typing import Any, Iterator, List, Tuple
+
+# 문장 끝(마침표/물음표/느낌표 + 닫는 따옴표/괄호 + 공백) 또는 줄바꿈에서 나눔
+# 숫자 안의 마침표(3.14)처럼 뒤에 공백이 없는 경우는 나누지 않음
+_SEGMENT_END = re.compile(r"[.!?。！？…]+[\"'”’)\]]*(?:\s+|$)|\n\s*")
+_WORD_END = re.compile(r"\S+\s*")
+
+
+def _split_segments(text: str, pattern: "re.Pattern[str]") -> List[str]:
+    """
+    구분 위치에서 텍스트를 나눕니다. (조각을 이어 붙이면 원문과 같음)
+    """
+    segments = []
+    start = 0
+    for match in pattern.finditer(text):
+        end = match.end()
+        if end > start:
+            segments.append(text[start:end])
+            start = end
+    if start < len(text):
+        segments.append(text[start:])
+    return segments
+
+
+class TokenChunker:
+    """
+    토큰 수 기준 청커
+
+    - 문단/문장 경계에서 나눈 조각을 chunk_tokens 토큰에 맞춰 이어 붙이고,
+      이전 청크의 끝 조각을 overlap_tokens 토큰 이내로 다음 청크 앞에 겹칩니다.
+    - 조각별 토큰 수는 encode_ordinary_batch 한 번으로 계산합니다. (청크마다 다시 인코딩하지 않음)
+    - chunk_tokens보다 긴 문장은 단어 단위로, 그래도 긴 단어는 토큰 단위로 나눕니다.
+    - split_text 인터페이스는 LangChain 텍스트 분할기와 같습니다.
+    """
+
+    def __init__(self, encoding: Any, chunk_tokens: int = 500, overlap_tokens: int = 50, num_threads: int = 1):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens는 chunk_tokens보다 작아야 합니다.")
+        self.encoding = encoding
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.num_threads = num_threads
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        텍스트를 토큰 수 기준 청크로 나눕니다.
+        """
+        segments = self._measure(_split_segments(text, _SEGMENT_END))
+        return [chunk for chunk in self._merge(segments) if chunk.strip()]
+
+    def _measure(self, segments: List[str]) -> List[Tuple[str, int, bool]]:
+        """
+        조각별 (텍스트, 토큰 수, 문단 끝 여부)를 계산하고, 너무 긴 조각은 더 잘게 나눕니다.
+        """
+        lengths = [len(tokens) for tokens in self.encoding.encode_ordinary_batch(segments, num_threads=self.num_threads)]
+        measured: List[Tuple[str, int, bool]] = []
+        for segment, length in zip(segments, lengths):
+            if length <= self.chunk_tokens:
+                measured.append((segment, length, segment.count("\n") >= 2))
+            else:
+                measured.extend(self._split_long(segment))
+        return measured
+
+    def _split_long(self, segment: str) -> List[Tuple[str, int, bool]]:
+        words = _split_segments(segment, _WORD_END)
+        pieces: List[Tuple[str, int, bool]] = []
+        for word, tokens in zip(words, self.encoding.encode_ordinary_batch(words, num_threads=self.num_threads)):
+            if len(tokens) <= self.chunk_tokens:
+                pieces.append((word, len(tokens), False))
+                continue
+            # 공백 없이 긴 텍스트는 토큰 구간 단위로 디코딩 (구간 경계의 깨진 문자는 제외)
+            for start in range(0, len(tokens), self.chunk_tokens):
+                window = tokens[start:start + self.chunk_tokens]
+                piece = self.encoding.decode_bytes(window).decode("utf-8", errors="ignore")
+                pieces.append((piece, len(window), False))
+        return pieces
+
+    def _merge(self, segments: List[Tuple[str, int, bool]]) -> Iterator[str]:
+        start = 0
+        while start < len(segments):
+            end = start
+            total = 0
+            while end < len(segments) and total + segments[end][1] <= self.chunk_tokens:
+                total += segments[end][1]
+                end += 1
+                # 청크가 충분히 찼으면 문단 경계에서 끊음
+                if segments[end - 1][2] and total >= self.chunk_tokens * 3 // 4:
+                    break
+            if end == start:
+                end = start + 1
+            yield "".join(segment for segment, _, _ in segments[start:end])
+            if end >= len(segments):
+                break
+
+            # 끝 조각들을 overlap_tokens 이내로 다음 청크 앞에 겹침 (최소 한 조각은 전진)
+            next_start = end
+            overlap = 0
+            while next_start - 1 > start and overlap + segments[next_start - 1][1] <= self.overlap_tokens:
+                next_start -= 1
+                overlap += segments[next_start][1]
+            start = next_start
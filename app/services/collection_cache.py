@@ -0,0 +1,135 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class CollectionHandle:
+    """
+    캐시된 Chroma 컬렉션 핸들과 메타데이터
+    """
+
+    __slots__ = ("name", "collection", "metadata", "expires_at")
+
+    def __init__(self, name: str, collection: Any, expires_at: float):
+        self.name = name
+        self.collection = collection
+        self.metadata: Dict[str, Any] = dict(getattr(collection, "metadata", None) or {})
+        self.expires_at = expires_at
+
+
+class CollectionCache:
+    """
+    조직별 Chroma 컬렉션 핸들 LRU 캐시
+
+    - 검색마다 get_collection을 다시 호출하지 않도록 컬렉션 객체와 메타데이터를 보관합니다.
+    - 없는 컬렉션은 negative_ttl(초) 동안 음성 항목으로 기억해 빈 검색의 조회 비용도 줄입니다.
+    - 다른 워커에서 생성/삭제된 컬렉션을 반영하도록 항목은 ttl(초) 후 만료됩니다.
+    - 같은 컬렉션의 동시 조회는 한 번의 로드를 공유하며, 문서 생성/삭제 시 invalidate로 무효화합니다.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0, negative_ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._entries: "OrderedDict[str, Optional[CollectionHandle]]" = OrderedDict()
+        self._negative_expires: Dict[str, float] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._versions: Dict[str, int] = {}
+
+        # 통계 카운터
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    async def get(
+        self,
+        name: str,
+        loader: Callable[[], Awaitable[Optional[Any]]]
+    ) -> Optional[CollectionHandle]:
+        """
+        컬렉션 핸들을 반환합니다. 없으면 loader로 읽으며, 컬렉션이 없으면 None을 반환합니다.
+        """
+        now = time.monotonic()
+        if name in self._entries:
+            handle = self._entries[name]
+            expires_at = handle.expires_at if handle is not None else self._negative_expires[name]
+            if expires_at > now:
+                self._entries.move_to_end(name)
+                if handle is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                return handle
+            self._remove(name)
+
+        future = self._loading.get(name)
+        if future is None:
+            self.misses += 1
+            future = asyncio.ensure_future(self._load(name, loader))
+            self._loading[name] = future
+            future.add_done_callback(lambda f: self._load_done(name, f))
+        # shield: 대기자 하나가 취소되어도 공유 로드는 계속 진행
+        return await asyncio.shield(future)
+
+    async def _load(
+        self,
+        name: str,
+        loader: Callable[[], Awaitable[Optional[Any]]]
+    ) -> Optional[CollectionHandle]:
+        version = self._versions.get(name, 0)
+        collection = await loader()
+
+        now = time.monotonic()
+        handle = CollectionHandle(name, collection, now + self.ttl) if collection is not None else None
+        # 로드 중에 무효화되었으면 오래된 결과를 캐시에 넣지 않음
+        if self._versions.get(name, 0) == version:
+            self._remove(name)
+            self._entries[name] = handle
+            if handle is None:
+                self._negative_expires[name] = now + self.negative_ttl
+            self._evict()
+        return handle
+
+    def _load_done(self, name: str, future: asyncio.Future) -> None:
+        if self._loading.get(name) is future:
+            del self._loading[name]
+
+    def invalidate(self, name: str) -> None:
+        """
+        컬렉션 핸들을 캐시에서 제거합니다. (문서 생성/삭제 시)
+        """
+        self._versions[name] = self._versions.get(name, 0) + 1
+        self._loading.pop(name, None)
+        if name in self._entries:
+            self._remove(name)
+            self.invalidations += 1
+
+    def _remove(self, name: str) -> None:
+        self._entries.pop(name, None)
+        self._negative_expires.pop(name, None)
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            name, _ = self._entries.popitem(last=False)
+            self._negative_expires.pop(name, None)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        컬렉션 캐시 통계를 반환합니다.
+        """
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "negative_entries": len(self._negative_expires),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,336 @@
+import asyncio
+import logging
+from typing import Dict, Optional, Union, Any
+
+import httpx
+import openai
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services.backend_client import backend_client
+from app.services.cache import CompletionCache
+from app.services.chat import ChatService
+from app.services.conversations import ConversationStore
+from app.services.document import DocumentService
+from app.services.history import HistoryManager
+from app.services.outbox import UsageOutbox
+from app.services.rate_limit import RateLimiter
+from app.services.resilience import ResiliencePolicy
+from app.services.scheduler import UpstreamScheduler
+from app.services.semantic_cache import SemanticCache
+from app.services.singleflight import SingleFlight
+from app.services.tokens import TokenCounter
+from app.services.upstream_pool import UpstreamPool
+from app.services.usage import UsageLogPipeline
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """
+    프로세스 단위로 공유되는 서비스/클라이언트 컨테이너
+
+    애플리케이션 시작 시 한 번만 OpenAI 클라이언트, 임베딩 모델, Chroma 클라이언트를
+    생성하고, 종료 시 커넥션 풀을 정리합니다.
+    """
+
+    def __init__(self):
+        self.upstream_pool: Optional[UpstreamPool] = None
+        self.openai_client: Optional[openai.AsyncOpenAI] = None
+        self.completion_cache: Optional[CompletionCache] = None
+        self.semantic_cache: Optional[SemanticCache] = None
+        self.completion_flight: Optional[SingleFlight] = None
+        self.search_flight: Optional[SingleFlight] = None
+        self.usage_pipeline: Optional[Union[UsageLogPipeline, UsageOutbox]] = None
+        self.rate_limiter: Optional[RateLimiter] = None
+        self.scheduler: Optional[UpstreamScheduler] = None
+        self.resilience: Optional[ResiliencePolicy] = None
+        self.token_counter: Optional[TokenCounter] = None
+        self.history_manager: Optional[HistoryManager] = None
+        self.conversation_store: Optional[ConversationStore] = None
+        self.document_service: Optional[DocumentService] = None
+        self.chat_service: Optional[ChatService] = None
+
+    async def startup(self) -> None:
+        """
+        공유 클라이언트와 서비스를 생성합니다.
+        """
+        # 토큰 인코딩(BPE 파일) 로드는 블로킹이므로 스레드에서 미리 수행
+        self.token_counter = TokenCounter(
+            memo_size=settings.TOKEN_COUNT_MEMO_SIZE,
+            offload_threshold=settings.TOKEN_COUNT_OFFLOAD_THRESHOLD,
+            max_workers=settings.TOKEN_COUNT_THREADS,
+        )
+        await asyncio.to_thread(self.token_counter.warmup, settings.TOKEN_WARMUP_MODELS)
+
+        if settings.RESILIENCE_ENABLED:
+            self.resilience = ResiliencePolicy(
+                max_retries=settings.RESILIENCE_MAX_RETRIES,
+                backoff_base=settings.RESILIENCE_BACKOFF_BASE,
+                backoff_max=settings.RESILIENCE_BACKOFF_MAX,
+                hedge_enabled=settings.RESILIENCE_HEDGE_ENABLED,
+                hedge_percentile=settings.RESILIENCE_HEDGE_PERCENTILE,
+                hedge_min_samples=settings.RESILIENCE_HEDGE_MIN_SAMPLES,
+                breaker_failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                breaker_recovery_timeout=settings.CIRCUIT_BREAKER_RECOVERY_TIMEOUT,
+            )
+        # 재시도는 ResiliencePolicy가 담당하므로 SDK 자체 재시도는 끔 (중복 재시도 방지)
+        max_retries = 0 if self.resilience is not None else None
+
+        # 업스트림 대상별 OpenAI 클라이언트와 커넥션 풀 (keep-alive 재사용)
+        self.upstream_pool = UpstreamPool(
+            ewma_alpha=settings.UPSTREAM_EWMA_ALPHA,
+            eject_consecutive_failures=settings.UPSTREAM_EJECT_CONSECUTIVE_FAILURES,
+            eject_error_rate=settings.UPSTREAM_EJECT_ERROR_RATE,
+            eject_base_duration=settings.UPSTREAM_EJECT_BASE_DURATION,
+            eject_max_duration=settings.UPSTREAM_EJECT_MAX_DURATION,
+            eject_reset_after=settings.UPSTREAM_EJECT_RESET_AFTER,
+        )
+        upstreams = settings.OPENAI_UPSTREAMS or [{"name": "default"}]
+        for index, upstream in enumerate(upstreams):
+            api_key = upstream.get("api_key")
+            base_url = upstream.get("base_url")
+            self.upstream_pool.add_target(
+                name=upstream.get("name") or f"upstream-{index}",
+                base_url=base_url,
+                client_factory=lambda http_client, api_key=api_key, base_url=base_url: ChatService.create_openai_client(
+                    http_client=http_client,
+                    max_retries=max_retries,
+                    api_key=api_key,
+                    base_url=base_url,
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=10.0),
+            )
+        self.openai_client = self.upstream_pool.primary_client
+
+        if settings.COMPLETION_CACHE_ENABLED:
+            self.completion_cache = CompletionCache(
+                max_entries=settings.COMPLETION_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.COMPLETION_CACHE_TTL,
+                max_temperature=settings.COMPLETION_CACHE_MAX_TEMPERATURE,
+            )
+
+        if settings.SINGLEFLIGHT_ENABLED:
+            self.completion_flight = SingleFlight("completion")
+            self.search_flight = SingleFlight("search")
+
+        if settings.USAGE_OUTBOX_ENABLED and not settings.BACKEND_SERVICE_TOKEN:
+            logger.warning("BACKEND_SERVICE_TOKEN이 설정되지 않아 사용량 아웃박스 대신 메모리 큐를 사용합니다.")
+
+        if settings.USAGE_OUTBOX_ENABLED and settings.BACKEND_SERVICE_TOKEN:
+            # 디스크 기반 아웃박스 (재시작/백엔드 장애 시에도 유실 없음, 서비스 토큰으로 재전송)
+            self.usage_pipeline = UsageOutbox(
+                backend_client,
+                service_token=settings.BACKEND_SERVICE_TOKEN,
+                path=settings.USAGE_OUTBOX_PATH,
+                batch_size=settings.USAGE_LOG_BATCH_SIZE,
+                poll_interval=settings.USAGE_LOG_FLUSH_INTERVAL,
+                retry_base=settings.USAGE_OUTBOX_RETRY_BASE,
+                retry_max=settings.USAGE_OUTBOX_RETRY_MAX,
+                max_attempts=settings.USAGE_OUTBOX_MAX_ATTEMPTS,
+            )
+        else:
+            self.usage_pipeline = UsageLogPipeline(
+                backend_client,
+                max_queue_size=settings.USAGE_LOG_QUEUE_SIZE,
+                batch_size=settings.USAGE_LOG_BATCH_SIZE,
+                flush_interval=settings.USAGE_LOG_FLUSH_INTERVAL,
+                overflow_policy=settings.USAGE_LOG_OVERFLOW_POLICY,
+                enqueue_timeout=settings.USAGE_LOG_ENQUEUE_TIMEOUT,
+                max_attempts=settings.USAGE_LOG_MAX_ATTEMPTS,
+            )
+        self.usage_pipeline.start()
+
+        if settings.RATE_LIMIT_ENABLED:
+            sync_fn = None
+            if settings.RATE_LIMIT_SYNC_ENABLED and not settings.BACKEND_SERVICE_TOKEN:
+                logger.warning("BACKEND_SERVICE_TOKEN이 설정되지 않아 사용량 카운터를 동기화하지 않습니다.")
+            if settings.RATE_LIMIT_SYNC_ENABLED and settings.BACKEND_SERVICE_TOKEN:
+                # 사용량 카운터를 백엔드와 주기적으로 동기화
+                async def sync_fn(counters: Dict[str, Any]) -> Dict[str, Any]:
+                    return await backend_client.sync_usage_counters(settings.BACKEND_SERVICE_TOKEN, counters)
+
+            self.rate_limiter = RateLimiter(
+                user_rpm=settings.RATE_LIMIT_USER_RPM,
+                user_tpm=settings.RATE_LIMIT_USER_TPM,
+                org_rpm=settings.RATE_LIMIT_ORG_RPM,
+                org_tpm=settings.RATE_LIMIT_ORG_TPM,
+                sync_interval=settings.RATE_LIMIT_SYNC_INTERVAL,
+                sync_fn=sync_fn,
+            )
+            self.rate_limiter.start()
+
+        if settings.SCHEDULER_ENABLED:
+            # 조직 플랜은 백엔드에서 조회 (요청 토큰이 없으면 서비스 토큰 사용)
+            async def resolve_tier(org_id: int, token: str) -> Optional[str]:
+                org = await backend_client.get_organization_data(org_id, token)
+                return (org or {}).get("subscriptionPlan")
+
+            self.scheduler = UpstreamScheduler(
+                max_concurrency=settings.SCHEDULER_MAX_CONCURRENCY,
+                max_wait=settings.SCHEDULER_MAX_WAIT,
+                tier_weights=settings.SCHEDULER_TIER_WEIGHTS,
+                tier_resolver=resolve_tier,
+                service_token=settings.BACKEND_SERVICE_TOKEN,
+                tier_ttl=settings.SCHEDULER_TIER_TTL,
+            )
+
+        if settings.HISTORY_TRIM_ENABLED:
+            self.history_manager = HistoryManager(
+                self.token_counter,
+                summary_max_tokens=settings.HISTORY_SUMMARY_MAX_TOKENS,
+                max_summaries=settings.HISTORY_SUMMARY_CACHE_SIZE,
+            )
+
+        if settings.CONVERSATION_STORE_ENABLED:
+            self.conversation_store = ConversationStore(
+                path=settings.CONVERSATION_STORE_PATH,
+                max_in_memory=settings.CONVERSATION_CACHE_SIZE,
+                ttl_seconds=settings.CONVERSATION_TTL,
+            )
+            await self.conversation_store.start()
+
+        self.document_service = DocumentService(search_flight=self.search_flight)
+
+        if settings.SEMANTIC_CACHE_ENABLED:
+            # DocumentService가 보유한 임베딩 모델(마이크로 배처가 있으면 배처)을 재사용
+            self.semantic_cache = SemanticCache(
+                embedding_model=self.document_service.query_embedder or self.document_service.embedding_model,
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                capacity_per_org=settings.SEMANTIC_CACHE_CAPACITY_PER_ORG,
+                ttl_seconds=settings.SEMANTIC_CACHE_TTL,
+                max_temperature=settings.COMPLETION_CACHE_MAX_TEMPERATURE,
+                max_orgs=settings.SEMANTIC_CACHE_MAX_ORGS,
+            )
+            # 조직 문서가 바뀌면 이전 문서 기준의 답변이 남지 않도록 조직 인덱스를 비움
+            self.document_service.change_listeners.append(self.semantic_cache.invalidate_org)
+
+        self.chat_service = ChatService(
+            openai_client=self.openai_client,
+            doc_service=self.document_service,
+            completion_cache=self.completion_cache,
+            semantic_cache=self.semantic_cache,
+            completion_flight=self.completion_flight,
+            usage_pipeline=self.usage_pipeline,
+            rate_limiter=self.rate_limiter,
+            scheduler=self.scheduler,
+            resilience=self.resilience,
+            upstream_pool=self.upstream_pool,
+            token_counter=self.token_counter,
+            history_manager=self.history_manager,
+            conversation_store=self.conversation_store,
+        )
+        if self.history_manager is not None and settings.HISTORY_SUMMARY_ENABLED:
+            # 요약은 ChatService의 업스트림 호출 경로(대상 풀/재시도/스케줄러)를 사용
+            self.history_manager.summarize_fn = self.chat_service.summarize_history
+        logger.info("서비스 컨테이너 초기화 완료")
+
+    async def shutdown(self) -> None:
+        """
+        남은 사용량 이벤트를 전송하고 공유 클라이언트의 연결을 종료합니다.
+        사용량을 만드는 작업(요약, 중단된 스트림 정리)을 먼저 끝낸 뒤 사용량 파이프라인을 마지막에 종료합니다.
+        """
+        if self.history_manager is not None:
+            await self.history_manager.close()
+        if self.chat_service is not None:
+            await self.chat_service.close()
+
+        if self.usage_pipeline is not None:
+            await self.usage_pipeline.stop()
+        if self.rate_limiter is not None:
+            await self.rate_limiter.stop()
+
+        if self.document_service is not None:
+            await self.document_service.close()
+        if self.conversation_store is not None:
+            # 메모리의 대화를 디스크에 기록 (재시작 후에도 유지)
+            await self.conversation_store.close()
+        if self.upstream_pool is not None:
+            await self.upstream_pool.close()
+        if self.token_counter is not None:
+            self.token_counter.close()
+
+        self.chat_service = None
+        self.document_service = None
+        self.completion_cache = None
+        self.semantic_cache = None
+        self.completion_flight = None
+        self.search_flight = None
+        self.usage_pipeline = None
+        self.rate_limiter = None
+        self.scheduler = None
+        self.resilience = None
+        self.token_counter = None
+        self.history_manager = None
+        self.conversation_store = None
+        self.openai_client = None
+        self.upstream_pool = None
+        logger.info("서비스 컨테이너 종료 완료")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        공유 컴포넌트의 런타임 통계를 반환합니다.
+        """
+        stats: Dict[str, Any] = {}
+        if self.usage_pipeline is not None:
+            stats["usage_pipeline"] = self.usage_pipeline.stats()
+        if self.rate_limiter is not None:
+            stats["rate_limiter"] = self.rate_limiter.stats()
+        if self.scheduler is not None:
+            stats["scheduler"] = self.scheduler.stats()
+        if self.resilience is not None:
+            stats["resilience"] = self.resilience.stats()
+        if self.upstream_pool is not None:
+            stats["upstream_pool"] = self.upstream_pool.stats()
+        if self.token_counter is not None:
+            stats["token_counter"] = self.token_counter.stats()
+        if self.history_manager is not None:
+            stats["history"] = self.history_manager.stats()
+        if self.conversation_store is not None:
+            stats["conversations"] = self.conversation_store.stats()
+        if self.chat_service is not None:
+            stats["streams"] = self.chat_service.stream_stats()
+            stats["context_packer"] = self.chat_service.context_packer.stats()
+        if self.document_service is not None:
+            stats["document_search"] = self.document_service.stats()
+            stats["collection_cache"] = self.document_service.collection_cache.stats()
+            stats["ingestion"] = self.document_service.ingestion.stats()
+            if self.document_service.query_batcher is not None:
+                stats["query_embedder"] = self.document_service.query_batcher.stats()
+            if self.document_service.embedding_cache is not None:
+                stats["embedding_cache"] = self.document_service.embedding_cache.stats()
+        if self.completion_cache is not None:
+            stats["completion_cache"] = self.completion_cache.stats()
+        if self.semantic_cache is not None:
+            stats["semantic_cache"] = self.semantic_cache.stats()
+        if self.completion_flight is not None:
+            stats["completion_singleflight"] = self.completion_flight.stats()
+        if self.search_flight is not None:
+            stats["search_singleflight"] = self.search_flight.stats()
+        return stats
+
+
+# 싱글턴 인스턴스
+container = ServiceContainer()
+
+
+def get_chat_service() -> ChatService:
+    """
+    공유 ChatService 인스턴스를 반환합니다. (FastAPI 의존성)
+    """
+    if container.chat_service is None:
+        raise HTTPException(status_code=503, detail="채팅 서비스가 초기화되지 않았습니다.")
+    return container.chat_service
+
+
+def get_document_service() -> DocumentService:
+    """
+    공유 DocumentService 인스턴스를 반환합니다. (FastAPI 의존성)
+    """
+    if container.document_service is None:
+        raise HTTPException(status_code=503, detail="문서 서비스가 초기화되지 않았습니다.")
+    return container.document_service
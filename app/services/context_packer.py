@@ -0,0 +1,237 @@
+import logging
+import re
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from app.schemas.document import DocumentSearchResult
+from app.services.tokens import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class ContextPacker:
+    """
+    RAG 검색 결과를 토큰 예산에 맞춰 프롬프트 컨텍스트로 고르는 패커
+
+    - 같은 내용이거나 다른 청크에 포함된 청크, 임베딩이 거의 같은 청크를 제거합니다.
+    - 같은 문서의 인접 청크가 겹치는 부분(CHUNK_OVERLAP)은 한 번만 보내도록 잘라냅니다.
+    - MMR(Maximal Marginal Relevance)로 관련도와 다양성을 함께 고려해 순서대로 선택하고,
+      예산을 넘는 청크는 건너뛰어 남은 예산을 더 작은 관련 청크로 채웁니다.
+    - 선택한 청크는 토큰당 관련도(관련도 / 토큰 수)가 높은 순서로 배치합니다.
+    - 임베딩이 없으면 검색 거리 기반 관련도만 사용합니다.
+    """
+
+    def __init__(
+        self,
+        token_counter: TokenCounter,
+        max_context_tokens: int = 3000,
+        mmr_lambda: float = 0.7,
+        duplicate_threshold: float = 0.97,
+        min_overlap_chars: int = 50,
+        context_windows: Optional[Dict[str, int]] = None,
+        default_context_window: int = 8192
+    ):
+        self.token_counter = token_counter
+        self.max_context_tokens = max_context_tokens
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.min_overlap_chars = min_overlap_chars
+        self.context_windows = context_windows or {}
+        self.default_context_window = default_context_window
+
+        # 통계 카운터
+        self.packs = 0
+        self.candidates = 0
+        self.selected = 0
+        self.duplicates_dropped = 0
+        self.overlaps_trimmed = 0
+        self.over_budget_skipped = 0
+        self.candidate_tokens = 0
+        self.packed_tokens = 0
+
+    def context_window(self, model: str) -> int:
+        """
+        모델의 컨텍스트 창 크기를 반환합니다. (가장 긴 접두사 일치)
+        """
+        best = None
+        for prefix in self.context_windows:
+            if model.startswith(prefix) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        return self.context_windows[best] if best is not None else self.default_context_window
+
+    @staticmethod
+    def format_chunk(result: DocumentSearchResult) -> str:
+        """
+        시스템 프롬프트에 들어가는 청크 블록 형식
+        """
+        return f"--- {result.document_title} ---\n{result.content}\n\n"
+
+    def pack(
+        self,
+        results: List[DocumentSearchResult],
+        model: str,
+        budget: int,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[DocumentSearchResult]:
+        """
+        검색 결과 중 토큰 예산(budget)에 맞는 청크를 골라 토큰당 관련도 순서로 반환합니다.
+        """
+        budget = min(budget, self.max_context_tokens)
+        self.packs += 1
+        self.candidates += len(results)
+        if not results or budget <= 0:
+            return []
+
+        vectors = self._normalized_embeddings(results)
+        relevance = self._relevance(results, vectors, query_embedding)
+        similarity = vectors @ vectors.T if vectors is not None else None
+
+        # 관련도 순으로 중복 제거 및 겹침 잘라내기
+        kept: List[int] = []
+        contents: Dict[int, str] = {}
+        for i in sorted(range(len(results)), key=lambda i: -relevance[i]):
+            content = self._dedupe(i, results, kept, contents, similarity)
+            if content is None:
+                self.duplicates_dropped += 1
+                continue
+            kept.append(i)
+            contents[i] = content
+
+        chunks = {
+            i: results[i] if contents[i] == results[i].content
+            else results[i].model_copy(update={"content": contents[i]})
+            for i in kept
+        }
+        tokens = {i: self.token_counter.count_cached(self.format_chunk(chunks[i]), model) for i in kept}
+        self.candidate_tokens += sum(tokens.values())
+
+        # MMR 탐욕 선택 (예산을 넘는 청크는 건너뜀)
+        selected: List[int] = []
+        remaining = budget
+        candidates = list(kept)
+        while candidates:
+            best, best_score = None, -np.inf
+            for i in candidates:
+                if tokens[i] > remaining:
+                    continue
+                score = relevance[i]
+                if similarity is not None and selected:
+                    redundancy = max(float(similarity[i, j]) for j in selected)
+                    score = self.mmr_lambda * relevance[i] - (1.0 - self.mmr_lambda) * redundancy
+                if score > best_score:
+                    best, best_score = i, score
+            if best is None:
+                self.over_budget_skipped += len(candidates)
+                break
+            selected.append(best)
+            candidates.remove(best)
+            remaining -= tokens[best]
+
+        self.selected += len(selected)
+        self.packed_tokens += budget - remaining
+
+        # 선택은 MMR 순서, 배치는 토큰당 관련도 순서 (짧고 관련도 높은 청크를 앞에)
+        selected.sort(key=lambda i: -relevance[i] / max(tokens[i], 1))
+        return [chunks[i] for i in selected]
+
+    # ------------------------------------------------------------------
+    # 관련도/중복 판정
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _normalized_embeddings(results: List[DocumentSearchResult]) -> Optional[np.ndarray]:
+        if any(result.embedding is None for result in results):
+            return None
+        vectors = np.asarray([result.embedding for result in results], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @staticmethod
+    def _relevance(
+        results: List[DocumentSearchResult],
+        vectors: Optional[np.ndarray],
+        query_embedding: Optional[List[float]]
+    ) -> List[float]:
+        """
+        청크별 관련도 (클수록 관련). 임베딩이 있으면 질의와의 코사인 유사도, 없으면 검색 거리로 계산합니다.
+        """
+        if vectors is not None and query_embedding is not None:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norm = float(np.linalg.norm(query))
+            if norm > 0:
+                return [float(sim) for sim in vectors @ (query / norm)]
+        # Chroma 점수는 거리 (작을수록 관련)
+        return [1.0 / (1.0 + max(result.score, 0.0)) for result in results]
+
+    def _dedupe(
+        self,
+        i: int,
+        results: List[DocumentSearchResult],
+        kept: List[int],
+        contents: Dict[int, str],
+        similarity: Optional[np.ndarray]
+    ) -> Optional[str]:
+        """
+        이미 고른 청크와 비교해 중복이면 None, 겹치는 부분이 있으면 잘라낸 내용을 반환합니다.
+        """
+        content = results[i].content
+        normalized = _WHITESPACE.sub(" ", content).strip()
+        if not normalized:
+            return None
+
+        for j in kept:
+            if similarity is not None and similarity[i, j] >= self.duplicate_threshold:
+                return None
+            kept_normalized = _WHITESPACE.sub(" ", contents[j]).strip()
+            if normalized in kept_normalized:
+                return None
+            if results[i].document_id != results[j].document_id:
+                continue
+
+            # 같은 문서의 인접 청크: 앞뒤로 겹치는 부분 제거
+            overlap = self._overlap(contents[j], content)
+            if overlap:
+                content = content[overlap:]
+            else:
+                overlap = self._overlap(content, contents[j])
+                if overlap:
+                    content = content[:-overlap]
+            if overlap:
+                self.overlaps_trimmed += 1
+                if not content.strip():
+                    return None
+        return content
+
+    def _overlap(self, head: str, tail: str) -> int:
+        """
+        head의 끝과 tail의 시작이 겹치는 길이 (min_overlap_chars 미만이면 0)
+        """
+        if min(len(head), len(tail)) < self.min_overlap_chars:
+            return 0
+        probe = tail[:self.min_overlap_chars]
+        # 가장 앞의 일치 위치가 가장 긴 겹침
+        start = head.find(probe, max(0, len(head) - len(tail)))
+        while start != -1:
+            if tail.startswith(head[start:]):
+                return len(head) - start
+            start = head.find(probe, start + 1)
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        컨텍스트 패킹 통계를 반환합니다.
+        """
+        return {
+            "packs": self.packs,
+            "candidates": self.candidates,
+            "selected": self.selected,
+            "duplicates_dropped": self.duplicates_dropped,
+            "overlaps_trimmed": self.overlaps_trimmed,
+            "over_budget_skipped": self.over_budget_skipped,
+            "candidate_tokens": self.candidate_tokens,
+            "packed_tokens": self.packed_tokens,
+            "avg_packed_tokens": self.packed_tokens / self.packs if self.packs else 0.0,
+        }
@@ -0,0 +1,350 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple, Any
+
+from fastapi import HTTPException
+
+from app.schemas.chat import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class _Conversation:
+    """
+    메모리에 올라온 대화 하나
+    """
+
+    __slots__ = ("user_id", "org_id", "messages", "persisted", "stored", "updated_at")
+
+    def __init__(self, user_id: int, org_id: Optional[int], messages: List[ChatMessage], stored: bool, updated_at: float):
+        self.user_id = user_id
+        self.org_id = org_id
+        self.messages = messages
+        self.persisted = len(messages) if stored else 0  # SQLite에 기록된 메시지 수
+        self.stored = stored
+        self.updated_at = updated_at
+
+    @property
+    def dirty(self) -> bool:
+        return not self.stored or self.persisted < len(self.messages)
+
+
+class ConversationStore:
+    """
+    서버 측 대화 이력 저장소 (conversation_id 모드)
+
+    - 최근 대화는 메모리 LRU에 ChatMessage 객체로 유지하므로, 클라이언트는 새 메시지만 보내고
+      서버는 이력을 다시 검증/전송받지 않습니다. 메시지 토큰 수는 TokenCounter 메모를 그대로 재사용합니다.
+    - 대화 생성과 메시지 추가는 새 메시지만 로컬 SQLite에 바로 기록(write-through)하므로
+      프로세스가 비정상 종료되어도 대화가 유실되지 않습니다. 같은 대화의 추가는 순서대로 직렬화됩니다.
+    - LRU에서 밀려난 대화는 메모리에서만 내리고(기록에 실패했던 메시지가 있으면 다시 기록),
+      다시 요청되면 SQLite에서 읽어 옵니다.
+    - SQLite 접근은 전용 스레드 하나에서만 수행해 이벤트 루프를 막지 않으며, 작업 순서가 보장됩니다.
+    - persisted(기록된 메시지 수)는 SQLite 커밋이 성공한 뒤에만 갱신합니다.
+    - 마지막 사용 후 ttl_seconds가 지난 대화는 삭제됩니다.
+    """
+
+    def __init__(
+        self,
+        path: str = "conversations.db",
+        max_in_memory: int = 1000,
+        ttl_seconds: float = 7 * 24 * 3600,
+        purge_interval: float = 3600.0
+    ):
+        self.path = path
+        self.max_in_memory = max_in_memory
+        self.ttl_seconds = ttl_seconds
+        self.purge_interval = purge_interval
+
+        self._cache: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-store")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._spills: Set[asyncio.Future] = set()
+        self._locks: Dict[str, List[Any]] = {}  # conversation_id -> [Lock, 사용 중인 요청 수]
+        self._last_purge = 0.0
+
+        # 통계 카운터
+        self.created = 0
+        self.memory_hits = 0
+        self.disk_loads = 0
+        self.not_found = 0
+        self.writes = 0
+        self.write_failures = 0
+        self.spills = 0
+        self.spilled_messages = 0
+        self.spill_failures = 0
+
+    # ------------------------------------------------------------------
+    # 대화 API (이벤트 루프)
+    # ------------------------------------------------------------------
+    async def create(self, user_id: int, org_id: Optional[int]) -> str:
+        """
+        새 대화를 만들고 ID를 반환합니다.
+        """
+        conversation_id = uuid.uuid4().hex
+        conversation = _Conversation(user_id, org_id, [], stored=False, updated_at=time.time())
+        self._cache[conversation_id] = conversation
+        self.created += 1
+        self._evict()
+        await self._persist(conversation_id, conversation)
+        return conversation_id
+
+    async def get_messages(self, conversation_id: str, user_id: int, org_id: Optional[int]) -> List[ChatMessage]:
+        """
+        대화 이력을 반환합니다. 없거나 다른 사용자의 대화면 404 오류를 발생시킵니다.
+        """
+        conversation = await self._load(conversation_id, user_id, org_id)
+        return list(conversation.messages)
+
+    async def append(
+        self,
+        conversation_id: str,
+        user_id: int,
+        org_id: Optional[int],
+        messages: List[ChatMessage]
+    ) -> None:
+        """
+        대화에 메시지를 추가하고 SQLite에 기록합니다.
+        같은 대화에 대한 추가는 호출 순서대로 하나씩 처리됩니다.
+        """
+        async with self._locked(conversation_id):
+            conversation = await self._load(conversation_id, user_id, org_id)
+            conversation.messages.extend(messages)
+            conversation.updated_at = time.time()
+            await self._persist(conversation_id, conversation)
+
+    @asynccontextmanager
+    async def _locked(self, conversation_id: str) -> AsyncIterator[None]:
+        """
+        대화별 잠금 (대기자가 없으면 제거해 잠금 수가 대화 수만큼 늘지 않음)
+        """
+        entry = self._locks.get(conversation_id)
+        if entry is None:
+            entry = [asyncio.Lock(), 0]
+            self._locks[conversation_id] = entry
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[conversation_id]
+
+    async def _persist(self, conversation_id: str, conversation: _Conversation) -> None:
+        """
+        기록되지 않은 메시지를 SQLite에 기록합니다. 실패하면 메모리에 남겨 두고 다음 기록/내보내기 때 다시 시도합니다.
+        """
+        end = len(conversation.messages)
+        meta, rows = self._pending_rows(conversation_id, conversation)
+        try:
+            written = await self._run(self._write, meta, rows)
+        except Exception as e:
+            self.write_failures += 1
+            logger.error(f"대화 저장 오류: {str(e)}")
+            return
+        self._mark_persisted(conversation, end)
+        self.writes += 1
+        self.spilled_messages += written
+
+    async def delete(self, conversation_id: str, user_id: int, org_id: Optional[int]) -> None:
+        """
+        대화를 삭제합니다.
+        """
+        async with self._locked(conversation_id):
+            await self._load(conversation_id, user_id, org_id)
+            self._cache.pop(conversation_id, None)
+            await self._run(self._delete_rows, conversation_id)
+
+    async def _load(self, conversation_id: str, user_id: int, org_id: Optional[int]) -> _Conversation:
+        conversation = self._cache.get(conversation_id)
+        if conversation is not None:
+            self._cache.move_to_end(conversation_id)
+            self.memory_hits += 1
+        else:
+            conversation = await self._run(self._read, conversation_id)
+            if conversation is not None:
+                self.disk_loads += 1
+                # 읽는 동안 다른 요청이 먼저 올렸으면 그것을 사용
+                conversation = self._cache.setdefault(conversation_id, conversation)
+                self._evict()
+
+        expired = conversation is not None and conversation.updated_at < time.time() - self.ttl_seconds
+        if conversation is None or expired or conversation.user_id != user_id or conversation.org_id != org_id:
+            self.not_found += 1
+            raise HTTPException(status_code=404, detail="대화를 찾을 수 없습니다.")
+        return conversation
+
+    def _evict(self) -> None:
+        """
+        LRU 한도를 넘은 대화를 메모리에서 내리고, 기록되지 않은 메시지를 SQLite로 내보냅니다.
+        """
+        while len(self._cache) > self.max_in_memory:
+            conversation_id, conversation = self._cache.popitem(last=False)
+            if conversation.dirty:
+                self._spill(conversation_id, conversation)
+
+    @staticmethod
+    def _pending_rows(
+        conversation_id: str,
+        conversation: _Conversation
+    ) -> Tuple[Tuple[str, int, Optional[int], float], List[Tuple[str, int, str, str]]]:
+        start = conversation.persisted
+        rows = [(conversation_id, start + i, m.role, m.content) for i, m in enumerate(conversation.messages[start:])]
+        meta = (conversation_id, conversation.user_id, conversation.org_id, conversation.updated_at)
+        return meta, rows
+
+    @staticmethod
+    def _mark_persisted(conversation: _Conversation, end: int) -> None:
+        # 커밋이 끝난 뒤에만 호출 (먼저 끝난 더 긴 기록을 되돌리지 않음)
+        conversation.persisted = max(conversation.persisted, end)
+        conversation.stored = True
+
+    def _spill(self, conversation_id: str, conversation: _Conversation) -> None:
+        end = len(conversation.messages)
+        meta, rows = self._pending_rows(conversation_id, conversation)
+
+        # 바로 실행기에 제출해 이후의 읽기보다 먼저 기록되도록 함 (단일 스레드, 제출 순서대로 실행)
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._write, meta, rows)
+        self._spills.add(future)
+        future.add_done_callback(lambda f: self._spill_done(f, conversation_id, conversation, end))
+
+    def _spill_done(self, future: asyncio.Future, conversation_id: str, conversation: _Conversation, end: int) -> None:
+        self._spills.discard(future)
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.spill_failures += 1
+            logger.error(f"대화 저장 오류: {str(future.exception())}")
+            # 기록하지 못한 대화는 유실되지 않도록 메모리에 되돌림 (다음 내보내기 때 다시 기록)
+            self._cache.setdefault(conversation_id, conversation)
+        else:
+            self._mark_persisted(conversation, end)
+            self.spills += 1
+            self.spilled_messages += future.result()
+
+    async def _run(self, fn, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # ------------------------------------------------------------------
+    # 수명 주기
+    # ------------------------------------------------------------------
+    async def start(self) -> None:
+        """
+        SQLite 저장소를 열고 만료된 대화를 정리합니다.
+        """
+        await self._run(self._connect)
+
+    async def close(self) -> None:
+        """
+        메모리의 모든 대화를 SQLite에 기록하고 종료합니다. (재시작 후에도 대화 유지)
+        """
+        for conversation_id, conversation in list(self._cache.items()):
+            if conversation.dirty:
+                self._spill(conversation_id, conversation)
+        if self._spills:
+            await asyncio.gather(*self._spills, return_exceptions=True)
+        await self._run(self._disconnect)
+        self._executor.shutdown(wait=True)
+
+    # ------------------------------------------------------------------
+    # SQLite (전용 스레드에서만 실행)
+    # ------------------------------------------------------------------
+    def _connect(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " id TEXT PRIMARY KEY,"
+            " user_id INTEGER NOT NULL,"
+            " org_id INTEGER,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_messages ("
+            " conversation_id TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " role TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " PRIMARY KEY (conversation_id, seq)) WITHOUT ROWID"
+        )
+        conn.commit()
+        self._conn = conn
+        self._purge_expired()
+
+    def _disconnect(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _write(self, meta: Tuple[str, int, Optional[int], float], rows: List[Tuple[str, int, str, str]]) -> int:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO conversations (id, user_id, org_id, updated_at) VALUES (?, ?, ?, ?)", meta
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO conversation_messages (conversation_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                rows
+            )
+        if time.time() - self._last_purge >= self.purge_interval:
+            self._purge_expired()
+        return len(rows)
+
+    def _read(self, conversation_id: str) -> Optional[_Conversation]:
+        row = self._conn.execute(
+            "SELECT user_id, org_id, updated_at FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        messages = [
+            ChatMessage(role=role, content=content)
+            for role, content in self._conn.execute(
+                "SELECT role, content FROM conversation_messages WHERE conversation_id = ? ORDER BY seq",
+                (conversation_id,)
+            )
+        ]
+        return _Conversation(row[0], row[1], messages, stored=True, updated_at=row[2])
+
+    def _delete_rows(self, conversation_id: str) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+            self._conn.execute("DELETE FROM conversation_messages WHERE conversation_id = ?", (conversation_id,))
+
+    def _purge_expired(self) -> None:
+        self._last_purge = time.time()
+        cutoff = self._last_purge - self.ttl_seconds
+        with self._conn:
+            deleted = self._conn.execute("DELETE FROM conversations WHERE updated_at < ?", (cutoff,)).rowcount
+            self._conn.execute(
+                "DELETE FROM conversation_messages WHERE conversation_id NOT IN (SELECT id FROM conversations)"
+            )
+        if deleted:
+            logger.info(f"만료된 대화 {deleted}건 삭제")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        대화 저장소 통계를 반환합니다.
+        """
+        return {
+            "in_memory": len(self._cache),
+            "created": self.created,
+            "memory_hits": self.memory_hits,
+            "disk_loads": self.disk_loads,
+            "not_found": self.not_found,
+            "writes": self.writes,
+            "write_failures": self.write_failures,
+            "spills": self.spills,
+            "spilled_messages": self.spilled_messages,
+            "spill_failures": self.spill_failures,
+            "pending_spills": len(self._spills),
+        }
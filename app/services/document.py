@@ -1,11 +1,15 @@
+import asyncio
+import json
 import os
+import time
 import uuid
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Any, Optional
 
 from fastapi import BackgroundTasks, HTTPException
 import chromadb
 from chromadb.config import Settings as ChromaSettings
-from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
 
 from app.core.config import settings
@@ -13,18 +17,93 @@ from app.schemas.document import (
     DocumentCreate, DocumentResponse, DocumentSearchResponse, 
     DocumentSearchResult, ChunkProcessResult
 )
+from app.services.collection_cache import CollectionCache
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache
+from app.services.ingestion import IngestionPipeline
+from app.services.singleflight import SingleFlight
+
+# Chroma 호출 단계별 시간 통계 항목 (검색 + 문서 삭제)
+SEARCH_STAGES = ("embed", "queue_wait", "get_collection", "query", "delete", "total")
+
+
+def _is_missing_collection(error: Exception) -> bool:
+    """
+    Chroma의 컬렉션 없음 오류인지 확인합니다. (버전에 따라 ValueError/NotFoundError 등)
+    """
+    if type(error).__name__ in ("NotFoundError", "InvalidCollectionException"):
+        return True
+    return isinstance(error, ValueError) and "does not exist" in str(error)
+
+
+def _as_list(vector: Any) -> Optional[List[float]]:
+    """
+    임베딩(list 또는 numpy 배열)을 float 리스트로 변환합니다.
+    """
+    if vector is None:
+        return None
+    return vector.tolist() if hasattr(vector, "tolist") else list(vector)
+
 
 class DocumentService:
     """
     문서 저장 및 검색 서비스
     """
     
-    def __init__(self):
+    def __init__(self, search_flight: Optional[SingleFlight] = None):
+        # 동일 검색 병합 (선택)
+        self.search_flight = search_flight
+        
         self.embedding_model = OpenAIEmbeddings(
             model="text-embedding-ada-002",
             openai_api_key=settings.OPENAI_API_KEY
         )
         
+        # 질의 임베딩 경로: 캐시 → 마이크로 배처 → 임베딩 모델 (각각 선택)
+        self.query_batcher: Optional[EmbeddingBatcher] = None
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        self.query_embedder: Optional[Any] = None
+        
+        # 동시 질의 임베딩을 묶어 업스트림 호출 수를 줄이는 마이크로 배처
+        if settings.EMBEDDING_BATCH_ENABLED:
+            self.query_batcher = EmbeddingBatcher(
+                self.embedding_model,
+                window=settings.EMBEDDING_BATCH_WINDOW,
+                max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                max_concurrency=settings.EMBEDDING_BATCH_MAX_CONCURRENCY
+            )
+            self.query_embedder = self.query_batcher
+        
+        # 반복되는 질의의 임베딩 캐시 (선택적으로 메모리 맵 파일에 유지)
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                self.query_embedder or self.embedding_model,
+                model=self.embedding_model.model,
+                max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+                path=settings.EMBEDDING_CACHE_PATH,
+                disk_capacity=settings.EMBEDDING_CACHE_DISK_CAPACITY
+            )
+            self.query_embedder = self.embedding_cache
+        
+        # Chroma 호출(동기 I/O)은 전용 스레드 풀에서 실행해 이벤트 루프를 막지 않음
+        self._search_executor = ThreadPoolExecutor(
+            max_workers=settings.SEARCH_MAX_WORKERS,
+            thread_name_prefix="chroma-search"
+        )
+        self._search_in_flight = 0
+        
+        # 검색 단계별 시간 통계: 단계 → [횟수, 누적 시간, 최대 시간]
+        self._stage_times: Dict[str, List[float]] = {stage: [0, 0.0, 0.0] for stage in SEARCH_STAGES}
+        self.searches = 0
+        self.search_errors = 0
+        
+        # 조직별 컬렉션 핸들 캐시 (없는 컬렉션은 짧은 TTL로 기억)
+        self.collection_cache = CollectionCache(
+            max_entries=settings.COLLECTION_CACHE_SIZE,
+            ttl=settings.COLLECTION_CACHE_TTL,
+            negative_ttl=settings.COLLECTION_NEGATIVE_TTL
+        )
+        
         # ChromaDB 클라이언트 초기화
         if settings.CHROMA_DB_HOST and settings.CHROMA_DB_PORT:
             # 클라이언트 모드
@@ -41,6 +120,32 @@ class DocumentService:
                     anonymized_telemetry=False
                 )
             )
+        
+        # 문서 인덱싱 파이프라인 (프로세스 풀 파싱, 배치 임베딩, 일괄 add)
+        self.ingestion = IngestionPipeline(
+            self.embedding_model,
+            self.chroma_client,
+            collection_cache=self.collection_cache,
+            process_workers=settings.INGEST_PROCESS_WORKERS,
+            embed_batch_size=settings.INGEST_EMBED_BATCH_SIZE,
+            embed_concurrency=settings.INGEST_EMBED_CONCURRENCY,
+            chunk_size=settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP,
+            chunk_tokens=settings.CHUNK_TOKENS,
+            chunk_overlap_tokens=settings.CHUNK_OVERLAP_TOKENS,
+            token_model=settings.CHUNK_TOKEN_MODEL
+        )
+        
+        # 조직 문서가 바뀔 때 호출할 콜백 (시맨틱 캐시 무효화 등, org_id를 받음)
+        self.change_listeners: List[Callable[[int], None]] = []
+    
+    def _org_documents_changed(self, org_id: int) -> None:
+        """
+        조직 컬렉션의 캐시된 핸들을 무효화하고 변경 콜백을 호출합니다.
+        """
+        self.collection_cache.invalidate(self._collection_name(org_id))
+        for listener in self.change_listeners:
+            listener(org_id)
     
     async def create_document(
         self,
@@ -60,6 +165,7 @@ class DocumentService:
             # 예: await db.documents.insert(...)
             
             # 임시 응답 생성 (실제로는 DB에서 가져옴)
+            now = datetime.now(timezone.utc)
             doc_response = DocumentResponse(
                 id=doc_id,
                 title=doc_create.title,
@@ -68,27 +174,32 @@ class DocumentService:
                 file_name=doc_create.file_name,
                 file_type=doc_create.file_type,
                 chunk_count=0,  # 아직 처리 전
-                created_at=None,  # 실제 구현에서는 현재 시간
-                updated_at=None,  # 실제 구현에서는 현재 시간
+                created_at=now,
+                updated_at=now,
                 is_indexed=False,
                 uploaded_by=user_id,
                 org_id=org_id
             )
             
+            # 조직 컬렉션이 바뀌므로 캐시된 핸들 무효화
+            self._org_documents_changed(org_id)
+            
             # 백그라운드 태스크로 문서 처리 (인덱싱) 시작
-            # background_tasks.add_task(
-            #     self._process_document,
-            #     doc_id=doc_id,
-            #     file_path=doc_create.file_path,
-            #     org_id=org_id,
-            #     metadata={
-            #         "title": doc_create.title,
-            #         "description": doc_create.description,
-            #         "category": doc_create.category,
-            #         "file_name": doc_create.file_name,
-            #         "file_type": doc_create.file_type,
-            #     }
-            # )
+            background_tasks.add_task(
+                self._process_document,
+                doc_id=doc_id,
+                file_path=doc_create.file_path,
+                org_id=org_id,
+                metadata={
+                    "title": doc_create.title,
+                    "description": doc_create.description,
+                    "category": doc_create.category,
+                    "file_name": doc_create.file_name,
+                    "file_type": doc_create.file_type,
+                    "file_size": doc_create.file_size,
+                    "content_hash": doc_create.content_hash,
+                }
+            )
             
             return doc_response
             
@@ -124,19 +235,104 @@ class DocumentService:
         query: str,
         org_id: int,
         filters: Optional[Dict[str, Any]] = None,
-        limit: int = 5
+        limit: int = 5,
+        include_embeddings: bool = False
     ) -> DocumentSearchResponse:
         """
         문서를 검색합니다.
+        include_embeddings가 True면 질의/청크 임베딩을 함께 반환합니다. (RAG 컨텍스트 패킹용)
+        """
+        if self.search_flight is None:
+            return await self._search_documents(query, org_id, filters, limit, include_embeddings)
+        
+        # 동일한 검색이 진행 중이면 결과를 공유
+        flight_key = (
+            org_id,
+            query,
+            limit,
+            json.dumps(filters, sort_keys=True, default=str) if filters else None,
+            include_embeddings
+        )
+        result, _ = await self.search_flight.do(
+            flight_key,
+            lambda: self._search_documents(query, org_id, filters, limit, include_embeddings)
+        )
+        return result
+    
+    async def _embed_query(self, query: str) -> Any:
+        """
+        검색 질의를 임베딩합니다. (캐시/마이크로 배처가 있으면 사용)
+        """
+        if self.query_embedder is not None:
+            return await self.query_embedder.aembed_query(query)
+        return await self.embedding_model.aembed_query(query)
+    
+    @staticmethod
+    def _collection_name(org_id: int) -> str:
+        """
+        조직별 컬렉션 이름을 반환합니다.
+        """
+        return f"org_{org_id}"
+    
+    async def _load_collection(self, collection_name: str) -> Optional[Any]:
+        """
+        Chroma에서 컬렉션을 읽습니다. (없으면 None)
+        """
+        try:
+            return await self._run_chroma(
+                "get_collection", self.chroma_client.get_collection, name=collection_name
+            )
+        except Exception as e:
+            if _is_missing_collection(e):
+                return None
+            raise
+    
+    async def _run_chroma(self, stage: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Chroma 호출을 검색 스레드 풀에서 실행하고 대기/실행 시간을 기록합니다.
+        """
+        submitted_at = time.monotonic()
+        
+        def call():
+            return time.monotonic(), fn(*args, **kwargs)
+        
+        self._search_in_flight += 1
+        try:
+            started_at, result = await asyncio.get_running_loop().run_in_executor(self._search_executor, call)
+        finally:
+            self._search_in_flight -= 1
+        self._record_stage("queue_wait", started_at - submitted_at)
+        self._record_stage(stage, time.monotonic() - started_at)
+        return result
+    
+    def _record_stage(self, stage: str, elapsed: float) -> None:
+        entry = self._stage_times.setdefault(stage, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+    
+    async def _search_documents(
+        self,
+        query: str,
+        org_id: int,
+        filters: Optional[Dict[str, Any]],
+        limit: int,
+        include_embeddings: bool = False
+    ) -> DocumentSearchResponse:
+        """
+        벡터 DB에서 유사 문서 청크를 검색합니다.
         """
         # 컬렉션 이름 (조직별 컬렉션)
-        collection_name = f"org_{org_id}"
+        collection_name = self._collection_name(org_id)
+        start_time = time.monotonic()
+        self.searches += 1
         
         try:
-            # 컬렉션 존재 여부 확인 및 생성
-            try:
-                collection = self.chroma_client.get_collection(name=collection_name)
-            except:
+            # 캐시된 컬렉션 핸들 사용 (없으면 읽어서 캐시)
+            handle = await self.collection_cache.get(
+                collection_name, lambda: self._load_collection(collection_name)
+            )
+            if handle is None:
                 # 컬렉션이 없으면 빈 검색 결과 반환
                 return DocumentSearchResponse(
                     results=[],
@@ -144,48 +340,103 @@ class DocumentService:
                     total=0
                 )
             
-            # 랭체인 Chroma 래퍼 생성
-            langchain_chroma = Chroma(
-                client=self.chroma_client,
-                collection_name=collection_name,
-                embedding_function=self.embedding_model
-            )
-            
             # 필터 구성
             filter_dict = {}
             if filters and filters.get("category"):
                 filter_dict["category"] = filters.get("category")
             
-            # 유사성 검색 수행
-            docs_with_scores = langchain_chroma.similarity_search_with_score(
-                query=query,
-                k=limit,
-                filter=filter_dict if filter_dict else None
-            )
+            # 유사성 검색 수행 (랭체인 similarity_search_with_score와 같은 질의, 필요 시 임베딩 포함)
+            embed_start = time.monotonic()
+            query_embedding = await self._embed_query(query)
+            self._record_stage("embed", time.monotonic() - embed_start)
+            
+            include = ["documents", "metadatas", "distances"]
+            if include_embeddings:
+                include.append("embeddings")
+            try:
+                query_result = await self._run_chroma(
+                    "query",
+                    handle.collection.query,
+                    query_embeddings=[_as_list(query_embedding)],
+                    n_results=limit,
+                    where=filter_dict if filter_dict else None,
+                    include=include
+                )
+            except Exception as e:
+                # 다른 워커에서 삭제된 컬렉션이면 캐시된 핸들을 버리고 빈 결과 반환
+                if not _is_missing_collection(e):
+                    raise
+                self.collection_cache.invalidate(collection_name)
+                return DocumentSearchResponse(
+                    results=[],
+                    query=query,
+                    total=0
+                )
             
             # 검색 결과 변환
+            documents = query_result["documents"][0]
+            metadatas = query_result["metadatas"][0]
+            distances = query_result["distances"][0]
+            embeddings = query_result["embeddings"][0] if include_embeddings else [None] * len(documents)
+            
             results = []
-            for doc, score in docs_with_scores:
+            for content, metadata, score, embedding in zip(documents, metadatas, distances, embeddings):
+                metadata = metadata or {}
                 results.append(
                     DocumentSearchResult(
-                        id=doc.metadata.get("chunk_id", ""),
-                        document_id=doc.metadata.get("document_id", ""),
-                        document_title=doc.metadata.get("title", ""),
-                        content=doc.page_content,
+                        id=metadata.get("chunk_id", ""),
+                        document_id=metadata.get("document_id", ""),
+                        document_title=metadata.get("title", ""),
+                        content=content,
                         score=float(score),
-                        metadata=doc.metadata
+                        metadata=metadata,
+                        embedding=_as_list(embedding)
                     )
                 )
             
+            self._record_stage("total", time.monotonic() - start_time)
             return DocumentSearchResponse(
                 results=results,
                 query=query,
-                total=len(results)
+                total=len(results),
+                query_embedding=_as_list(query_embedding) if include_embeddings else None
             )
             
         except Exception as e:
+            self.search_errors += 1
             raise HTTPException(status_code=500, detail=f"문서 검색 오류: {str(e)}")
     
+    async def close(self) -> None:
+        """
+        질의 임베딩 배처/캐시를 정리하고 검색 스레드 풀과 인덱싱 프로세스 풀을 종료합니다.
+        """
+        if self.query_batcher is not None:
+            await self.query_batcher.close()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+        self.ingestion.close()
+        self._search_executor.shutdown(wait=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        문서 검색 통계(단계별 평균/최대 시간 포함)를 반환합니다.
+        """
+        stages = {
+            stage: {
+                "count": int(count),
+                "avg": total / count if count else 0.0,
+                "max": maximum,
+            }
+            for stage, (count, total, maximum) in self._stage_times.items()
+        }
+        return {
+            "searches": self.searches,
+            "errors": self.search_errors,
+            "in_flight": self._search_in_flight,
+            "max_workers": settings.SEARCH_MAX_WORKERS,
+            "stages": stages,
+        }
+    
     async def delete_document(
         self,
         document_id: str,
@@ -195,8 +446,22 @@ class DocumentService:
         """
         문서를 삭제합니다.
         """
+        collection_name = self._collection_name(org_id)
         try:
-            # 실제 구현에서는 DB에서 문서 삭제 및 Chroma에서 청크 삭제
+            # 문서의 청크를 Chroma에서 삭제 (캐시된 핸들은 오래됐을 수 있으므로 직접 읽음)
+            collection = await self._load_collection(collection_name)
+            if collection is not None:
+                try:
+                    await self._run_chroma(
+                        "delete", collection.delete, where={"document_id": document_id}
+                    )
+                except Exception as e:
+                    # 다른 워커에서 컬렉션이 이미 삭제된 경우는 삭제할 청크가 없음
+                    if not _is_missing_collection(e):
+                        raise
+            
+            # 조직 컬렉션이 바뀌므로 캐시된 핸들 무효화
+            self._org_documents_changed(org_id)
             return True
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"문서 삭제 오류: {str(e)}")
@@ -212,26 +477,14 @@ class DocumentService:
         """
         문서를 처리하고 인덱싱합니다. (백그라운드 작업)
         """
-        # 여기서는 간단히 구현
-        # 실제 구현에서는 문서 유형에 따라 텍스트 추출 및 청킹 수행
-        # 그 후 임베딩 생성 및 Chroma DB에 저장
-        
         try:
-            # 파일 처리 완료 후 임시 파일 삭제
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                
-            return ChunkProcessResult(
-                document_id=doc_id,
-                chunk_count=0,
-                status="success"
+            return await self.ingestion.ingest(
+                doc_id=doc_id,
+                file_path=file_path,
+                file_type=metadata["file_type"],
+                collection_name=self._collection_name(org_id),
+                metadata=metadata
             )
-            
-        except Exception as e:
-            # 오류 발생 시 상태 업데이트
-            return ChunkProcessResult(
-                document_id=doc_id,
-                chunk_count=0,
-                status="error",
-                error=str(e)
-            ) 
\ No newline at end of file
+        finally:
+            # 인덱싱된 청크가 검색되기 시작하므로 이전 문서 기준으로 만든 응답 캐시 무효화
+            self._org_documents_changed(org_id)
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    동시 질의 임베딩을 묶어 한 번의 업스트림 호출로 처리하는 마이크로 배처
+
+    - window(초) 동안 또는 max_batch_size개가 모일 때까지 질의 텍스트를 모은 뒤
+      embed_documents 한 번으로 임베딩하고, 결과를 대기 중인 퓨처에 나눠 줍니다.
+    - 같은 배치 안의 동일한 텍스트는 한 번만 임베딩합니다.
+    - 동시에 진행되는 배치 호출 수는 max_concurrency로 제한합니다.
+    - LangChain 임베딩과 같은 aembed_query 인터페이스를 제공하므로 임베딩 모델 대신 주입할 수 있습니다.
+    """
+
+    def __init__(
+        self,
+        embedding_model: Any,
+        window: float = 0.005,
+        max_batch_size: int = 64,
+        max_concurrency: int = 4
+    ):
+        self.embedding_model = embedding_model
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+        # 통계 카운터
+        self.requests = 0
+        self.batches = 0
+        self.embedded_texts = 0
+        self.deduplicated = 0
+        self.errors = 0
+        self.max_batch_seen = 0
+        self.total_batch_latency = 0.0
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        질의 텍스트를 임베딩합니다. (다른 동시 질의와 묶여 처리됨)
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        # 대기자가 모두 취소된 항목은 제외하고, 같은 텍스트는 한 번만 임베딩
+        texts = list(dict.fromkeys(text for text, future in batch if not future.done()))
+        if not texts:
+            return
+        self.deduplicated += sum(1 for _, future in batch if not future.done()) - len(texts)
+
+        async with self._semaphore:
+            start_time = time.monotonic()
+            try:
+                vectors = await self.embedding_model.aembed_documents(texts)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"질의 임베딩 배치 실패 ({len(texts)}건): {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            finally:
+                self.total_batch_latency += time.monotonic() - start_time
+
+        self.batches += 1
+        self.embedded_texts += len(texts)
+        self.max_batch_seen = max(self.max_batch_seen, len(texts))
+
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    async def close(self) -> None:
+        """
+        모인 질의를 처리하고 진행 중인 배치가 끝날 때까지 기다립니다.
+        """
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        마이크로 배처 통계를 반환합니다.
+        """
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "embedded_texts": self.embedded_texts,
+            "deduplicated": self.deduplicated,
+            "avg_batch_size": self.embedded_texts / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_batch_latency": self.total_batch_latency / self.batches if self.batches else 0.0,
+            "upstream_calls_saved": self.requests - self.batches,
+            "errors": self.errors,
+            "pending": len(self._pending),
+        }
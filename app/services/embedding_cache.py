@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_EMPTY_KEY = b"\0" * 16
+
+
+class _DiskStore:
+    """
+    메모리 맵 파일 기반 임베딩 저장소 (고정 크기 링 버퍼)
+
+    - <path>.f32: (capacity, dim) float32 벡터, <path>.keys: 슬롯별 16바이트 키,
+      <path>.pos: 다음에 쓸 슬롯 위치, <path>.json: 메타데이터
+    - 파일 전체를 읽지 않고 필요한 행만 OS 페이지 캐시로 올라옵니다.
+    - 가득 차면 가장 오래 기록된 슬롯부터 덮어씁니다. 쓰기 위치는 put마다 <path>.pos에 기록되므로
+      비정상 종료 후에도 최근 항목을 덮어쓰지 않습니다.
+    - 프로세스 간 잠금이 없으므로 path는 프로세스마다 달라야 합니다.
+      (여러 uvicorn 워커가 같은 파일을 쓰면 서로의 슬롯을 덮어써 키와 벡터가 어긋남)
+    """
+
+    def __init__(self, path: str, capacity: int, dim: int):
+        self.path = path
+        self.capacity = capacity
+        self.dim = dim
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        meta = self._read_meta()
+        reuse = meta is not None and meta.get("dim") == dim and meta.get("capacity") == capacity
+        mode = "r+" if reuse else "w+"
+
+        self.vectors = np.memmap(f"{path}.f32", dtype=np.float32, mode=mode, shape=(capacity, dim))
+        self.keys = np.memmap(f"{path}.keys", dtype="S16", mode=mode, shape=(capacity,))
+
+        # 쓰기 위치는 put마다 갱신하는 8바이트 파일에 둠 (이전 형식은 메타데이터의 next_slot 사용)
+        reuse_position = reuse and os.path.exists(f"{path}.pos")
+        self.position = np.memmap(
+            f"{path}.pos", dtype=np.int64, mode="r+" if reuse_position else "w+", shape=(1,)
+        )
+        if not reuse_position:
+            self.position[0] = meta.get("next_slot", 0) if reuse else 0
+        self.next_slot = int(self.position[0]) % capacity
+
+        self.index: Dict[bytes, int] = {}
+        if reuse:
+            for slot, key in enumerate(self.keys.tolist()):
+                # numpy S16은 끝의 0 바이트를 잘라내므로 길이를 복원
+                key = key.ljust(16, b"\0")
+                if key != _EMPTY_KEY:
+                    self.index[key] = slot
+            logger.info(f"임베딩 캐시 파일 로드: {len(self.index)}개 항목 ({path})")
+        else:
+            self._write_meta()
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(f"{self.path}.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        slot = self.index.get(key)
+        if slot is None:
+            return None
+        return np.array(self.vectors[slot])
+
+    def put(self, key: bytes, vector: np.ndarray) -> None:
+        if key in self.index:
+            return
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % self.capacity
+
+        old_key = self.keys[slot].ljust(16, b"\0")
+        if old_key != _EMPTY_KEY:
+            self.index.pop(old_key, None)
+
+        # 쓰기 위치를 먼저 옮기고 벡터, 키 순으로 기록 (중단 시 키 없는 슬롯만 남음)
+        self.position[0] = self.next_slot
+        self.vectors[slot] = vector
+        self.keys[slot] = key
+        self.index[key] = slot
+
+    def flush(self) -> None:
+        self.vectors.flush()
+        self.keys.flush()
+        self.position.flush()
+
+    def _write_meta(self) -> None:
+        with open(f"{self.path}.json", "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "capacity": self.capacity}, f)
+
+
+class EmbeddingCache:
+    """
+    질의 임베딩 캐시
+
+    - 키는 (모델, 정규화한 텍스트)의 해시이며, 값은 float32 배열로 메모리 LRU에 보관합니다.
+    - path를 지정하면 메모리 맵 파일에도 기록해 재시작 후에도 자주 쓰이는 질의 임베딩을 재사용합니다.
+      (path는 프로세스마다 달라야 함, 워커 여러 개면 워커별 경로 사용)
+    - 캐시에 없으면 embedder(임베딩 모델 또는 마이크로 배처)의 aembed_query로 임베딩합니다.
+    - LangChain 임베딩과 같은 aembed_query 인터페이스를 제공합니다.
+    """
+
+    def __init__(
+        self,
+        embedder: Any,
+        model: str,
+        max_entries: int = 10000,
+        path: Optional[str] = None,
+        disk_capacity: int = 100000
+    ):
+        self.embedder = embedder
+        self.model = model
+        self.max_entries = max_entries
+        self.path = path
+        self.disk_capacity = disk_capacity
+
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._disk: Optional[_DiskStore] = None
+        if path:
+            # 차원은 첫 임베딩에서 정해지므로 기존 파일이 있을 때만 미리 엶
+            dim = _read_dim(path)
+            if dim is not None:
+                self._disk = _DiskStore(path, disk_capacity, dim)
+
+        # 통계 카운터
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        캐시 키용 텍스트 정규화 (유니코드 NFC, 공백 정리)
+        """
+        return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+    def make_key(self, text: str) -> bytes:
+        """
+        (모델, 정규화 텍스트) 해시 키를 생성합니다.
+        """
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(self.model.encode("utf-8"))
+        hasher.update(b"\0")
+        hasher.update(self.normalize(text).encode("utf-8"))
+        return hasher.digest()
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """
+        질의 임베딩을 반환합니다. (읽기 전용 float32 배열)
+        """
+        key = self.make_key(text)
+
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return vector
+
+        if self._disk is not None:
+            vector = self._disk.get(key)
+            if vector is not None:
+                self.disk_hits += 1
+                return self._remember(key, vector)
+
+        self.misses += 1
+        vector = np.asarray(await self.embedder.aembed_query(text), dtype=np.float32)
+        if self.path and self._disk is None:
+            self._disk = _DiskStore(self.path, self.disk_capacity, vector.shape[0])
+        if self._disk is not None and self._disk.dim == vector.shape[0]:
+            self._disk.put(key, vector)
+        return self._remember(key, vector)
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> np.ndarray:
+        vector.flags.writeable = False
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+        return vector
+
+    def close(self) -> None:
+        """
+        메모리 맵 파일을 디스크에 기록합니다.
+        """
+        if self._disk is not None:
+            self._disk.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        임베딩 캐시 통계를 반환합니다.
+        """
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "disk_entries": len(self._disk.index) if self._disk is not None else 0,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+def _read_dim(path: str) -> Optional[int]:
+    """
+    기존 캐시 파일의 벡터 차원을 읽습니다. (없으면 None)
+    """
+    try:
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            return int(json.load(f)["dim"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
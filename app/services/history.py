@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Any
+
+from app.schemas.chat import ChatMessage
+from app.services.tokens import TOKENS_PER_MESSAGE, TOKENS_PER_REPLY, TokenCounter
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "이전 대화 요약:\n"
+
+# (이전 요약, 새로 요약할 메시지, 조직 ID, 사용자 ID) -> 갱신된 요약
+# 조직/사용자 ID는 요약 호출의 사용량 정산과 기록에 사용
+SummarizeFn = Callable[[Optional[str], List[ChatMessage], Optional[int], Optional[int]], Awaitable[str]]
+
+
+class HistoryManager:
+    """
+    대화 이력을 토큰 예산에 맞게 줄이는 관리자
+
+    - 메시지별 토큰 수는 TokenCounter의 내용 해시 메모를 사용하므로 매 턴 전체 이력을 다시 인코딩하지 않습니다.
+    - 예산을 넘으면 앞쪽 시스템 메시지와 최신 메시지를 남기고 오래된 턴부터 잘라냅니다.
+    - summarize_fn이 있으면 잘린 턴을 누적 요약(rolling summary)으로 대체합니다.
+      요약은 요청 경로 밖의 백그라운드 태스크에서 만들고, 잘린 구간(대화 앞부분)의 해시로 저장해
+      이후 턴에서 재사용합니다. 요약이 준비되기 전에는 잘라내기만 합니다.
+    """
+
+    def __init__(
+        self,
+        token_counter: TokenCounter,
+        summarize_fn: Optional[SummarizeFn] = None,
+        summary_max_tokens: int = 512,
+        max_summaries: int = 10000
+    ):
+        self.token_counter = token_counter
+        self.summarize_fn = summarize_fn
+        self.summary_max_tokens = summary_max_tokens
+        self.max_summaries = max_summaries
+
+        # (org_id, 잘린 구간 해시) -> 요약
+        self._summaries: "OrderedDict[Tuple[Optional[int], bytes], str]" = OrderedDict()
+        self._pending: Set[Tuple[Optional[int], bytes]] = set()  # 요약 중인 대화 (첫 메시지 해시)
+        self._tasks: Set[asyncio.Task] = set()
+
+        # 통계 카운터
+        self.trimmed_requests = 0
+        self.evicted_messages = 0
+        self.evicted_tokens = 0
+        self.summary_hits = 0
+        self.summary_misses = 0
+        self.summaries_generated = 0
+        self.summary_failures = 0
+
+    def message_tokens(self, message: ChatMessage, model: str) -> int:
+        """
+        메시지 하나의 토큰 수 (메모이즈)
+        """
+        return (
+            TOKENS_PER_MESSAGE
+            + self.token_counter.count_cached(message.content, model)
+            + self.token_counter.count_cached(message.role, model)
+        )
+
+    async def fit(
+        self,
+        messages: List[ChatMessage],
+        model: str,
+        budget: int,
+        org_id: Optional[int] = None,
+        user_id: Optional[int] = None
+    ) -> List[ChatMessage]:
+        """
+        메시지 목록을 토큰 예산(budget)에 맞춰 반환합니다. 예산 안이면 그대로 반환합니다.
+        """
+        # 새 메시지만 인코딩해 메모에 채움 (큰 입력은 스레드 풀에서)
+        total = await self.token_counter.count_messages_async(messages, model)
+        if total <= budget:
+            return messages
+        counts = [self.message_tokens(message, model) for message in messages]
+
+        # 앞쪽 시스템 메시지는 항상 유지
+        head = 0
+        while head < len(messages) and messages[head].role == "system":
+            head += 1
+        available = budget - TOKENS_PER_REPLY - sum(counts[:head])
+        if self.summarize_fn is not None:
+            available -= TOKENS_PER_MESSAGE + self.summary_max_tokens
+
+        # 최신 메시지부터 예산 안에서 유지 (마지막 메시지는 항상 유지)
+        cut = len(messages) - 1
+        available -= counts[cut]
+        while cut > head and counts[cut - 1] <= available:
+            cut -= 1
+            available -= counts[cut]
+
+        evicted = messages[head:cut]
+        if not evicted:
+            return messages
+
+        self.trimmed_requests += 1
+        self.evicted_messages += len(evicted)
+        self.evicted_tokens += sum(counts[head:cut])
+
+        kept = list(messages[:head])
+        if self.summarize_fn is not None:
+            summary = self._summary_for(evicted, org_id, user_id)
+            if summary is not None:
+                kept.append(ChatMessage(role="system", content=SUMMARY_PREFIX + summary))
+        kept.extend(messages[cut:])
+        return kept
+
+    # ------------------------------------------------------------------
+    # 누적 요약
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _prefix_hashes(messages: List[ChatMessage]) -> List[bytes]:
+        """
+        메시지 앞부분 i+1개에 대한 연쇄 해시 목록
+        """
+        hashes = []
+        digest = b""
+        for message in messages:
+            hasher = hashlib.blake2b(digest, digest_size=16)
+            hasher.update(message.role.encode("utf-8"))
+            hasher.update(b"\0")
+            hasher.update(message.content.encode("utf-8"))
+            digest = hasher.digest()
+            hashes.append(digest)
+        return hashes
+
+    def _summary_for(self, evicted: List[ChatMessage], org_id: Optional[int], user_id: Optional[int]) -> Optional[str]:
+        """
+        잘린 구간을 가장 길게 덮는 저장된 요약을 반환하고, 덮지 못한 부분이 있으면 요약 갱신을 예약합니다.
+        """
+        hashes = self._prefix_hashes(evicted)
+        covered = 0
+        summary = None
+        for length in range(len(hashes), 0, -1):
+            key = (org_id, hashes[length - 1])
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+                covered = length
+                break
+
+        if covered == len(evicted):
+            self.summary_hits += 1
+        else:
+            self.summary_misses += 1
+            self._schedule(
+                (org_id, hashes[0]),
+                (org_id, hashes[-1]),
+                summary,
+                evicted[covered:],
+                user_id
+            )
+        return summary
+
+    def _schedule(
+        self,
+        conversation_key: Tuple[Optional[int], bytes],
+        key: Tuple[Optional[int], bytes],
+        previous_summary: Optional[str],
+        messages: List[ChatMessage],
+        user_id: Optional[int]
+    ) -> None:
+        # 대화당 요약 태스크는 하나만 (끝난 뒤 다음 턴에서 이어서 갱신)
+        if conversation_key in self._pending:
+            return
+        self._pending.add(conversation_key)
+        task = asyncio.ensure_future(self._summarize(conversation_key, key, previous_summary, messages, user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(
+        self,
+        conversation_key: Tuple[Optional[int], bytes],
+        key: Tuple[Optional[int], bytes],
+        previous_summary: Optional[str],
+        messages: List[ChatMessage],
+        user_id: Optional[int]
+    ) -> None:
+        try:
+            summary = await self.summarize_fn(previous_summary, messages, key[0], user_id)
+            if summary:
+                self._summaries[key] = summary
+                self._summaries.move_to_end(key)
+                while len(self._summaries) > self.max_summaries:
+                    self._summaries.popitem(last=False)
+                self.summaries_generated += 1
+        except Exception as e:
+            self.summary_failures += 1
+            logger.warning(f"대화 요약 생성 실패: {str(e)}")
+        finally:
+            self._pending.discard(conversation_key)
+
+    async def close(self) -> None:
+        """
+        진행 중인 요약 태스크를 취소합니다.
+        """
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        대화 이력 관리 통계를 반환합니다.
+        """
+        return {
+            "trimmed_requests": self.trimmed_requests,
+            "evicted_messages": self.evicted_messages,
+            "evicted_tokens": self.evicted_tokens,
+            "summaries": len(self._summaries),
+            "summaries_pending": len(self._pending),
+            "summary_hits": self.summary_hits,
+            "summary_misses": self.summary_misses,
+            "summaries_generated": self.summaries_generated,
+            "summary_failures": self.summary_failures,
+        }
@@ -0,0 +1,447 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+from xml.etree import ElementTree
+
+from app.schemas.document import ChunkProcessResult
+from app.services.chunker import TokenChunker
+from app.services.tokens import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------------------------------------------------
+# 텍스트 추출/청킹 (프로세스 풀에서 실행되므로 모듈 수준 함수로 정의)
+# 파일 전체 텍스트를 메모리에 올리지 않도록 페이지/섹션 단위 제너레이터로 추출하고,
+# 청크는 스풀 파일(JSON lines)에 기록해 임베딩 단계가 배치 단위로 읽어 갑니다.
+# ----------------------------------------------------------------------
+SECTION_CHARS = 32768  # 텍스트/HTML 섹션 크기 (문자)
+
+_DOCX_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class _HTMLTextParser(HTMLParser):
+    """
+    HTML을 조금씩 입력받아 본문 텍스트를 모으는 파서 (script/style 제외, 블록 태그는 줄바꿈)
+    """
+
+    BLOCK_TAGS = {
+        "p", "div", "br", "li", "tr", "td", "th", "h1", "h2", "h3", "h4", "h5", "h6",
+        "section", "article", "table", "ul", "ol", "pre", "blockquote", "hr",
+    }
+    SKIP_TAGS = {"script", "style", "noscript"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.size = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+            self.size += len(data)
+
+    def take(self) -> str:
+        text = "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        return text
+
+
+def _html_to_text(html: str) -> str:
+    parser = _HTMLTextParser()
+    parser.feed(html)
+    parser.close()
+    return parser.take()
+
+
+def _iter_pdf(file_path: str) -> Iterator[str]:
+    from pypdf import PdfReader
+
+    # 페이지 단위로 추출
+    reader = PdfReader(file_path)
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+def _iter_docx(file_path: str) -> Iterator[str]:
+    # 본문 XML을 iterparse로 문단 단위로 읽음 (docx2txt는 문서 전체를 한 번에 읽음)
+    parts: List[str] = []
+    size = 0
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml_file:
+        for _, element in ElementTree.iterparse(xml_file, events=("end",)):
+            if element.tag != f"{_DOCX_NS}p":
+                continue
+            for node in element.iter():
+                if node.tag == f"{_DOCX_NS}t" and node.text:
+                    parts.append(node.text)
+                    size += len(node.text)
+                elif node.tag == f"{_DOCX_NS}tab":
+                    parts.append("\t")
+                elif node.tag in (f"{_DOCX_NS}br", f"{_DOCX_NS}cr"):
+                    parts.append("\n")
+            parts.append("\n")
+            element.clear()
+            if size >= SECTION_CHARS:
+                yield "".join(parts)
+                parts, size = [], 0
+    yield "".join(parts)
+
+
+def _iter_txt(file_path: str) -> Iterator[str]:
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        for section in iter(lambda: f.read(SECTION_CHARS), ""):
+            yield section
+
+
+def _iter_markdown(file_path: str) -> Iterator[str]:
+    import markdown
+
+    # 코드 블록 밖의 빈 줄에서 섹션을 나눠 블록 단위로 변환
+    lines: List[str] = []
+    size = 0
+    in_fence = False
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.lstrip().startswith(("```", "~~~")):
+                in_fence = not in_fence
+            lines.append(line)
+            size += len(line)
+            if size >= SECTION_CHARS and not in_fence and not line.strip():
+                yield _html_to_text(markdown.markdown("".join(lines)))
+                lines, size = [], 0
+    if lines:
+        yield _html_to_text(markdown.markdown("".join(lines)))
+
+
+def _iter_html(file_path: str) -> Iterator[str]:
+    parser = _HTMLTextParser()
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        for block in iter(lambda: f.read(SECTION_CHARS), ""):
+            parser.feed(block)
+            if parser.size >= SECTION_CHARS:
+                yield parser.take()
+    parser.close()
+    yield parser.take()
+
+
+SECTION_READERS = {
+    "pdf": _iter_pdf,
+    "docx": _iter_docx,
+    "txt": _iter_txt,
+    "md": _iter_markdown,
+    "html": _iter_html,
+}
+
+
+def iter_sections(file_path: str, file_type: str) -> Iterator[str]:
+    """
+    파일 텍스트를 페이지/섹션 단위로 추출합니다.
+    """
+    reader = SECTION_READERS.get(file_type.lower().lstrip("."))
+    if reader is None:
+        raise ValueError(f"지원되지 않는 파일 형식입니다: {file_type}")
+    return reader(file_path)
+
+
+def iter_chunks(sections: Iterable[str], splitter: Any) -> Iterator[str]:
+    """
+    섹션 스트림을 청크로 나눕니다. 각 섹션의 마지막 조각은 다음 섹션 앞에 붙여
+    섹션 경계에서 문장이 끊기지 않게 하며, 메모리에는 섹션 하나 분량만 유지합니다.
+    """
+    carry = ""
+    for section in sections:
+        if not section:
+            continue
+        pieces = splitter.split_text(carry + section)
+        if not pieces:
+            continue
+        carry = pieces.pop()
+        for piece in pieces:
+            if piece.strip():
+                yield piece
+    if carry.strip():
+        yield carry
+
+
+# 작업 프로세스별 토큰 계산기 (ChatService와 같은 모델별 인코딩 선택, 프로세스당 한 번 로드)
+_token_counter: Optional[TokenCounter] = None
+
+
+def _make_splitter(chunking: Dict[str, Any]) -> Any:
+    """
+    청킹 설정에 맞는 분할기를 만듭니다. (chunk_tokens가 있으면 토큰 기준, 없으면 문자 기준)
+    """
+    global _token_counter
+
+    if chunking.get("chunk_tokens"):
+        if _token_counter is None:
+            _token_counter = TokenCounter()
+        return TokenChunker(
+            _token_counter.encoding_for(chunking["token_model"]),
+            chunk_tokens=chunking["chunk_tokens"],
+            overlap_tokens=chunking["overlap_tokens"]
+        )
+
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=chunking["chunk_size"], chunk_overlap=chunking["chunk_overlap"])
+
+
+def extract_to_spool(file_path: str, file_type: str, spool_path: str, chunking: Dict[str, Any]) -> int:
+    """
+    파일을 청크로 나눠 스풀 파일에 한 줄씩 기록하고 청크 수를 반환합니다. (CPU 작업, 프로세스 풀에서 실행)
+    """
+    splitter = _make_splitter(chunking)
+    count = 0
+    with open(spool_path, "w", encoding="utf-8") as spool:
+        for chunk in iter_chunks(iter_sections(file_path, file_type), splitter):
+            spool.write(json.dumps(chunk, ensure_ascii=False))
+            spool.write("\n")
+            count += 1
+    return count
+
+
+def _read_spool(spool_path: str, batch_size: int) -> Iterator[List[str]]:
+    with open(spool_path, "r", encoding="utf-8") as spool:
+        batch: List[str] = []
+        for line in spool:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+class IngestionPipeline:
+    """
+    문서 인덱싱 파이프라인
+
+    - 텍스트 추출과 청킹은 프로세스 풀에서 실행해 파싱 CPU 부하가 API 이벤트 루프를 막지 않습니다.
+    - 추출은 페이지/섹션 단위 스트림이고 청크는 스풀 파일을 거치므로, 파일 크기와 관계없이
+      메모리에는 섹션 하나와 진행 중인 임베딩 배치만 유지합니다.
+    - 청크 임베딩은 embed_batch_size개씩 묶어 호출하며, 동시 임베딩 호출 수는 파이프라인 전체에서
+      embed_concurrency로 제한합니다.
+    - 임베딩된 배치는 Chroma에 한 번의 add 호출로 기록합니다. (스레드에서 실행)
+    - 처리량(docs/sec, chunks/sec)은 파이프라인이 작업 중이던 시간 기준으로 계산합니다.
+    """
+
+    def __init__(
+        self,
+        embedding_model: Any,
+        chroma_client: Any,
+        collection_cache: Optional[Any] = None,
+        process_workers: int = 2,
+        embed_batch_size: int = 256,
+        embed_concurrency: int = 2,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        chunk_tokens: int = 0,
+        chunk_overlap_tokens: int = 0,
+        token_model: str = "gpt-4o"
+    ):
+        self.embedding_model = embedding_model
+        self.chroma_client = chroma_client
+        self.collection_cache = collection_cache
+        self.process_workers = process_workers
+        self.embed_batch_size = embed_batch_size
+        self.embed_concurrency = embed_concurrency
+        self.chunking = {
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "chunk_tokens": chunk_tokens,
+            "overlap_tokens": chunk_overlap_tokens,
+            "token_model": token_model,
+        }
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._embed_semaphore = asyncio.Semaphore(embed_concurrency)
+
+        # 작업 중 시간 (처리량 계산용)
+        self._active = 0
+        self._active_since = 0.0
+        self.busy_time = 0.0
+
+        # 통계 카운터
+        self.documents = 0
+        self.chunks = 0
+        self.failures = 0
+        self.embed_batches = 0
+        self.extract_time = 0.0
+        self.embed_time = 0.0
+        self.add_time = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 스레드가 있는 프로세스에서 fork는 안전하지 않으므로 spawn 사용
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def ingest(
+        self,
+        doc_id: str,
+        file_path: str,
+        file_type: str,
+        collection_name: str,
+        metadata: Dict[str, Any]
+    ) -> ChunkProcessResult:
+        """
+        파일을 추출/청킹/임베딩하여 컬렉션에 추가합니다. 처리 후 파일은 삭제합니다.
+        """
+        start_time = time.monotonic()
+        spool_path = f"{file_path}.chunks.jsonl"
+        self._enter()
+        try:
+            chunk_count = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), extract_to_spool,
+                file_path, file_type, spool_path, self.chunking
+            )
+            self.extract_time += time.monotonic() - start_time
+
+            if chunk_count:
+                collection = await asyncio.to_thread(
+                    self.chroma_client.get_or_create_collection, name=collection_name
+                )
+                base_metadata = {key: value for key, value in metadata.items() if value is not None}
+                await self._embed_spool(collection, doc_id, base_metadata, spool_path)
+                # 새로 만든 컬렉션이 음성 캐시에 남지 않도록 무효화
+                if self.collection_cache is not None:
+                    self.collection_cache.invalidate(collection_name)
+            else:
+                logger.warning(f"추출된 텍스트가 없습니다: {doc_id} ({metadata.get('file_name')})")
+
+            self.documents += 1
+            self.chunks += chunk_count
+            logger.info(f"문서 인덱싱 완료: {doc_id} ({chunk_count}개 청크, {time.monotonic() - start_time:.2f}초)")
+            return ChunkProcessResult(document_id=doc_id, chunk_count=chunk_count, status="success")
+
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"문서 인덱싱 오류: {doc_id}: {str(e)}")
+            return ChunkProcessResult(document_id=doc_id, chunk_count=0, status="error", error=str(e))
+
+        finally:
+            self._leave()
+            # 파일 처리 완료 후 임시 파일 삭제
+            for path in (file_path, spool_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    async def _embed_spool(
+        self,
+        collection: Any,
+        doc_id: str,
+        base_metadata: Dict[str, Any],
+        spool_path: str
+    ) -> None:
+        """
+        스풀 파일의 청크를 배치 단위로 읽어 임베딩/추가합니다. (진행 중인 배치 수 제한)
+        """
+        batches = _read_spool(spool_path, self.embed_batch_size)
+        pending: Set[asyncio.Task] = set()
+        offset = 0
+        try:
+            while True:
+                texts = await asyncio.to_thread(next, batches, None)
+                if texts is None:
+                    break
+                # 임베딩 대기 중인 배치가 많으면 읽기를 멈춤 (메모리 상한)
+                while len(pending) >= self.embed_concurrency * 2:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                pending.add(asyncio.ensure_future(
+                    self._embed_and_add(collection, doc_id, base_metadata, offset, texts)
+                ))
+                offset += len(texts)
+            if pending:
+                await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+
+    async def _embed_and_add(
+        self,
+        collection: Any,
+        doc_id: str,
+        base_metadata: Dict[str, Any],
+        offset: int,
+        texts: List[str]
+    ) -> None:
+        async with self._embed_semaphore:
+            embed_start = time.monotonic()
+            vectors = await self.embedding_model.aembed_documents(texts)
+            self.embed_time += time.monotonic() - embed_start
+        self.embed_batches += 1
+
+        ids = [f"{doc_id}_{offset + i}" for i in range(len(texts))]
+        metadatas = [
+            {**base_metadata, "document_id": doc_id, "chunk_id": chunk_id, "chunk_index": offset + i}
+            for i, chunk_id in enumerate(ids)
+        ]
+        add_start = time.monotonic()
+        await asyncio.to_thread(collection.add, ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+        self.add_time += time.monotonic() - add_start
+
+    def _enter(self) -> None:
+        if self._active == 0:
+            self._active_since = time.monotonic()
+        self._active += 1
+
+    def _leave(self) -> None:
+        self._active -= 1
+        if self._active == 0:
+            self.busy_time += time.monotonic() - self._active_since
+
+    def close(self) -> None:
+        """
+        파싱 프로세스 풀을 종료합니다.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        인덱싱 처리량 통계를 반환합니다.
+        """
+        busy_time = self.busy_time
+        if self._active:
+            busy_time += time.monotonic() - self._active_since
+        return {
+            "documents": self.documents,
+            "chunks": self.chunks,
+            "failures": self.failures,
+            "in_progress": self._active,
+            "embed_batches": self.embed_batches,
+            "docs_per_sec": self.documents / busy_time if busy_time else 0.0,
+            "chunks_per_sec": self.chunks / busy_time if busy_time else 0.0,
+            "extract_time": self.extract_time,
+            "embed_time": self.embed_time,
+            "add_time": self.add_time,
+        }
@@ -0,0 +1,412 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Any
+
+from app.services.backend_client import BackendClient
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class UsageOutbox:
+    """
+    사용량 이벤트의 디스크 기반 아웃박스 (SQLite WAL)
+
+    이벤트는 전용 writer 스레드가 그룹 커밋으로 SQLite에 추가하므로 이벤트 루프를 막지 않습니다.
+    백그라운드 replayer가 재시도 시각이 된 이벤트를 배치 단위로 백엔드에 전송합니다.
+    백엔드 장애나 재시작 중에도 사용량 기록이 유실되지 않습니다.
+    UsageLogPipeline과 같은 인터페이스(start/submit/stop/stats)를 제공합니다.
+
+    - 사용자 토큰은 저장하지 않고 서비스 토큰(service_token)으로 재전송합니다.
+    - 일시적 오류(5xx, 408, 429, 연결 오류)는 이벤트별 next_attempt_at으로 지수 백오프하므로
+      실패한 이벤트가 다른 이벤트의 전송을 막지 않습니다.
+    - 재시도해도 실패하는 오류(그 외 4xx)와 최대 시도 횟수를 넘긴 이벤트는
+      usage_outbox_dead 테이블로 옮깁니다.
+    """
+
+    def __init__(
+        self,
+        backend: BackendClient,
+        service_token: str,
+        path: str = "usage_outbox.db",
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+        retry_base: float = 1.0,
+        retry_max: float = 60.0,
+        max_attempts: int = 20,
+        max_group_commit: int = 1000
+    ):
+        self.backend = backend
+        self.service_token = service_token
+        self.path = path
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self.max_group_commit = max_group_commit
+
+        self._commands: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._replayer: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._closing = False
+        self._failed: Optional[BaseException] = None  # 저장소를 열지 못한 경우의 오류 (아웃박스 중지)
+
+        # 통계 카운터 (writer 스레드에서 갱신)
+        self.appended = 0
+        self.commits = 0
+        self.backlog = 0
+        # 통계 카운터 (이벤트 루프에서 갱신)
+        self.delivered = 0
+        self.dead_lettered = 0
+        self.send_failures = 0
+        self.retried = 0
+        self.dropped = 0
+        self.last_flush_latency = 0.0
+
+    # ------------------------------------------------------------------
+    # 수명 주기
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        """
+        writer 스레드와 replayer 태스크를 시작합니다.
+        """
+        self._loop = asyncio.get_running_loop()
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._writer_loop, name="usage-outbox-writer", daemon=True)
+            self._writer.start()
+
+        if self._replayer is None or self._replayer.done():
+            self._wake = asyncio.Event()
+            self._closing = False
+            self._replayer = asyncio.create_task(self._replay_loop())
+
+    async def submit(self, token: str, record: Dict[str, Any]) -> bool:
+        """
+        사용량 이벤트를 아웃박스에 추가합니다. (writer 스레드로 전달만 하므로 즉시 반환)
+        token은 저장하지 않습니다. (재전송은 서비스 토큰으로 수행)
+        """
+        if self._closing:
+            # 종료 후 도착한 이벤트로 아웃박스를 다시 시작하지 않음
+            self.dropped += 1
+            return False
+        if self._writer is None:
+            self.start()
+        if self._failed is not None:
+            self.dropped += 1
+            return False
+        now = time.time()
+        self._commands.put(("append", (json.dumps(record, ensure_ascii=False), now, now)))
+        return True
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        대기 중인 이벤트를 커밋하고 가능한 만큼 전송한 뒤 종료합니다.
+        전송하지 못한 이벤트는 디스크에 남아 다음 시작 시 재전송됩니다.
+        """
+        self._closing = True
+        if self._wake is not None:
+            self._wake.set()
+
+        if self._replayer is not None:
+            try:
+                await asyncio.wait_for(self._replayer, timeout=timeout)
+            except asyncio.TimeoutError:
+                self._replayer.cancel()
+                logger.warning(f"아웃박스 전송 종료 시간 초과: 미전송 이벤트 {self.backlog}건은 재시작 후 전송됩니다.")
+            self._replayer = None
+
+        if self._writer is not None:
+            self._commands.put((_STOP, None))
+            await asyncio.to_thread(self._writer.join, timeout)
+            self._writer = None
+
+    # ------------------------------------------------------------------
+    # writer 스레드 (SQLite 접근은 모두 이 스레드에서 수행)
+    # ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with conn:
+            self._create_tables(conn)
+        return conn
+
+    @staticmethod
+    def _create_tables(conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage_outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " record TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS usage_outbox_due ON usage_outbox (next_attempt_at, id)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage_outbox_dead ("
+            " id INTEGER PRIMARY KEY,"
+            " record TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " error TEXT,"
+            " dead_at REAL NOT NULL)"
+        )
+
+    def _writer_loop(self) -> None:
+        try:
+            conn = self._connect()
+        except Exception as e:
+            logger.error(f"아웃박스 저장소 열기 실패, 사용량 아웃박스를 중지합니다: {str(e)}")
+            # 이후 명령은 _call/submit에서 즉시 실패 (설정 후 비워야 경합으로 남는 명령이 없음)
+            self._failed = e
+            self._fail_pending(e)
+            return
+        self.backlog = conn.execute("SELECT COUNT(*) FROM usage_outbox").fetchone()[0]
+        if self.backlog:
+            logger.info(f"아웃박스 미전송 이벤트 {self.backlog}건 복구")
+
+        try:
+            while True:
+                # 첫 명령을 기다린 뒤, 쌓여 있는 명령을 한 번에 처리 (그룹 커밋)
+                commands = [self._commands.get()]
+                while len(commands) < self.max_group_commit:
+                    try:
+                        commands.append(self._commands.get_nowait())
+                    except queue.Empty:
+                        break
+
+                pending: List[Tuple[str, float, float]] = []
+                stop = False
+                for op, payload in commands:
+                    if op == "append":
+                        pending.append(payload)
+                        continue
+                    self._commit_appends(conn, pending)
+                    pending = []
+                    if op is _STOP:
+                        stop = True
+                        break
+                    self._run_command(conn, op, payload)
+                self._commit_appends(conn, pending)
+
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit_appends(self, conn: sqlite3.Connection, rows: List[Tuple[str, float, float]]) -> None:
+        if not rows:
+            return
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO usage_outbox (record, created_at, next_attempt_at) VALUES (?, ?, ?)", rows
+                )
+            self.appended += len(rows)
+            self.backlog += len(rows)
+            self.commits += 1
+        except sqlite3.Error as e:
+            logger.error(f"아웃박스 기록 오류: {str(e)} (이벤트 {len(rows)}건 유실)")
+
+    def _run_command(self, conn: sqlite3.Connection, op: str, payload: Tuple[Any, asyncio.Future]) -> None:
+        args, future = payload
+        try:
+            if op == "fetch":
+                # 재시도 시각이 된 이벤트만 가져옴 (백오프 중인 이벤트가 앞을 막지 않음)
+                result: Any = conn.execute(
+                    "SELECT id, record, attempts FROM usage_outbox"
+                    " WHERE next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?",
+                    (time.time(), args)
+                ).fetchall()
+            elif op == "delete":
+                with conn:
+                    conn.executemany("DELETE FROM usage_outbox WHERE id = ?", [(i,) for i in args])
+                self.backlog -= len(args)
+                result = len(args)
+            elif op == "mark_failed":
+                # args: [(next_attempt_at, id)]
+                with conn:
+                    conn.executemany(
+                        "UPDATE usage_outbox SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?", args
+                    )
+                result = len(args)
+            elif op == "dead_letter":
+                # args: [(error, id)]
+                now = time.time()
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO usage_outbox_dead (id, record, created_at, attempts, error, dead_at)"
+                        " SELECT id, record, created_at, attempts + 1, ?, ? FROM usage_outbox WHERE id = ?",
+                        [(error, now, i) for error, i in args]
+                    )
+                    conn.executemany("DELETE FROM usage_outbox WHERE id = ?", [(i,) for _, i in args])
+                self.backlog -= len(args)
+                result = len(args)
+            else:
+                raise ValueError(f"알 수 없는 아웃박스 명령: {op}")
+            self._loop.call_soon_threadsafe(self._resolve, future, result, None)
+        except Exception as e:
+            self._loop.call_soon_threadsafe(self._resolve, future, None, e)
+
+    def _fail_pending(self, error: BaseException) -> None:
+        """
+        대기 중인 명령을 모두 꺼내 결과를 기다리는 쪽에 오류를 전달합니다.
+        """
+        while True:
+            try:
+                op, payload = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            if op == "append":
+                self.dropped += 1
+            elif op is not _STOP:
+                _, future = payload
+                self._loop.call_soon_threadsafe(self._resolve, future, None, error)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Any, error: Optional[BaseException]) -> None:
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def _call(self, op: str, args: Any) -> Any:
+        """
+        writer 스레드에 명령을 보내고 결과를 기다립니다.
+        """
+        if self._failed is not None:
+            raise self._failed
+        future = self._loop.create_future()
+        self._commands.put((op, (args, future)))
+        if self._failed is not None:
+            # writer 스레드가 대기열을 비운 뒤에 넣었을 수 있으므로 직접 처리
+            self._fail_pending(self._failed)
+        return await future
+
+    # ------------------------------------------------------------------
+    # replayer (이벤트 루프)
+    # ------------------------------------------------------------------
+    async def _replay_loop(self) -> None:
+        try:
+            await self._replay()
+        except Exception as e:
+            if self._failed is None:
+                raise
+            logger.error(f"아웃박스 전송 중지: {str(e)}")
+
+    async def _replay(self) -> None:
+        while True:
+            rows = await self._call("fetch", self.batch_size)
+            if not rows:
+                if self._closing:
+                    return
+                await self._sleep(self.poll_interval)
+                continue
+
+            start_time = time.monotonic()
+            delivered_ids, retry_rows, dead_rows = await self._send(rows)
+            self.last_flush_latency = time.monotonic() - start_time
+
+            if delivered_ids:
+                await self._call("delete", delivered_ids)
+                self.delivered += len(delivered_ids)
+
+            if dead_rows:
+                logger.error(
+                    f"아웃박스 이벤트 {len(dead_rows)}건 전송 불가로 dead letter 처리: {dead_rows[0][0]}"
+                )
+                await self._call("dead_letter", dead_rows)
+                self.dead_lettered += len(dead_rows)
+
+            if retry_rows:
+                # 이벤트별 지수 백오프 (jitter 포함)
+                now = time.time()
+                await self._call("mark_failed", [
+                    (now + self._retry_delay(attempts), row_id) for row_id, attempts in retry_rows
+                ])
+                self.retried += len(retry_rows)
+
+            if self._closing and not delivered_ids:
+                return
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_max, self.retry_base * (2 ** attempts))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _send(
+        self,
+        rows: List[Tuple[int, str, int]]
+    ) -> Tuple[List[int], List[Tuple[int, int]], List[Tuple[str, int]]]:
+        """
+        행을 서비스 토큰으로 전송하고 (성공 ID 목록, 재시도 (ID, 시도 횟수) 목록, dead letter (오류, ID) 목록)을 반환합니다.
+        """
+        try:
+            errors = await self.backend.log_api_usage_records(
+                token=self.service_token,
+                records=[json.loads(row[1]) for row in rows]
+            )
+        except Exception as e:
+            errors = [e] * len(rows)
+
+        delivered: List[int] = []
+        retry: List[Tuple[int, int]] = []
+        dead: List[Tuple[str, int]] = []
+        for (row_id, _, attempts), error in zip(rows, errors):
+            if error is None:
+                delivered.append(row_id)
+                continue
+            self.send_failures += 1
+            if self.backend.is_retryable_error(error) and attempts + 1 < self.max_attempts:
+                retry.append((row_id, attempts))
+            else:
+                dead.append((str(error), row_id))
+        if retry:
+            logger.warning(f"아웃박스 전송 실패 ({len(retry)}건), 이벤트별 백오프 후 재시도")
+        return delivered, retry, dead
+
+    async def _sleep(self, seconds: float) -> None:
+        """
+        종료 신호가 오면 즉시 깨어나는 대기
+        """
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    @property
+    def queue_depth(self) -> int:
+        return self.backlog
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        아웃박스 통계를 반환합니다.
+        """
+        return {
+            "queue_depth": self.backlog,
+            "appended": self.appended,
+            "commits": self.commits,
+            "delivered": self.delivered,
+            "dead_lettered": self.dead_lettered,
+            "send_failures": self.send_failures,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "stopped": self._failed is not None,
+            "last_flush_latency": self.last_flush_latency,
+        }
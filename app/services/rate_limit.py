@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Any
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# (scope, id) 형태의 제한 대상 키. scope는 "user" 또는 "org"
+LimitKey = Tuple[str, int]
+
+
+class TokenBucket:
+    """
+    토큰 버킷 (O(1) 판정)
+
+    capacity만큼 버스트를 허용하고 초당 refill_rate씩 채워집니다.
+    사후 정산으로 잔량이 음수(부채)가 될 수 있습니다.
+    """
+
+    __slots__ = ("capacity", "refill_rate", "tokens", "updated_at")
+
+    def __init__(self, capacity: float, refill_rate: float, now: Optional[float] = None):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated_at = now if now is not None else time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+            self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        amount를 소비할 수 있을 때까지 남은 시간(초)을 반환합니다. 0이면 즉시 가능합니다.
+        용량보다 큰 요청은 버킷이 가득 찼을 때 허용합니다.
+        """
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        if self.refill_rate <= 0:
+            return math.inf
+        return (needed - self.tokens) / self.refill_rate
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class Admission:
+    """
+    승인된 요청의 예약 정보 (사후 정산에 사용)
+    """
+
+    __slots__ = ("keys", "reserved_tokens", "settled")
+
+    def __init__(self, keys: List[LimitKey], reserved_tokens: int):
+        self.keys = keys
+        self.reserved_tokens = reserved_tokens
+        self.settled = False
+
+
+class RateLimiter:
+    """
+    사용자/조직별 요청 수 및 토큰 한도를 적용하는 인프로세스 승인 계층
+
+    - 분당 요청 수(RPM)와 분당 토큰 수(TPM)를 토큰 버킷으로 제한합니다.
+    - 월간 토큰 쿼터(README 9장)가 설정된 경우 함께 적용합니다.
+    - 판정은 백엔드 왕복 없이 O(1)로 수행하고, 사용량 카운터는 주기적으로 백엔드와 비동기 동기화합니다.
+    - 가득 찬(한동안 쓰이지 않은) 버킷은 prune_interval마다 제거합니다. 새 버킷도 가득 찬 상태로 시작하므로 판정이 같습니다.
+    """
+
+    def __init__(
+        self,
+        user_rpm: int = 60,
+        user_tpm: int = 100000,
+        org_rpm: int = 600,
+        org_tpm: int = 1000000,
+        sync_interval: float = 30.0,
+        sync_fn: Optional[Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]] = None,
+        prune_interval: float = 60.0
+    ):
+        self.default_limits = {
+            "user": {"rpm": user_rpm, "tpm": user_tpm, "monthly_tokens": None},
+            "org": {"rpm": org_rpm, "tpm": org_tpm, "monthly_tokens": None},
+        }
+        self.sync_interval = sync_interval
+        self.sync_fn = sync_fn
+        self.prune_interval = prune_interval
+        self._last_prune = time.monotonic()
+
+        self._limits: Dict[LimitKey, Dict[str, Optional[int]]] = {}
+        self._request_buckets: Dict[LimitKey, TokenBucket] = {}
+        self._token_buckets: Dict[LimitKey, TokenBucket] = {}
+
+        # 월간 쿼터 카운터와 백엔드 미동기화 사용량
+        self._period = self._current_period()
+        self._monthly_used: Dict[LimitKey, int] = {}
+        self._unsynced: Dict[LimitKey, int] = {}
+
+        self._sync_task: Optional[asyncio.Task] = None
+
+        # 통계 카운터
+        self.admitted = 0
+        self.rejected = 0
+        self.sync_failures = 0
+        self.pruned_buckets = 0
+
+    # ------------------------------------------------------------------
+    # 한도 관리
+    # ------------------------------------------------------------------
+    def _limits_for(self, key: LimitKey) -> Dict[str, Optional[int]]:
+        return self._limits.get(key) or self.default_limits[key[0]]
+
+    def set_limits(
+        self,
+        scope: str,
+        target_id: int,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        monthly_tokens: Optional[int] = None
+    ) -> None:
+        """
+        특정 사용자/조직의 한도를 설정합니다. 지정하지 않은 값은 기본값을 사용합니다.
+        """
+        key = (scope, target_id)
+        defaults = self.default_limits[scope]
+        self._limits[key] = {
+            "rpm": rpm if rpm is not None else defaults["rpm"],
+            "tpm": tpm if tpm is not None else defaults["tpm"],
+            "monthly_tokens": monthly_tokens,
+        }
+        # 새 한도로 버킷을 다시 생성
+        self._request_buckets.pop(key, None)
+        self._token_buckets.pop(key, None)
+
+    def _buckets(self, key: LimitKey, now: float) -> Tuple[TokenBucket, TokenBucket]:
+        request_bucket = self._request_buckets.get(key)
+        token_bucket = self._token_buckets.get(key)
+        if request_bucket is None or token_bucket is None:
+            limits = self._limits_for(key)
+            request_bucket = TokenBucket(limits["rpm"], limits["rpm"] / 60.0, now)
+            token_bucket = TokenBucket(limits["tpm"], limits["tpm"] / 60.0, now)
+            self._request_buckets[key] = request_bucket
+            self._token_buckets[key] = token_bucket
+        return request_bucket, token_bucket
+
+    def _prune_idle_buckets(self, now: float) -> None:
+        """
+        요청/토큰 버킷이 모두 가득 찬 대상의 버킷을 제거합니다. (부채가 남은 버킷은 유지)
+        """
+        self._last_prune = now
+        idle = [
+            key for key, request_bucket in self._request_buckets.items()
+            if request_bucket.is_full(now) and self._token_buckets[key].is_full(now)
+        ]
+        for key in idle:
+            del self._request_buckets[key]
+            del self._token_buckets[key]
+        self.pruned_buckets += len(idle)
+
+    @staticmethod
+    def _current_period() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m")
+
+    @staticmethod
+    def _seconds_until_next_period() -> float:
+        now = datetime.now(timezone.utc)
+        if now.month == 12:
+            next_period = now.replace(year=now.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        else:
+            next_period = now.replace(month=now.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        return (next_period - now).total_seconds()
+
+    def _roll_period(self) -> None:
+        period = self._current_period()
+        if period != self._period:
+            self._period = period
+            self._monthly_used.clear()
+
+    # ------------------------------------------------------------------
+    # 승인 / 정산
+    # ------------------------------------------------------------------
+    def admit(self, user_id: Optional[int], org_id: Optional[int], estimated_tokens: int) -> Admission:
+        """
+        요청을 승인하고 예상 토큰을 예약합니다.
+        한도를 초과하면 Retry-After 헤더와 함께 429 오류를 발생시킵니다.
+        """
+        keys: List[LimitKey] = []
+        if user_id is not None:
+            keys.append(("user", user_id))
+        if org_id is not None:
+            keys.append(("org", org_id))
+
+        now = time.monotonic()
+        self._roll_period()
+        if now - self._last_prune >= self.prune_interval:
+            self._prune_idle_buckets(now)
+
+        # 모든 대상을 먼저 확인한 뒤 한 번에 소비 (부분 소비 방지)
+        retry_after = 0.0
+        reason = None
+        for key in keys:
+            request_bucket, token_bucket = self._buckets(key, now)
+            wait = max(request_bucket.wait_time(1, now), token_bucket.wait_time(estimated_tokens, now))
+            if wait > retry_after:
+                retry_after = wait
+                reason = f"{key[0]} 분당 한도 초과"
+
+            monthly_limit = self._limits_for(key)["monthly_tokens"]
+            if monthly_limit is not None and self._monthly_used.get(key, 0) + estimated_tokens > monthly_limit:
+                retry_after = max(retry_after, self._seconds_until_next_period())
+                reason = f"{key[0]} 월간 토큰 쿼터 초과"
+
+        if retry_after > 0:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail=f"요청 한도를 초과했습니다: {reason}",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
+        for key in keys:
+            request_bucket, token_bucket = self._buckets(key, now)
+            request_bucket.consume(1)
+            token_bucket.consume(estimated_tokens)
+            self._monthly_used[key] = self._monthly_used.get(key, 0) + estimated_tokens
+
+        self.admitted += 1
+        return Admission(keys, estimated_tokens)
+
+    def reconcile(self, admission: Optional[Admission], actual_tokens: int) -> None:
+        """
+        예약한 토큰과 실제 사용량의 차이를 정산합니다.
+        """
+        if admission is None or admission.settled:
+            return
+        admission.settled = True
+
+        delta = actual_tokens - admission.reserved_tokens
+        for key in admission.keys:
+            token_bucket = self._token_buckets.get(key)
+            if token_bucket is not None:
+                if delta > 0:
+                    token_bucket.consume(delta)
+                else:
+                    token_bucket.refund(-delta)
+            self._monthly_used[key] = max(0, self._monthly_used.get(key, 0) + delta)
+            if actual_tokens:
+                self._unsynced[key] = self._unsynced.get(key, 0) + actual_tokens
+
+    def charge(self, user_id: Optional[int], org_id: Optional[int], tokens: int) -> None:
+        """
+        예약 없이 발생한 사용량(헤징에서 진 요청 등)을 한도에 반영합니다.
+        """
+        keys: List[LimitKey] = []
+        if user_id is not None:
+            keys.append(("user", user_id))
+        if org_id is not None:
+            keys.append(("org", org_id))
+        self.reconcile(Admission(keys, 0), tokens)
+
+    # ------------------------------------------------------------------
+    # 백엔드 동기화
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        """
+        주기적 동기화 태스크를 시작합니다.
+        """
+        if self.sync_fn is None or (self._sync_task is not None and not self._sync_task.done()):
+            return
+        self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self) -> None:
+        """
+        동기화 태스크를 종료하고 남은 카운터를 마지막으로 동기화합니다.
+        """
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+            self._sync_task = None
+            await self.sync()
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    async def sync(self) -> None:
+        """
+        누적 사용량을 백엔드에 보내고, 응답으로 받은 한도/쿼터를 반영합니다.
+        """
+        if self.sync_fn is None:
+            return
+
+        counters, self._unsynced = self._unsynced, {}
+        payload = {
+            "period": self._period,
+            "users": {str(k[1]): v for k, v in counters.items() if k[0] == "user"},
+            "orgs": {str(k[1]): v for k, v in counters.items() if k[0] == "org"},
+        }
+        try:
+            response = await self.sync_fn(payload)
+        except Exception as e:
+            # 실패한 카운터는 다음 주기에 다시 전송
+            self.sync_failures += 1
+            for key, value in counters.items():
+                self._unsynced[key] = self._unsynced.get(key, 0) + value
+            logger.warning(f"사용량 카운터 동기화 실패: {str(e)}")
+            return
+
+        self._apply_sync_response(response or {})
+
+    def _apply_sync_response(self, response: Dict[str, Any]) -> None:
+        """
+        백엔드가 돌려준 한도와 월간 사용량을 반영합니다.
+        """
+        for scope, field in (("user", "users"), ("org", "orgs")):
+            for target_id, limits in (response.get(field) or {}).items():
+                key = (scope, int(target_id))
+                current = self._limits_for(key)
+                new_limits = {
+                    "rpm": limits.get("requestsPerMinute", current["rpm"]),
+                    "tpm": limits.get("tokensPerMinute", current["tpm"]),
+                    "monthly_tokens": limits.get("monthlyTokenLimit", current["monthly_tokens"]),
+                }
+                if new_limits != current:
+                    self.set_limits(scope, key[1], **new_limits)
+                # 다른 인스턴스 사용량을 포함한 백엔드 기준 월간 사용량
+                if "monthlyTokensUsed" in limits:
+                    self._monthly_used[key] = max(self._monthly_used.get(key, 0), int(limits["monthlyTokensUsed"]))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        승인 계층 통계를 반환합니다.
+        """
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "tracked_users": sum(1 for k in self._token_buckets if k[0] == "user"),
+            "tracked_orgs": sum(1 for k in self._token_buckets if k[0] == "org"),
+            "unsynced_counters": len(self._unsynced),
+            "sync_failures": self.sync_failures,
+            "pruned_buckets": self.pruned_buckets,
+        }
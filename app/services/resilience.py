@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import AsyncContextManager, Awaitable, Callable, Deque, Dict, Optional, TypeVar, Any
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """
+    회로 차단기가 열려 있어 호출을 즉시 거부할 때 발생하는 예외
+    """
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"업스트림 회로 차단 중: {endpoint}")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    엔드포인트별 회로 차단기 (closed → open → half-open)
+
+    연속 실패가 임계값에 도달하면 open 상태로 전환되어 recovery_timeout 동안 호출을 즉시 거부하고,
+    이후 한 번의 시험 호출(half-open)이 성공하면 다시 closed 상태가 됩니다.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """
+        회로 상태를 바꾸지 않고 시험 호출 슬롯만 반납합니다. (요청 자체의 오류 등)
+        """
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"회로 차단기 open: 연속 실패 {self.consecutive_failures}회")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class ResiliencePolicy:
+    """
+    OpenAI 호출 복원력 정책
+
+    - 일시적 오류와 429는 지터가 포함된 지수 백오프로 재시도하며, 업스트림 Retry-After를 따릅니다.
+    - 비스트리밍 호출은 지연 시간이 지정 백분위수를 넘으면 헤지 요청을 추가로 보낼 수 있습니다.
+    - 엔드포인트별 회로 차단기로 장애 시 즉시 실패합니다.
+    - pause가 주어지면 재시도 대기 동안 그 컨텍스트 안에서 대기합니다. (스케줄러 슬롯을 잠시 반납)
+    - 헤징에서 진 요청도 이미 끝났다면 on_discarded로 결과를 전달합니다. (사용량 과금 누락 방지)
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        hedge_enabled: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_samples: int = 50,
+        breaker_failure_threshold: int = 5,
+        breaker_recovery_timeout: float = 30.0
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_recovery_timeout = breaker_recovery_timeout
+
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, Deque[float]] = {}
+
+        # 통계 카운터
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rejected_by_breaker = 0
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = CircuitBreaker(self.breaker_failure_threshold, self.breaker_recovery_timeout)
+            self._breakers[endpoint] = breaker
+        return breaker
+
+    @staticmethod
+    def is_retryable(error: BaseException) -> bool:
+        """
+        재시도 가능한 오류인지 판단합니다. (429, 5xx, 타임아웃, 연결 오류)
+        """
+        return isinstance(error, (
+            openai.RateLimitError,
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.InternalServerError,
+        ))
+
+    @staticmethod
+    def retry_after_from(error: BaseException) -> Optional[float]:
+        """
+        업스트림 응답의 Retry-After(또는 retry-after-ms) 헤더 값을 초 단위로 반환합니다.
+        """
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000.0
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except (TypeError, ValueError):
+            return None
+        return None
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        retry_after = self.retry_after_from(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # full jitter 지수 백오프
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _hedge_delay(self, endpoint: str) -> Optional[float]:
+        samples = self._latencies.get(endpoint)
+        if not self.hedge_enabled or not samples or len(samples) < self.hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(self.hedge_percentile * len(ordered)))]
+
+    def _record_latency(self, endpoint: str, elapsed: float) -> None:
+        samples = self._latencies.get(endpoint)
+        if samples is None:
+            samples = deque(maxlen=512)
+            self._latencies[endpoint] = samples
+        samples.append(elapsed)
+
+    async def call(
+        self,
+        endpoint: str,
+        fn: Callable[[], Awaitable[T]],
+        hedge: bool = False,
+        pause: Optional[Callable[[], AsyncContextManager[Any]]] = None,
+        on_discarded: Optional[Callable[[T], None]] = None
+    ) -> T:
+        """
+        재시도/헤징/회로 차단 정책을 적용하여 fn을 호출합니다.
+        """
+        breaker = self.breaker(endpoint)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                self.rejected_by_breaker += 1
+                raise CircuitOpenError(endpoint, breaker.retry_after())
+
+            start_time = time.monotonic()
+            try:
+                if hedge:
+                    result = await self._hedged(endpoint, fn, on_discarded)
+                else:
+                    result = await fn()
+            except asyncio.CancelledError:
+                # 시험 호출이 취소되면 실패로 처리 (half-open에서 슬롯이 반납되지 않아 회로가 멈추는 것 방지)
+                if breaker.state == CircuitBreaker.HALF_OPEN:
+                    breaker.record_failure()
+                raise
+            except Exception as e:
+                if not self.is_retryable(e):
+                    # 요청 자체의 오류(4xx)는 업스트림 장애로 보지 않지만, half-open 회로를 닫지도 않음
+                    breaker.release_probe()
+                    raise
+                breaker.record_failure()
+                if attempt >= self.max_retries or breaker.state == CircuitBreaker.OPEN:
+                    # 재시도 소진 또는 회로가 열림 (장애 중에는 재시도하지 않음)
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"{endpoint} 호출 실패, {delay:.2f}초 후 재시도 ({attempt}/{self.max_retries}): {str(e)}")
+                if pause is not None:
+                    async with pause():
+                        await asyncio.sleep(delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+
+            breaker.record_success()
+            self._record_latency(endpoint, time.monotonic() - start_time)
+            return result
+
+    async def _hedged(
+        self,
+        endpoint: str,
+        fn: Callable[[], Awaitable[T]],
+        on_discarded: Optional[Callable[[T], None]] = None
+    ) -> T:
+        """
+        첫 요청이 지연 백분위수를 넘으면 두 번째 요청을 보내고 먼저 성공한 결과를 사용합니다.
+        """
+        delay = self._hedge_delay(endpoint)
+        if delay is None:
+            return await fn()
+
+        primary = asyncio.ensure_future(fn())
+        tasks = {primary}
+        winner: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedges += 1
+                tasks.add(asyncio.ensure_future(fn()))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        winner = task
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    # 늦게 끝난 요청은 취소
+                    task.cancel()
+                elif (task is not winner and on_discarded is not None
+                      and not task.cancelled() and task.exception() is None):
+                    # 이미 끝난 진 요청의 사용량도 보고
+                    on_discarded(task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        복원력 정책 통계를 반환합니다.
+        """
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "rejected_by_breaker": self.rejected_by_breaker,
+            "breakers": {
+                endpoint: {"state": breaker.state, "consecutive_failures": breaker.consecutive_failures}
+                for endpoint, breaker in self._breakers.items()
+            },
+        }
@@ -0,0 +1,262 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple, Any
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# 우선순위 레인 (숫자가 작을수록 먼저 처리)
+PRIORITY_INTERACTIVE = 0  # /chat/stream 등 사용자가 실시간으로 기다리는 요청
+PRIORITY_STANDARD = 1     # 일반 채팅 완성
+PRIORITY_BATCH = 2        # RAG/배치 작업
+_NUM_LANES = 3
+
+
+class SlotLease:
+    """
+    점유 중인 스케줄러 슬롯 (재시도 대기 중에는 paused()로 잠시 반납)
+    """
+
+    def __init__(self, scheduler: "UpstreamScheduler", org_id: Optional[int], priority: int, token: Optional[str]):
+        self.scheduler = scheduler
+        self.org_id = org_id
+        self.priority = priority
+        self.token = token
+        self.held = True
+
+    @asynccontextmanager
+    async def paused(self) -> AsyncIterator[None]:
+        """
+        블록 동안 슬롯을 반납하고, 끝나면 다시 획득합니다. (블록이 실패/취소되면 다시 획득하지 않음)
+        """
+        self.scheduler.release()
+        self.held = False
+        yield
+        await self.scheduler.acquire(self.org_id, self.priority, self.token)
+        self.held = True
+
+
+class UpstreamScheduler:
+    """
+    업스트림 LLM 동시 호출 스케줄러
+
+    전체 동시 호출 수를 제한하고, 대기 중인 요청은 우선순위 레인별로
+    조직 가중치 기반 공정 큐잉(WFQ)으로 처리합니다.
+    가중치는 조직의 구독 플랜(tier)에서 결정되며, 요청에 토큰이 없으면 서비스 토큰으로 조회합니다.
+    조회한 플랜은 tier_ttl(초) 동안 사용하고, 만료되면 이전 플랜을 쓰면서 백그라운드로 다시 조회합니다.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        max_wait: float = 30.0,
+        tier_weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0,
+        tier_resolver: Optional[Callable[[int, str], Awaitable[Optional[str]]]] = None,
+        service_token: Optional[str] = None,
+        prune_threshold: int = 1024,
+        tier_ttl: float = 600.0
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.tier_weights = tier_weights or {}
+        self.default_weight = default_weight
+        self.tier_resolver = tier_resolver
+        self.service_token = service_token
+        self.prune_threshold = prune_threshold
+        self.tier_ttl = tier_ttl
+
+        self._in_flight = 0
+        self._lanes: List[List[Tuple[float, int, asyncio.Future]]] = [[] for _ in range(_NUM_LANES)]
+        self._virtual_time = [0.0] * _NUM_LANES
+        self._last_finish: Dict[Tuple[int, Optional[int]], float] = {}
+        self._prune_at = prune_threshold
+        self._seq = itertools.count()
+
+        self._org_tiers: Dict[int, Tuple[str, float]] = {}  # org_id -> (플랜, 만료 시각)
+        self._resolving: Set[int] = set()
+
+        # 통계
+        self.dispatched = 0
+        self.queued = 0
+        self.timeouts = 0
+        self._wait_samples: Deque[float] = deque(maxlen=1024)
+
+    # ------------------------------------------------------------------
+    # 조직 가중치
+    # ------------------------------------------------------------------
+    def set_org_tier(self, org_id: int, tier: str) -> None:
+        """
+        조직의 구독 플랜을 등록합니다.
+        """
+        self._org_tiers[org_id] = (tier, time.monotonic() + self.tier_ttl)
+
+    def _weight(self, org_id: Optional[int], token: Optional[str]) -> float:
+        if org_id is None:
+            return self.default_weight
+
+        cached = self._org_tiers.get(org_id)
+        tier = cached[0] if cached else None
+        stale = cached is None or cached[1] <= time.monotonic()
+        token = token or self.service_token
+        if stale and token and self.tier_resolver and org_id not in self._resolving:
+            # 플랜은 백그라운드로 조회하고, 조회 전까지는 이전 플랜(없으면 기본 가중치) 사용
+            self._resolving.add(org_id)
+            asyncio.create_task(self._resolve_tier(org_id, token))
+
+        return self.tier_weights.get(tier, self.default_weight) if tier else self.default_weight
+
+    async def _resolve_tier(self, org_id: int, token: str) -> None:
+        try:
+            tier = await self.tier_resolver(org_id, token)
+            if tier:
+                self.set_org_tier(org_id, tier)
+        except Exception as e:
+            logger.warning(f"조직 {org_id} 플랜 조회 실패: {str(e)}")
+        finally:
+            self._resolving.discard(org_id)
+
+    # ------------------------------------------------------------------
+    # 슬롯 획득 / 반환
+    # ------------------------------------------------------------------
+    @asynccontextmanager
+    async def slot(
+        self,
+        org_id: Optional[int],
+        priority: int = PRIORITY_STANDARD,
+        token: Optional[str] = None
+    ) -> AsyncIterator[SlotLease]:
+        """
+        업스트림 호출 슬롯을 점유하는 컨텍스트 매니저
+        """
+        await self.acquire(org_id, priority, token)
+        lease = SlotLease(self, org_id, priority, token)
+        try:
+            yield lease
+        finally:
+            if lease.held:
+                self.release()
+
+    async def acquire(
+        self,
+        org_id: Optional[int],
+        priority: int = PRIORITY_STANDARD,
+        token: Optional[str] = None
+    ) -> None:
+        """
+        슬롯을 획득합니다. max_wait 안에 획득하지 못하면 503 오류를 발생시킵니다.
+        """
+        lane = min(max(priority, 0), _NUM_LANES - 1)
+        weight = self._weight(org_id, token)
+
+        # 대기열이 비어 있고 여유가 있으면 즉시 통과
+        if self._in_flight < self.max_concurrency and not any(self._lanes):
+            self._in_flight += 1
+            self.dispatched += 1
+            self._wait_samples.append(0.0)
+            return
+
+        # 가상 완료 시각 = max(레인 가상 시각, 조직의 직전 완료 시각) + 1/가중치
+        flow = (lane, org_id)
+        start_tag = max(self._virtual_time[lane], self._last_finish.get(flow, 0.0))
+        finish_tag = start_tag + 1.0 / weight
+        self._last_finish[flow] = finish_tag
+        if len(self._last_finish) > self._prune_at:
+            self._prune_idle_flows()
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._lanes[lane], (finish_tag, next(self._seq), future))
+        self.queued += 1
+        enqueued_at = time.monotonic()
+
+        try:
+            await asyncio.wait_for(future, timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            # 시간 초과와 같은 틱에 슬롯이 배정되었다면 다음 대기자에게 넘김 (슬롯 누수 방지)
+            if future.done() and not future.cancelled():
+                self.release()
+            self.timeouts += 1
+            raise HTTPException(
+                status_code=503,
+                detail="업스트림 대기 시간이 초과되었습니다. 잠시 후 다시 시도하세요.",
+                headers={"Retry-After": "1"}
+            )
+        except asyncio.CancelledError:
+            # 취소 직전에 슬롯이 배정되었다면 반환
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+        self._wait_samples.append(time.monotonic() - enqueued_at)
+
+    def _prune_idle_flows(self) -> None:
+        """
+        직전 완료 시각이 레인 가상 시각을 지난 조직(대기 중인 요청이 없는 조직)의 기록을 제거합니다.
+        이런 조직은 기록이 없을 때와 시작 시각이 같으므로 결과에 영향이 없습니다.
+        """
+        self._last_finish = {
+            flow: finish_tag for flow, finish_tag in self._last_finish.items()
+            if finish_tag > self._virtual_time[flow[0]]
+        }
+        # 대기 중인 조직이 많으면 정리 주기를 늘림 (정리 비용 분산)
+        self._prune_at = max(self.prune_threshold, 2 * len(self._last_finish))
+
+    def release(self) -> None:
+        """
+        슬롯을 반환하고 다음 대기 요청에 배정합니다.
+        """
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.max_concurrency:
+            next_waiter = None
+            for lane, heap in enumerate(self._lanes):
+                while heap:
+                    finish_tag, _, future = heapq.heappop(heap)
+                    if future.done():
+                        # 시간 초과/취소된 대기자
+                        continue
+                    next_waiter = (lane, finish_tag, future)
+                    break
+                if next_waiter:
+                    break
+
+            if next_waiter is None:
+                return
+
+            lane, finish_tag, future = next_waiter
+            self._virtual_time[lane] = finish_tag
+            self._in_flight += 1
+            self.dispatched += 1
+            future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        스케줄러 통계를 반환합니다.
+        """
+        samples = sorted(self._wait_samples)
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queued_now": [sum(1 for _, _, f in heap if not f.done()) for heap in self._lanes],
+            "dispatched": self.dispatched,
+            "queued_total": self.queued,
+            "timeouts": self.timeouts,
+            "tracked_flows": len(self._last_finish),
+            "queue_time_p50": percentile(0.50),
+            "queue_time_p95": percentile(0.95),
+            "queue_time_max": samples[-1] if samples else 0.0,
+        }
@@ -0,0 +1,204 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Any
+
+import numpy as np
+
+from app.schemas.chat import ChatMessage, ChatResponse
+from app.services.cache import copy_without_usage
+
+logger = logging.getLogger(__name__)
+
+
+class _OrgIndex:
+    """
+    조직 하나의 질문 임베딩 행렬과 저장된 응답
+    """
+
+    def __init__(self, capacity: int, dim: int):
+        self.capacity = capacity
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.scope_ids = np.zeros(capacity, dtype=np.int64)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.responses: List[Optional[ChatResponse]] = [None] * capacity
+        self.size = 0
+
+    def search(self, query: np.ndarray, scope_id: int, now: float) -> Optional[Tuple[int, float]]:
+        """
+        같은 스코프의 유효 항목 중 코사인 유사도가 가장 높은 (인덱스, 유사도)를 반환합니다.
+        """
+        n = self.size
+        if n == 0:
+            return None
+
+        # 정규화된 벡터이므로 내적이 곧 코사인 유사도
+        sims = self.vectors[:n] @ query
+        valid = (self.scope_ids[:n] == scope_id) & (self.expires_at[:n] > now)
+        if not valid.any():
+            return None
+        sims = np.where(valid, sims, -np.inf)
+        best = int(np.argmax(sims))
+        return best, float(sims[best])
+
+    def allocate_slot(self, now: float) -> Tuple[int, bool]:
+        """
+        새 항목을 위한 슬롯을 반환합니다. 가득 찬 경우 만료 항목 또는 가장 오래 쓰이지 않은 항목을 덮어씁니다.
+        """
+        if self.size < self.capacity:
+            slot = self.size
+            self.size += 1
+            return slot, False
+
+        expired = np.flatnonzero(self.expires_at <= now)
+        if expired.size:
+            return int(expired[0]), False
+        return int(np.argmin(self.last_used)), True
+
+
+class SemanticCache:
+    """
+    질문 임베딩 기반 시맨틱 응답 캐시
+
+    마지막 사용자 메시지의 임베딩을 조직별로 최근 답변한 질문들과 비교하여,
+    유사도가 임계값 이상이면 저장된 답변을 반환합니다.
+
+    - 온도가 max_temperature 이하인 요청만 대상입니다. 온도가 높은 요청은 매번 다른 답변을
+      기대하므로 저장된 답변을 돌려주면 요청의 의미가 바뀝니다. (요청 온도 그대로 판단)
+    - 조직 인덱스는 capacity_per_org x 임베딩 차원 크기로 미리 할당되므로(1536차원, 512개 기준 약 3MB)
+      최대 max_orgs개까지만 유지하고, 초과 시 가장 오래 쓰이지 않은 조직 인덱스를 제거합니다.
+    """
+
+    def __init__(
+        self,
+        embedding_model: Any,
+        threshold: float = 0.95,
+        capacity_per_org: int = 512,
+        ttl_seconds: float = 3600.0,
+        max_temperature: float = 0.0,
+        max_orgs: int = 64
+    ):
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.capacity_per_org = capacity_per_org
+        self.ttl_seconds = ttl_seconds
+        self.max_temperature = max_temperature
+        self.max_orgs = max_orgs
+        self._indexes: "OrderedDict[Optional[int], _OrgIndex]" = OrderedDict()
+
+        # 통계 카운터
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.evictions = 0
+        self.org_evictions = 0
+        self.embedding_errors = 0
+
+    def is_eligible(self, messages: List[ChatMessage], temperature: Optional[float]) -> bool:
+        """
+        시맨틱 캐시 대상인지 판단합니다.
+        결정적 설정이면서 이전 assistant 응답이 없는 단일 턴 질문만 대상입니다.
+        """
+        if temperature is None or temperature > self.max_temperature:
+            return False
+        if not messages or messages[-1].role != "user":
+            return False
+        return all(m.role != "assistant" for m in messages)
+
+    @staticmethod
+    def make_scope_id(model: str, messages: List[ChatMessage], max_tokens: Optional[int]) -> int:
+        """
+        질문 이외의 조건(모델, 시스템 프롬프트, 최대 토큰)을 정수 스코프 ID로 변환합니다.
+        """
+        parts = [model, str(max_tokens)] + [m.content for m in messages if m.role == "system"]
+        digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big", signed=True)
+
+    async def embed(self, text: str) -> Optional[np.ndarray]:
+        """
+        질문 텍스트를 정규화된 float32 벡터로 임베딩합니다. 실패 시 None을 반환합니다.
+        """
+        try:
+            vector = np.asarray(await self.embedding_model.aembed_query(text), dtype=np.float32)
+        except Exception as e:
+            self.embedding_errors += 1
+            logger.warning(f"시맨틱 캐시 임베딩 실패: {str(e)}")
+            return None
+
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    def get(self, org_id: Optional[int], scope_id: int, vector: np.ndarray) -> Optional[ChatResponse]:
+        """
+        유사한 질문의 캐시된 응답을 반환합니다.
+        """
+        index = self._indexes.get(org_id)
+        now = time.monotonic()
+        match = None
+        if index is not None and index.vectors.shape[1] == vector.shape[0]:
+            match = index.search(vector, scope_id, now)
+
+        if index is not None:
+            self._indexes.move_to_end(org_id)
+
+        if match is None or match[1] < self.threshold:
+            self.misses += 1
+            return None
+
+        slot, similarity = match
+        index.last_used[slot] = now
+        self.hits += 1
+        logger.debug(f"시맨틱 캐시 적중: 유사도={similarity:.4f}")
+        return copy_without_usage(index.responses[slot])
+
+    def set(self, org_id: Optional[int], scope_id: int, vector: np.ndarray, response: ChatResponse) -> None:
+        """
+        질문 임베딩과 응답을 조직 인덱스에 저장합니다.
+        """
+        index = self._indexes.get(org_id)
+        if index is None or index.vectors.shape[1] != vector.shape[0]:
+            index = _OrgIndex(self.capacity_per_org, vector.shape[0])
+            self._indexes[org_id] = index
+            while len(self._indexes) > self.max_orgs:
+                self._indexes.popitem(last=False)
+                self.org_evictions += 1
+        self._indexes.move_to_end(org_id)
+
+        now = time.monotonic()
+        slot, evicted = index.allocate_slot(now)
+        if evicted:
+            self.evictions += 1
+
+        index.vectors[slot] = vector
+        index.scope_ids[slot] = scope_id
+        index.expires_at[slot] = now + self.ttl_seconds
+        index.last_used[slot] = now
+        index.responses[slot] = response
+        self.inserts += 1
+
+    def invalidate_org(self, org_id: Optional[int]) -> None:
+        """
+        특정 조직의 시맨틱 캐시를 비웁니다.
+        """
+        self._indexes.pop(org_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        캐시 통계를 반환합니다.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "orgs": len(self._indexes),
+            "entries": sum(index.size for index in self._indexes.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "inserts": self.inserts,
+            "evictions": self.evictions,
+            "org_evictions": self.org_evictions,
+            "embedding_errors": self.embedding_errors,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
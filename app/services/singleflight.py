@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar, Any
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    진행 중인 동일 요청 병합 (singleflight)
+
+    같은 키로 동시에 들어온 호출은 하나의 업스트림 작업을 공유합니다.
+    대기자 하나가 취소되어도 공유 작업은 취소되지 않습니다.
+    """
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+        # 통계 카운터
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        키에 해당하는 작업을 실행하거나, 이미 진행 중이면 그 결과를 기다립니다.
+        (결과, 공유 여부)를 반환합니다.
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        shared = task is not None
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+        else:
+            self.coalesced += 1
+
+        # shield: 대기자가 취소되어도 공유 작업은 계속 진행
+        result = await asyncio.shield(task)
+        return result, shared
+
+    def _on_done(self, key: Hashable, task: asyncio.Future) -> None:
+        """
+        완료된 작업을 진행 목록에서 제거합니다.
+        """
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+        # 모든 대기자가 취소된 경우에도 예외가 소실 경고로 남지 않도록 확인
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"singleflight[{self.name}] 공유 작업 실패: {task.exception()}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        병합 통계를 반환합니다.
+        """
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
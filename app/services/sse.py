@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, List, Optional
+
+try:
+    import orjson
+except ImportError:  # 선택 의존성
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# 고정 프레이밍 바이트 (미리 인코딩)
+DATA_PREFIX = b"data: "
+FRAME_END = b"\n\n"
+DONE_FRAME = b"data: [DONE]\n\n"
+_CONTENT_PREFIX = b'data: {"content":'
+_CONTENT_SUFFIX = b"}\n\n"
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    JSON 직렬화 (orjson이 있으면 사용)
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def event_frame(payload: Any) -> bytes:
+    """
+    임의의 JSON 페이로드를 SSE data 프레임으로 만듭니다.
+    """
+    return DATA_PREFIX + dumps(payload) + FRAME_END
+
+
+def named_event_frame(event: str, payload: Any) -> bytes:
+    """
+    이름이 있는 SSE 이벤트 프레임을 만듭니다. (EventSource의 addEventListener(event)로 수신)
+    """
+    return b"event: " + event.encode("utf-8") + b"\n" + event_frame(payload)
+
+
+def content_frame(content: str) -> bytes:
+    """
+    {"content": ...} 프레임을 만듭니다.
+    """
+    return _CONTENT_PREFIX + dumps(content) + _CONTENT_SUFFIX
+
+
+def error_frame(message: str) -> bytes:
+    """
+    {"error": ...} 프레임을 만듭니다.
+    """
+    return event_frame({"error": message})
+
+
+class SSEFrameWriter:
+    """
+    스트리밍 델타를 모아 더 적은 수의 SSE 프레임으로 내보내는 작성기
+
+    - 첫 델타는 즉시 내보내 첫 토큰 지연(TTFT)에 영향을 주지 않습니다.
+    - 이후 델타는 window(초) 동안 또는 max_bytes(문자 수 기준 근사)에 도달할 때까지 모아
+      하나의 프레임으로 내보냅니다.
+    - 업스트림이 멈춰도 window가 지나면 모아 둔 내용을 바로 내보냅니다.
+    - window가 0이면 델타마다 프레임을 내보냅니다.
+    """
+
+    def __init__(self, window: float = 0.02, max_bytes: int = 512):
+        self.window = window
+        self.max_bytes = max_bytes
+
+        # 통계 카운터
+        self.deltas = 0
+        self.frames = 0
+
+    async def coalesce(self, deltas: AsyncIterator[str]) -> AsyncIterator[bytes]:
+        """
+        델타 스트림을 SSE 프레임(bytes) 스트림으로 변환합니다.
+
+        업스트림은 스트림당 하나의 펌프 태스크가 읽어 버퍼에 쌓고, 델타마다의 비용은 리스트 추가뿐입니다.
+        프레임 전송 시점(첫 델타, 크기 도달, window 타이머, 종료)에만 소비 측을 깨웁니다.
+        """
+        loop = asyncio.get_running_loop()
+        buffer: List[str] = []
+        buffered_size = 0
+        ready = False
+        done = False
+        error: Optional[BaseException] = None
+        wakeup: Optional[asyncio.Future] = None
+        timer: Optional[asyncio.TimerHandle] = None
+
+        def wake() -> None:
+            nonlocal ready, timer
+            ready = True
+            timer = None
+            if wakeup is not None and not wakeup.done():
+                wakeup.set_result(None)
+
+        async def pump() -> None:
+            nonlocal buffered_size, done, error, timer
+            first = True
+            try:
+                async for delta in deltas:
+                    self.deltas += 1
+                    buffer.append(delta)
+                    buffered_size += len(delta)
+                    if first or self.window <= 0 or buffered_size >= self.max_bytes:
+                        # 첫 델타는 즉시 전송 (TTFT 유지)
+                        first = False
+                        wake()
+                    elif timer is None:
+                        timer = loop.call_later(self.window, wake)
+            except Exception as e:
+                error = e
+            finally:
+                done = True
+                wake()
+
+        pump_task = asyncio.ensure_future(pump())
+        try:
+            while True:
+                if not ready:
+                    wakeup = loop.create_future()
+                    await wakeup
+                ready = False
+
+                if buffer:
+                    if timer is not None:
+                        timer.cancel()
+                        timer = None
+                    frame = content_frame("".join(buffer))
+                    buffer.clear()
+                    buffered_size = 0
+                    self.frames += 1
+                    yield frame
+
+                if done and not buffer:
+                    if error is not None:
+                        raise error
+                    break
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if not pump_task.done():
+                pump_task.cancel()
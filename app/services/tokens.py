@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, Any
+
+import tiktoken
+
+from app.schemas.chat import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+TOKENS_PER_MESSAGE = 3  # 메시지당 기본 토큰 수
+TOKENS_PER_REPLY = 3    # 마지막 assistant 메시지를 위한 추가 토큰
+
+
+class TokenCounter:
+    """
+    tiktoken 기반 토큰 계산기
+
+    - 모델별 인코딩을 한 번만 로드해 캐시하며, 시작 시 미리 로드(warm-up)할 수 있습니다.
+    - 메시지 내용별 토큰 수를 내용 해시로 메모이즈하여 반복되는 대화 이력을 다시 인코딩하지 않습니다.
+    - 캐시되지 않은 내용이 큰 경우 GIL을 해제하는 encode_batch를 스레드 풀에서 실행해
+      이벤트 루프를 막지 않습니다.
+    """
+
+    def __init__(
+        self,
+        memo_size: int = 10000,
+        offload_threshold: int = 8192,
+        max_workers: int = 4
+    ):
+        self.memo_size = memo_size
+        self.offload_threshold = offload_threshold
+        self.max_workers = max_workers
+
+        self._model_encodings: Dict[str, tiktoken.Encoding] = {}
+        self._memo: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # 통계 카운터
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.offloaded_batches = 0
+
+    # ------------------------------------------------------------------
+    # 인코딩
+    # ------------------------------------------------------------------
+    def encoding_for(self, model: str) -> tiktoken.Encoding:
+        """
+        모델에 맞는 토큰 인코딩을 반환합니다. (모델별 캐시)
+        """
+        encoding = self._model_encodings.get(model)
+        if encoding is None:
+            encoding = self._load_encoding(model)
+            self._model_encodings[model] = encoding
+        return encoding
+
+    @staticmethod
+    def _load_encoding(model: str) -> tiktoken.Encoding:
+        try:
+            if "gpt-4" in model:
+                return tiktoken.encoding_for_model("gpt-4o")
+            elif "gpt-3.5" in model:
+                return tiktoken.encoding_for_model("gpt-3.5-turbo")
+            else:
+                return tiktoken.get_encoding("cl100k_base")  # 기본 인코딩
+        except Exception:
+            return tiktoken.get_encoding("cl100k_base")  # 오류 시 기본 인코딩
+
+    def warmup(self, models: Iterable[str]) -> None:
+        """
+        주어진 모델의 인코딩(BPE 파일)을 미리 로드합니다. (블로킹 호출)
+        """
+        for model in models:
+            encoding = self.encoding_for(model)
+            encoding.encode_ordinary("warmup")
+            logger.info(f"토큰 인코딩 로드 완료: {model} → {encoding.name}")
+
+    # ------------------------------------------------------------------
+    # 토큰 계산
+    # ------------------------------------------------------------------
+    def count(self, text: str, model: str) -> int:
+        """
+        텍스트의 토큰 수를 계산합니다. (메모이즈하지 않음)
+        """
+        return len(self.encoding_for(model).encode_ordinary(text))
+
+    @staticmethod
+    def _memo_key(encoding: tiktoken.Encoding, text: str) -> Tuple[str, bytes]:
+        return encoding.name, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def _memo_get(self, key: Tuple[str, bytes]) -> Optional[int]:
+        count = self._memo.get(key)
+        if count is not None:
+            self._memo.move_to_end(key)
+            self.memo_hits += 1
+        return count
+
+    def _memo_set(self, key: Tuple[str, bytes], count: int) -> None:
+        self._memo[key] = count
+        self._memo.move_to_end(key)
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    def count_cached(self, text: str, model: str) -> int:
+        """
+        텍스트의 토큰 수를 내용 해시로 메모이즈하여 계산합니다.
+        """
+        encoding = self.encoding_for(model)
+        key = self._memo_key(encoding, text)
+        count = self._memo_get(key)
+        if count is None:
+            self.memo_misses += 1
+            count = len(encoding.encode_ordinary(text))
+            self._memo_set(key, count)
+        return count
+
+    def count_messages(self, messages: List[ChatMessage], model: str) -> int:
+        """
+        메시지 리스트의 토큰 수를 계산합니다. (이벤트 루프에서 동기 실행)
+        """
+        total_tokens = TOKENS_PER_REPLY
+        for message in messages:
+            total_tokens += TOKENS_PER_MESSAGE
+            total_tokens += self.count_cached(message.content, model)
+            total_tokens += self.count_cached(message.role, model)
+        return total_tokens
+
+    async def count_messages_async(self, messages: List[ChatMessage], model: str) -> int:
+        """
+        메시지 리스트의 토큰 수를 계산합니다.
+        캐시되지 않은 내용이 offload_threshold(문자 수) 이상이면 스레드 풀에서 일괄 인코딩합니다.
+        """
+        encoding = self.encoding_for(model)
+
+        message_keys = [
+            (self._memo_key(encoding, message.content), self._memo_key(encoding, message.role))
+            for message in messages
+        ]
+
+        counts: Dict[Tuple[str, bytes], int] = {}
+        missing: Dict[Tuple[str, bytes], str] = {}
+        for message, keys in zip(messages, message_keys):
+            for key, text in zip(keys, (message.content, message.role)):
+                if key in counts or key in missing:
+                    continue
+                count = self._memo_get(key)
+                if count is None:
+                    missing[key] = text
+                else:
+                    counts[key] = count
+
+        if missing:
+            self.memo_misses += len(missing)
+            texts = list(missing.values())
+            if sum(len(text) for text in texts) >= self.offload_threshold:
+                self.offloaded_batches += 1
+                lengths = await asyncio.get_running_loop().run_in_executor(
+                    self._get_executor(), self._encode_lengths, encoding, texts
+                )
+            else:
+                lengths = [len(encoding.encode_ordinary(text)) for text in texts]
+            for key, length in zip(missing.keys(), lengths):
+                counts[key] = length
+                self._memo_set(key, length)
+
+        total_tokens = TOKENS_PER_REPLY
+        for content_key, role_key in message_keys:
+            total_tokens += TOKENS_PER_MESSAGE + counts[content_key] + counts[role_key]
+        return total_tokens
+
+    @staticmethod
+    def _encode_lengths(encoding: tiktoken.Encoding, texts: List[str]) -> List[int]:
+        # 이미 executor 스레드에서 실행되므로 encode_ordinary_batch(내부 스레드 풀 생성)를 쓰지 않음
+        return [len(encoding.encode_ordinary(text)) for text in texts]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tiktoken")
+        return self._executor
+
+    def close(self) -> None:
+        """
+        토큰 계산 스레드 풀을 종료합니다.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        토큰 계산기 통계를 반환합니다.
+        """
+        lookups = self.memo_hits + self.memo_misses
+        return {
+            "encodings": {model: encoding.name for model, encoding in self._model_encodings.items()},
+            "memo_entries": len(self._memo),
+            "memo_hits": self.memo_hits,
+            "memo_misses": self.memo_misses,
+            "memo_hit_rate": self.memo_hits / lookups if lookups else 0.0,
+            "offloaded_batches": self.offloaded_batches,
+        }
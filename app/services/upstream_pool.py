@@ -0,0 +1,339 @@
+import logging
+import random
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, TypeVar, Any
+
+import httpx
+import openai
+
+from app.services.resilience import ResiliencePolicy
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# OpenAI 리셋 헤더 형식 (예: "1s", "6m0s", "20ms")
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """
+    x-ratelimit-reset-* 헤더 값을 초 단위로 변환합니다.
+    """
+    if not value:
+        return None
+    parts = _DURATION_PATTERN.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class UpstreamTarget:
+    """
+    하나의 OpenAI 호환 엔드포인트 + API 키 조합과 상태 정보
+    """
+
+    def __init__(self, name: str, base_url: Optional[str], client: openai.AsyncOpenAI, http_client: httpx.AsyncClient):
+        self.name = name
+        self.base_url = base_url
+        self.client = client
+        self.http_client = http_client
+
+        # 지연 시간/오류율 EWMA
+        self.latency_ewma: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.in_flight = 0
+
+        # 응답 헤더 기반 한도 여유분
+        self.limit_requests: Optional[int] = None
+        self.limit_tokens: Optional[int] = None
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.headroom_reset_at = 0.0
+
+        # 제외(ejection) 상태
+        self.ejected_until = 0.0
+        self.ejections = 0
+        # 오류 제외 횟수 (제외 기간 지수 증가에 사용, 일정 시간 정상이면 초기화)
+        self.error_ejections = 0
+        self.rate_limit_ejections = 0
+        self.last_error_at = 0.0
+
+        # 통계 카운터
+        self.requests = 0
+        self.failures = 0
+
+    def update_rate_limits(self, headers: httpx.Headers) -> None:
+        """
+        응답 헤더의 x-ratelimit-* 값을 반영합니다.
+        """
+        def to_int(name: str) -> Optional[int]:
+            value = headers.get(name)
+            try:
+                return int(value) if value is not None else None
+            except ValueError:
+                return None
+
+        remaining_requests = to_int("x-ratelimit-remaining-requests")
+        remaining_tokens = to_int("x-ratelimit-remaining-tokens")
+        if remaining_requests is None and remaining_tokens is None:
+            return
+
+        self.limit_requests = to_int("x-ratelimit-limit-requests") or self.limit_requests
+        self.limit_tokens = to_int("x-ratelimit-limit-tokens") or self.limit_tokens
+        self.remaining_requests = remaining_requests
+        self.remaining_tokens = remaining_tokens
+
+        resets = [
+            parse_reset_duration(headers.get("x-ratelimit-reset-requests")),
+            parse_reset_duration(headers.get("x-ratelimit-reset-tokens")),
+        ]
+        resets = [r for r in resets if r is not None]
+        self.headroom_reset_at = time.monotonic() + (max(resets) if resets else 60.0)
+
+    def headroom(self, now: float) -> float:
+        """
+        남은 한도 비율(0~1)을 반환합니다. 정보가 없거나 리셋 시각이 지났으면 1입니다.
+        """
+        if now >= self.headroom_reset_at:
+            return 1.0
+        ratios = []
+        if self.remaining_requests is not None and self.limit_requests:
+            ratios.append(self.remaining_requests / self.limit_requests)
+        if self.remaining_tokens is not None and self.limit_tokens:
+            ratios.append(self.remaining_tokens / self.limit_tokens)
+        if self.remaining_requests == 0 or self.remaining_tokens == 0:
+            return 0.0
+        return max(0.0, min(1.0, min(ratios))) if ratios else 1.0
+
+    def is_ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+
+class UpstreamPool:
+    """
+    여러 OpenAI 호환 엔드포인트/API 키에 요청을 분산하는 로드 밸런서
+
+    - 대상별로 독립된 커넥션 풀(클라이언트)을 유지합니다.
+    - 두 후보를 무작위로 뽑아 점수가 낮은 쪽을 선택합니다. (power of two choices)
+      점수는 EWMA 지연 시간, 오류율, 처리 중 요청 수, 응답 헤더의 남은 한도로 계산합니다.
+    - 연속 실패/높은 오류율/429/인증 오류가 발생한 대상은 일정 시간 제외했다가 자동으로 재투입합니다.
+      오류 제외 기간은 반복될 때마다 두 배로 늘고, eject_reset_after 동안 오류가 없으면 초기화됩니다.
+      429는 한도 소진일 뿐 대상의 장애가 아니므로 리셋 시각까지만 제외하고 오류율/오류 제외 횟수에 반영하지 않습니다.
+    """
+
+    def __init__(
+        self,
+        ewma_alpha: float = 0.2,
+        eject_consecutive_failures: int = 3,
+        eject_error_rate: float = 0.5,
+        eject_base_duration: float = 10.0,
+        eject_max_duration: float = 300.0,
+        eject_reset_after: float = 600.0
+    ):
+        self.ewma_alpha = ewma_alpha
+        self.eject_consecutive_failures = eject_consecutive_failures
+        self.eject_error_rate = eject_error_rate
+        self.eject_base_duration = eject_base_duration
+        self.eject_max_duration = eject_max_duration
+        self.eject_reset_after = eject_reset_after
+
+        self.targets: List[UpstreamTarget] = []
+        self.failovers = 0
+
+    def add_target(
+        self,
+        name: str,
+        base_url: Optional[str],
+        client_factory: Callable[[httpx.AsyncClient], openai.AsyncOpenAI],
+        limits: httpx.Limits,
+        timeout: httpx.Timeout
+    ) -> UpstreamTarget:
+        """
+        대상을 등록합니다. 대상마다 응답 헤더를 수집하는 전용 커넥션 풀을 생성합니다.
+        """
+        target: Optional[UpstreamTarget] = None
+
+        async def on_response(response: httpx.Response) -> None:
+            if target is not None:
+                target.update_rate_limits(response.headers)
+
+        http_client = httpx.AsyncClient(limits=limits, timeout=timeout, event_hooks={"response": [on_response]})
+        target = UpstreamTarget(name, base_url, client_factory(http_client), http_client)
+        self.targets.append(target)
+        logger.info(f"업스트림 대상 등록: {name} ({base_url or '기본 OpenAI API URL'})")
+        return target
+
+    @property
+    def primary_client(self) -> openai.AsyncOpenAI:
+        return self.targets[0].client
+
+    # ------------------------------------------------------------------
+    # 대상 선택
+    # ------------------------------------------------------------------
+    def _score(self, target: UpstreamTarget, now: float, default_latency: float) -> float:
+        latency = target.latency_ewma if target.latency_ewma is not None else default_latency
+        headroom = target.headroom(now)
+        # 한도가 거의 소진된 대상은 강하게 회피
+        return latency * (1.0 + 4.0 * target.error_rate) * (1 + target.in_flight) / max(headroom, 0.01)
+
+    def select(self, exclude: Optional[Set[UpstreamTarget]] = None) -> UpstreamTarget:
+        """
+        요청을 보낼 대상을 선택합니다. exclude의 대상(이미 시도한 대상)은 가능한 한 피합니다.
+        """
+        now = time.monotonic()
+        healthy = []
+        for target in self.targets:
+            if target.is_ejected(now) or (exclude and target in exclude):
+                continue
+            if target.ejected_until:
+                # 제외 기간 종료: 재투입 (오류율은 절반만 남김)
+                target.ejected_until = 0.0
+                target.consecutive_failures = 0
+                target.error_rate /= 2
+                logger.info(f"업스트림 대상 재투입: {target.name}")
+            healthy.append(target)
+
+        if not healthy:
+            # 모든 대상이 제외된 경우 가장 먼저 복귀할 대상으로 시도 (fail-open)
+            candidates = [t for t in self.targets if not exclude or t not in exclude] or self.targets
+            return min(candidates, key=lambda t: t.ejected_until)
+        if len(healthy) == 1:
+            return healthy[0]
+
+        known = [t.latency_ewma for t in healthy if t.latency_ewma is not None]
+        default_latency = sum(known) / len(known) if known else 1.0
+
+        first, second = random.sample(healthy, 2)
+        if self._score(first, now, default_latency) <= self._score(second, now, default_latency):
+            return first
+        return second
+
+    # ------------------------------------------------------------------
+    # 호출 / 결과 기록
+    # ------------------------------------------------------------------
+    async def call(self, request_fn: Callable[[openai.AsyncOpenAI], Awaitable[T]]) -> T:
+        """
+        대상을 선택해 request_fn(client)을 호출하고 지연 시간/오류를 기록합니다.
+        스트리밍 호출은 스트림 생성(첫 응답 헤더)까지의 시간이 기록됩니다.
+        429/연결 오류는 대기 없이 아직 시도하지 않은 정상 대상으로 즉시 전환합니다.
+        """
+        tried: Set[UpstreamTarget] = set()
+        while True:
+            target = self.select(exclude=tried)
+            target.in_flight += 1
+            target.requests += 1
+            start_time = time.monotonic()
+            try:
+                result = await request_fn(target.client)
+            except Exception as e:
+                self._record_failure(target, e)
+                tried.add(target)
+                if isinstance(e, (openai.RateLimitError, openai.APIConnectionError)) and self._has_alternative(tried):
+                    self.failovers += 1
+                    logger.info(f"업스트림 대상 전환: {target.name} 실패 ({type(e).__name__})")
+                    continue
+                raise
+            finally:
+                target.in_flight -= 1
+
+            self._record_success(target, time.monotonic() - start_time)
+            return result
+
+    def _has_alternative(self, tried: Set[UpstreamTarget]) -> bool:
+        now = time.monotonic()
+        return any(t not in tried and not t.is_ejected(now) for t in self.targets)
+
+    def _record_success(self, target: UpstreamTarget, elapsed: float) -> None:
+        alpha = self.ewma_alpha
+        if target.latency_ewma is None:
+            target.latency_ewma = elapsed
+        else:
+            target.latency_ewma = alpha * elapsed + (1 - alpha) * target.latency_ewma
+        target.error_rate *= (1 - alpha)
+        target.consecutive_failures = 0
+        self._decay_ejections(target, time.monotonic())
+
+    def _decay_ejections(self, target: UpstreamTarget, now: float) -> None:
+        """
+        마지막 오류 후 eject_reset_after 동안 정상이었다면 오류 제외 횟수를 초기화합니다.
+        """
+        if target.error_ejections and now - target.last_error_at >= self.eject_reset_after:
+            target.error_ejections = 0
+
+    def _record_failure(self, target: UpstreamTarget, error: Exception) -> None:
+        if isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError)):
+            # 키 자체의 문제: 최대 시간 동안 제외
+            target.failures += 1
+            self._eject(target, self.eject_max_duration, f"인증 오류: {str(error)}")
+            return
+        if not ResiliencePolicy.is_retryable(error):
+            # 요청 자체의 오류(4xx)는 대상 상태에 반영하지 않음
+            return
+
+        target.failures += 1
+        if isinstance(error, openai.RateLimitError):
+            # 한도 소진: 리셋 시각(Retry-After)까지만 제외 (오류 제외 기간 증가에 반영하지 않음)
+            retry_after = ResiliencePolicy.retry_after_from(error) or self.eject_base_duration
+            target.rate_limit_ejections += 1
+            self._eject(target, min(retry_after, self.eject_max_duration), "요청 한도 초과 (429)")
+            return
+
+        now = time.monotonic()
+        self._decay_ejections(target, now)
+        target.last_error_at = now
+        target.consecutive_failures += 1
+        target.error_rate = self.ewma_alpha + (1 - self.ewma_alpha) * target.error_rate
+
+        if (target.consecutive_failures >= self.eject_consecutive_failures
+                or target.error_rate >= self.eject_error_rate):
+            duration = min(self.eject_base_duration * (2 ** target.error_ejections), self.eject_max_duration)
+            target.error_ejections += 1
+            self._eject(target, duration, f"연속 실패 {target.consecutive_failures}회, 오류율 {target.error_rate:.2f}")
+
+    def _eject(self, target: UpstreamTarget, duration: float, reason: str) -> None:
+        target.ejected_until = time.monotonic() + duration
+        target.ejections += 1
+        logger.warning(f"업스트림 대상 제외: {target.name} ({duration:.1f}초) - {reason}")
+
+    async def close(self) -> None:
+        """
+        모든 대상의 클라이언트와 커넥션 풀을 종료합니다.
+        """
+        for target in self.targets:
+            await target.client.close()
+            if not target.http_client.is_closed:
+                await target.http_client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        대상별 상태 통계를 반환합니다. (API 키와 base URL은 포함하지 않음)
+        """
+        now = time.monotonic()
+        return {
+            "failovers": self.failovers,
+            "targets": [
+                {
+                    "name": target.name,
+                    "latency_ewma": target.latency_ewma,
+                    "error_rate": round(target.error_rate, 4),
+                    "in_flight": target.in_flight,
+                    "headroom": round(target.headroom(now), 4),
+                    "remaining_requests": target.remaining_requests,
+                    "remaining_tokens": target.remaining_tokens,
+                    "ejected": target.is_ejected(now),
+                    "ejections": target.ejections,
+                    "error_ejections": target.error_ejections,
+                    "rate_limit_ejections": target.rate_limit_ejections,
+                    "requests": target.requests,
+                    "failures": target.failures,
+                }
+                for target in self.targets
+            ]
+        }
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple, Any
+
+from app.services.backend_client import BackendClient
+
+logger = logging.getLogger(__name__)
+
+
+class UsageLogPipeline:
+    """
+    사용량 이벤트 배치 전송 파이프라인
+
+    요청마다 백엔드에 POST하는 대신 제한된 크기의 큐에 이벤트를 적재하고,
+    백그라운드 플러셔가 개수/시간 기준으로 묶어 일괄 전송합니다.
+    일시적인 오류로 전송하지 못한 이벤트는 max_attempts까지 큐에 다시 넣고,
+    그래도 실패하거나 재시도할 수 없는 오류면 오류 로그와 통계(failed)에 남깁니다.
+    """
+
+    OVERFLOW_BLOCK = "block"  # 큐가 가득 차면 enqueue_timeout 동안 대기 후 폐기
+    OVERFLOW_DROP = "drop"    # 큐가 가득 차면 즉시 폐기
+
+    def __init__(
+        self,
+        backend: BackendClient,
+        max_queue_size: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        overflow_policy: str = OVERFLOW_DROP,
+        enqueue_timeout: float = 0.05,
+        max_attempts: int = 3
+    ):
+        if overflow_policy not in (self.OVERFLOW_BLOCK, self.OVERFLOW_DROP):
+            raise ValueError(f"지원하지 않는 overflow_policy: {overflow_policy}")
+
+        self.backend = backend
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.enqueue_timeout = enqueue_timeout
+        self.max_attempts = max_attempts
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # 통계 카운터
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.retried = 0
+        self.batches = 0
+        self.last_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def start(self) -> None:
+        """
+        백그라운드 플러셔를 시작합니다.
+        """
+        if self._flusher is not None and not self._flusher.done():
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._closing = False
+        self._flusher = asyncio.create_task(self._run())
+
+    async def submit(self, token: str, record: Dict[str, Any]) -> bool:
+        """
+        사용량 이벤트를 큐에 적재합니다. 적재되지 못하고 폐기되면 False를 반환합니다.
+        """
+        if self._closing:
+            self.dropped += 1
+            return False
+        self.start()
+
+        item = (token, record, 0)
+        try:
+            if self.overflow_policy == self.OVERFLOW_BLOCK:
+                # 백프레셔: 큐에 자리가 날 때까지 제한 시간 동안 대기
+                await asyncio.wait_for(self._queue.put(item), timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self.dropped += 1
+            logger.warning("사용량 큐가 가득 차 이벤트를 폐기했습니다.")
+            return False
+
+        self.enqueued += 1
+        return True
+
+    async def _run(self) -> None:
+        """
+        큐에서 이벤트를 모아 배치 단위로 전송합니다.
+        """
+        while True:
+            batch = await self._collect_batch()
+            if batch:
+                if await self._flush(batch):
+                    # 재시도할 이벤트가 있으면 바로 다시 보내지 않도록 한 주기 대기
+                    await asyncio.sleep(self.flush_interval)
+            elif self._closing:
+                return
+
+    async def _collect_batch(self) -> List[Tuple[str, Dict[str, Any], int]]:
+        """
+        batch_size개가 모이거나 flush_interval이 지날 때까지 이벤트를 수집합니다.
+        """
+        batch: List[Tuple[str, Dict[str, Any], int]] = []
+        try:
+            # 첫 이벤트는 flush_interval 동안만 대기 (종료 신호 확인 주기)
+            batch.append(await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval))
+        except asyncio.TimeoutError:
+            return batch
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            # 이미 쌓인 이벤트는 대기 없이 가져옴
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: List[Tuple[str, Dict[str, Any], int]]) -> bool:
+        """
+        배치를 토큰별로 묶어 백엔드에 전송합니다. 다시 큐에 넣은 이벤트가 있으면 True를 반환합니다.
+        """
+        by_token: Dict[str, List[Tuple[Dict[str, Any], int]]] = defaultdict(list)
+        for token, record, attempts in batch:
+            by_token[token].append((record, attempts))
+
+        start_time = time.monotonic()
+        requeued = False
+        for token, items in by_token.items():
+            errors = await self.backend.log_api_usage_records(token=token, records=[record for record, _ in items])
+            lost = 0
+            last_error: Optional[Exception] = None
+            for (record, attempts), error in zip(items, errors):
+                if error is None:
+                    self.flushed += 1
+                    continue
+                # 일시적 오류는 큐에 다시 넣어 재시도 (전송 실패는 사용자 응답에 영향을 주지 않도록 처리)
+                if (
+                    self.backend.is_retryable_error(error)
+                    and attempts + 1 < self.max_attempts
+                    and self._requeue((token, record, attempts + 1))
+                ):
+                    self.retried += 1
+                    requeued = True
+                else:
+                    lost += 1
+                    last_error = error
+            if lost:
+                self.failed += lost
+                logger.error(f"사용량 이벤트 {lost}건 전송 실패로 폐기: {str(last_error)}")
+
+        self.last_flush_latency = time.monotonic() - start_time
+        self.total_flush_latency += self.last_flush_latency
+        self.batches += 1
+        return requeued
+
+    def _requeue(self, item: Tuple[str, Dict[str, Any], int]) -> bool:
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        남은 이벤트를 모두 전송한 뒤 플러셔를 종료합니다.
+        """
+        self._closing = True
+        if self._flusher is None:
+            return
+        try:
+            await asyncio.wait_for(self._flusher, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._flusher.cancel()
+            logger.error(f"사용량 큐 종료 시간 초과: 미전송 이벤트 {self.queue_depth}건")
+        self._flusher = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        파이프라인 통계를 반환합니다.
+        """
+        return {
+            "queue_depth": self.queue_depth,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "batches": self.batches,
+            "last_flush_latency": self.last_flush_latency,
+            "avg_flush_latency": (self.total_flush_latency / self.batches) if self.batches else 0.0,
+        }
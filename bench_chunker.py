@@ -0,0 +1,92 @@
+import argparse
+import random
+import statistics
+import time
+
+from app.services.chunker import TokenChunker
+from app.services.ingestion import SECTION_CHARS, iter_chunks
+from app.services.tokens import TokenCounter
+
+# 청킹 처리량 벤치마크 (대용량 한국어 코퍼스)
+# 토큰 기준 TokenChunker와 문자 기준 RecursiveCharacterTextSplitter의 처리 속도(MB/sec)와
+# 청크 토큰 수 분포(고를수록 컨텍스트 예산/임베딩 호출 낭비가 적음)를 비교합니다.
+# 인덱싱 파이프라인과 같이 섹션 단위(iter_chunks)로 입력합니다.
+# 사용법: python bench_chunker.py --mb 50
+#         python bench_chunker.py --file corpus_ko.txt --chunk-tokens 500 --overlap-tokens 50
+
+SENTENCES = [
+    "임직원의 연차 휴가는 입사일을 기준으로 매년 15일이 부여됩니다.",
+    "출장비 정산은 출장 종료 후 7영업일 이내에 증빙 서류와 함께 신청해야 합니다.",
+    "보안 정책에 따라 외부 저장 매체의 사용은 사전 승인을 받은 경우에만 허용됩니다.",
+    "신규 프로젝트의 예산은 분기별 검토 회의에서 확정되며, 변경 시 재승인이 필요합니다.",
+    "The quarterly report must include revenue, operating costs, and headcount changes.",
+    "재택근무 신청은 팀장 승인 후 인사 시스템에서 처리됩니다.",
+    "고객 데이터는 암호화하여 저장하고, 접근 기록은 1년간 보관합니다.",
+    "API 호출 한도는 조직별로 분당 600회이며, 초과 시 429 응답이 반환됩니다.",
+]
+
+
+def make_corpus(size_mb: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    parts, size = [], 0
+    while size < target:
+        paragraph = " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(2, 8)))
+        text = paragraph + ("\n\n" if rng.random() < 0.7 else "\n")
+        parts.append(text)
+        size += len(text.encode("utf-8"))
+    return "".join(parts)
+
+
+def sections(text: str):
+    for start in range(0, len(text), SECTION_CHARS):
+        yield text[start:start + SECTION_CHARS]
+
+
+def run(name: str, splitter, text: str, encoding) -> None:
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    start = time.perf_counter()
+    chunks = list(iter_chunks(sections(text), splitter))
+    elapsed = time.perf_counter() - start
+
+    # 분포 측정은 처리 시간에 포함하지 않음
+    lengths = [len(tokens) for tokens in encoding.encode_ordinary_batch(chunks)]
+    print(
+        f"{name:<10} {size_mb / elapsed:7.2f} MB/s  chunks={len(chunks):7d}  "
+        f"tokens mean={statistics.mean(lengths):6.1f} stdev={statistics.pstdev(lengths):6.1f} "
+        f"min={min(lengths):4d} max={max(lengths):5d}"
+    )
+
+
+def main(args) -> None:
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = make_corpus(args.mb)
+    print(f"corpus={len(text.encode('utf-8')) / (1024 * 1024):.1f} MB, model={args.model}, "
+          f"chunk_tokens={args.chunk_tokens}, overlap_tokens={args.overlap_tokens}")
+
+    encoding = TokenCounter().encoding_for(args.model)
+    run("token", TokenChunker(encoding, args.chunk_tokens, args.overlap_tokens), text, encoding)
+
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    except ImportError:
+        print("langchain이 설치되어 있지 않아 문자 기준 분할기 비교를 건너뜁니다.")
+        return
+    splitter = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    run("character", splitter, text, encoding)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=50.0, help="생성할 코퍼스 크기 (MB)")
+    parser.add_argument("--file", default=None, help="코퍼스 파일 (지정 시 생성하지 않음)")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--chunk-tokens", type=int, default=500)
+    parser.add_argument("--overlap-tokens", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="문자 기준 분할기 청크 크기")
+    parser.add_argument("--chunk-overlap", type=int, default=200, help="문자 기준 분할기 겹침 크기")
+    args = parser.parse_args()
+    main(args)
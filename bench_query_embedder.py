@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import hashlib
+import random
+import statistics
+import time
+
+from app.services.embedding_batcher import EmbeddingBatcher
+
+# 질의 임베딩 마이크로 배칭 벤치마크 (가짜 임베딩 백엔드)
+# 동시 검색마다 임베딩을 따로 호출하는 방식과 EmbeddingBatcher를 비교합니다.
+# 백엔드는 호출당 고정 지연 + 항목당 지연을 가지며, 동시 호출 수가 제한됩니다. (커넥션 풀/요청 한도)
+# 사용법: python bench_query_embedder.py --requests 2000 --concurrency 50 --latency 0.03
+#         python bench_query_embedder.py --base-url http://127.0.0.1:8900/v1  (fake_openai_server.py 사용)
+
+EMBEDDING_DIM = 1536
+
+
+class FakeEmbeddingBackend:
+    """
+    embed_documents 호출 비용을 흉내 내는 가짜 임베딩 백엔드
+    """
+
+    def __init__(self, latency: float, per_item_latency: float, max_concurrency: int):
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.calls = 0
+
+    async def aembed_documents(self, texts):
+        async with self.semaphore:
+            self.calls += 1
+            await asyncio.sleep(self.latency + self.per_item_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+    @staticmethod
+    def _vector(text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+        rng = random.Random(seed)
+        return [rng.uniform(-1.0, 1.0) for _ in range(EMBEDDING_DIM)]
+
+
+class CountingEmbeddings:
+    """
+    실제 임베딩 클라이언트(가짜 서버 대상)의 호출 수를 세는 래퍼
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.calls = 0
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text):
+        self.calls += 1
+        return await self.embeddings.aembed_query(text)
+
+
+async def run_load(embed, num_requests: int, concurrency: int, distinct_queries: int):
+    latencies = []
+    counter = iter(range(num_requests))
+
+    async def worker():
+        for i in counter:
+            query = f"검색 질의 {i % distinct_queries}: 사내 휴가 규정과 출장비 정산 기준"
+            start = time.perf_counter()
+            await embed(query)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+def report(name: str, elapsed: float, latencies, calls: int) -> None:
+    latencies = sorted(latencies)
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:<10} calls={calls:6d}  throughput={len(latencies) / elapsed:9,.0f} req/s  "
+        f"p50={quantiles[49] * 1000:7.1f} ms  p95={quantiles[94] * 1000:7.1f} ms  p99={quantiles[98] * 1000:7.1f} ms"
+    )
+
+
+def make_backend(args):
+    if args.base_url:
+        from langchain_openai import OpenAIEmbeddings
+
+        return CountingEmbeddings(OpenAIEmbeddings(
+            model="text-embedding-ada-002",
+            openai_api_key="sk-fake-benchmark-key",
+            openai_api_base=args.base_url,
+        ))
+    return FakeEmbeddingBackend(args.latency, args.per_item_latency, args.backend_concurrency)
+
+
+async def run(args) -> None:
+    print(f"{args.requests} requests, concurrency={args.concurrency}, window={args.window}s, "
+          f"max_batch={args.max_batch_size}, backend={'fake server ' + args.base_url if args.base_url else 'in-process fake'}")
+
+    backend = make_backend(args)
+    elapsed, latencies = await run_load(backend.aembed_query, args.requests, args.concurrency, args.distinct)
+    report("direct", elapsed, latencies, backend.calls)
+
+    backend = make_backend(args)
+    batcher = EmbeddingBatcher(
+        backend,
+        window=args.window,
+        max_batch_size=args.max_batch_size,
+        max_concurrency=args.batch_concurrency,
+    )
+    elapsed, latencies = await run_load(batcher.aembed_query, args.requests, args.concurrency, args.distinct)
+    await batcher.close()
+    report("batched", elapsed, latencies, backend.calls)
+    stats = batcher.stats()
+    print(f"           avg_batch_size={stats['avg_batch_size']:.1f}  max_batch_size={stats['max_batch_size']}  "
+          f"deduplicated={stats['deduplicated']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50, help="동시 검색 수")
+    parser.add_argument("--distinct", type=int, default=100000, help="서로 다른 질의 수 (작을수록 중복 질의가 많음)")
+    parser.add_argument("--latency", type=float, default=0.03, help="백엔드 호출당 지연 (초)")
+    parser.add_argument("--per-item-latency", type=float, default=0.0002, help="백엔드 항목당 추가 지연 (초)")
+    parser.add_argument("--backend-concurrency", type=int, default=8, help="백엔드 동시 호출 한도")
+    parser.add_argument("--window", type=float, default=0.005)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--batch-concurrency", type=int, default=4)
+    parser.add_argument("--base-url", default=None, help="가짜 OpenAI 서버 주소 (지정 시 실제 임베딩 클라이언트 사용)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
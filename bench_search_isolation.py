@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+# 검색 부하 격리 부하 테스트 (실행 중인 서버 대상)
+# /chat/stream 지연(첫 바이트/전체)을 검색 부하 없이 한 번, /knowledge/search 부하를 걸고 한 번 측정해 비교합니다.
+# Chroma 호출과 임베딩이 이벤트 루프를 막으면 검색 부하 중 스트림의 첫 바이트 지연이 크게 늘어납니다.
+# 사용법: python fake_openai_server.py --port 8900 --latency 0.2  (앱은 OPENAI_API_BASE=http://127.0.0.1:8900/v1)
+#         python bench_search_isolation.py --url http://127.0.0.1:8000/api/v1 --streams 200 --search-concurrency 50
+
+CHAT_PAYLOAD = {
+    "messages": [{"role": "user", "content": "사내 휴가 규정을 간단히 요약해 주세요."}],
+    "model": "gpt-4o",
+    "max_tokens": 64,
+}
+
+
+async def stream_chat(client: httpx.AsyncClient, headers):
+    start = time.perf_counter()
+    first_byte = None
+    async with client.stream("POST", "/chat/stream", json=CHAT_PAYLOAD, headers=headers) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+    return first_byte or 0.0, time.perf_counter() - start
+
+
+async def run_streams(client: httpx.AsyncClient, headers, num_streams: int, concurrency: int):
+    ttfb, totals, errors = [], [], 0
+    counter = iter(range(num_streams))
+
+    async def worker():
+        nonlocal errors
+        for _ in counter:
+            try:
+                first_byte, total = await stream_chat(client, headers)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            ttfb.append(first_byte)
+            totals.append(total)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return ttfb, totals, errors
+
+
+async def search_load(client: httpx.AsyncClient, headers, concurrency: int, stop: asyncio.Event):
+    done, errors = 0, 0
+
+    async def worker(worker_id: int):
+        nonlocal done, errors
+        i = 0
+        while not stop.is_set():
+            payload = {"query": f"출장비 정산 기준 {worker_id}-{i}", "limit": 10}
+            i += 1
+            try:
+                response = await client.post("/knowledge/search", json=payload, headers=headers)
+                response.raise_for_status()
+                done += 1
+            except httpx.HTTPError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return done, errors, time.perf_counter() - start
+
+
+def report(name: str, ttfb, totals, errors: int) -> None:
+    if len(ttfb) < 2:
+        print(f"{name:<14} 측정값 부족 (성공 {len(ttfb)}건, 오류 {errors}건)")
+        return
+    first = statistics.quantiles(ttfb, n=100)
+    whole = statistics.quantiles(totals, n=100)
+    print(
+        f"{name:<14} n={len(ttfb):5d} errors={errors:4d}  "
+        f"ttfb p50={first[49] * 1000:7.1f} p95={first[94] * 1000:7.1f} p99={first[98] * 1000:7.1f} ms  "
+        f"total p50={whole[49] * 1000:7.1f} p95={whole[94] * 1000:7.1f} ms"
+    )
+
+
+async def run(args) -> None:
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    limits = httpx.Limits(max_connections=args.stream_concurrency + args.search_concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60.0) as client:
+        print(f"{args.streams} streams (concurrency={args.stream_concurrency}), "
+              f"search concurrency={args.search_concurrency}, target={args.url}")
+
+        ttfb, totals, errors = await run_streams(client, headers, args.streams, args.stream_concurrency)
+        report("stream only", ttfb, totals, errors)
+
+        stop = asyncio.Event()
+        searches = asyncio.ensure_future(search_load(client, headers, args.search_concurrency, stop))
+        await asyncio.sleep(args.warmup)
+        ttfb, totals, errors = await run_streams(client, headers, args.streams, args.stream_concurrency)
+        stop.set()
+        done, search_errors, elapsed = await searches
+        report("with search", ttfb, totals, errors)
+        print(f"{'':<14} searches={done} ({done / elapsed:,.0f} req/s) search_errors={search_errors}")
+
+        response = await client.get(args.metrics_path, headers=headers)
+        if response.status_code == 200:
+            stages = response.json().get("document_search", {}).get("stages", {})
+            for stage, values in stages.items():
+                print(f"{'':<14} {stage:<15} avg={values['avg'] * 1000:7.2f} ms  max={values['max'] * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000/api/v1", help="API 기본 주소")
+    parser.add_argument("--token", default=None, help="Bearer 토큰 (인증 우회 모드면 생략)")
+    parser.add_argument("--streams", type=int, default=200, help="단계별 스트리밍 요청 수")
+    parser.add_argument("--stream-concurrency", type=int, default=20)
+    parser.add_argument("--search-concurrency", type=int, default=50, help="동시 검색 수")
+    parser.add_argument("--warmup", type=float, default=1.0, help="검색 부하 시작 후 측정까지 대기 (초)")
+    parser.add_argument("--metrics-path", default="http://127.0.0.1:8000/metrics", help="검색 단계별 시간 통계 주소")
+    args = parser.parse_args()
+    asyncio.run(run(args))
@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+
+from app.services.sse import DONE_FRAME, SSEFrameWriter, orjson
+
+# SSE 프레임 병합 벤치마크
+# 델타마다 프레임을 쓰는 기존 방식과 SSEFrameWriter를 비교합니다.
+# 프레임마다 소켓에 한 번씩 쓰므로 write 수가 곧 send 시스템 콜 수입니다.
+# 사용법: python bench_sse_frames.py --tokens 1000 --streams 20 --interval 0.002
+
+DELTAS = ["안녕", "하세요", ",", " 스트", "리밍", " 응답", "입니다", ".", " This", " is", " a", " token", "."]
+
+
+async def upstream(num_tokens: int, interval: float):
+    """
+    interval 간격으로 델타를 내보내는 가짜 업스트림
+    """
+    for i in range(num_tokens):
+        if interval:
+            await asyncio.sleep(interval)
+        yield DELTAS[i % len(DELTAS)]
+
+
+def start_drain(sock: socket.socket) -> threading.Thread:
+    def drain():
+        while sock.recv(65536):
+            pass
+
+    thread = threading.Thread(target=drain, daemon=True)
+    thread.start()
+    return thread
+
+
+async def run_baseline(writer_sock: socket.socket, num_tokens: int, interval: float):
+    """
+    업스트림을 읽기만 하는 기준선 (가짜 업스트림 자체 비용)
+    """
+    async for _delta in upstream(num_tokens, interval):
+        pass
+    return 0
+
+
+async def run_legacy(writer_sock: socket.socket, num_tokens: int, interval: float):
+    loop = asyncio.get_running_loop()
+    writes = 0
+    async for delta in upstream(num_tokens, interval):
+        frame = f"data: {json.dumps({'content': delta})}\n\n".encode("utf-8")
+        await loop.sock_sendall(writer_sock, frame)
+        writes += 1
+    await loop.sock_sendall(writer_sock, b"data: [DONE]\n\n")
+    return writes + 1
+
+
+async def run_coalesced(writer_sock: socket.socket, num_tokens: int, interval: float, window: float, max_bytes: int):
+    loop = asyncio.get_running_loop()
+    frame_writer = SSEFrameWriter(window=window, max_bytes=max_bytes)
+    writes = 0
+    async for frame in frame_writer.coalesce(upstream(num_tokens, interval)):
+        await loop.sock_sendall(writer_sock, frame)
+        writes += 1
+    await loop.sock_sendall(writer_sock, DONE_FRAME)
+    return writes + 1
+
+
+async def measure(name: str, factory, streams: int, num_tokens: int) -> None:
+    writer_sock, reader_sock = socket.socketpair()
+    writer_sock.setblocking(False)
+    start_drain(reader_sock)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    writes = 0
+    for _ in range(streams):
+        writes += await factory(writer_sock)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    writer_sock.close()
+    print(
+        f"{name:<28} cpu/stream={cpu / streams * 1000:8.2f} ms  "
+        f"writes/stream={writes / streams:8.1f}  "
+        f"tokens/sec={num_tokens * streams / wall:10,.0f}"
+    )
+
+
+async def run(num_tokens: int, streams: int, interval: float, window: float, max_bytes: int) -> None:
+    print(f"serializer: {'orjson' if orjson is not None else 'json (stdlib)'}, "
+          f"{num_tokens} deltas x {streams} streams, interval={interval}s, window={window}s")
+    await measure("upstream only (baseline)", lambda sock: run_baseline(sock, num_tokens, interval), streams, num_tokens)
+    await measure("legacy (frame per delta)", lambda sock: run_legacy(sock, num_tokens, interval), streams, num_tokens)
+    await measure(
+        "SSEFrameWriter",
+        lambda sock: run_coalesced(sock, num_tokens, interval, window, max_bytes),
+        streams,
+        num_tokens,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=1000, help="스트림당 델타 수")
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.002, help="업스트림 델타 간격 (초)")
+    parser.add_argument("--window", type=float, default=0.02)
+    parser.add_argument("--max-bytes", type=int, default=512)
+    args = parser.parse_args()
+    asyncio.run(run(args.tokens, args.streams, args.interval, args.window, args.max_bytes))
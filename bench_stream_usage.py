@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+import tiktoken
+
+from app.schemas.chat import ChatMessage
+from app.services.chat import ChatService
+
+# 스트리밍 사용량 계산 처리량 벤치마크 (네트워크 없이 generate_stream 루프 비용만 측정)
+# 사용법: python bench_stream_usage.py --tokens 2000 --streams 50
+
+SAMPLE_TEXT = (
+    "스트리밍 응답은 토큰 단위로 전달됩니다. Each delta usually carries a single token, "
+    "so encoding every fragment again on the event loop is wasted work. "
+    "한국어와 영어가 섞인 응답에서도 처리량을 비교합니다. "
+)
+
+
+class FakeStream:
+    """
+    미리 만든 청크를 순서대로 돌려주는 가짜 OpenAI 스트림
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeOpenAIClient:
+    """
+    chat.completions.create(stream=True)만 흉내 내는 가짜 클라이언트
+    """
+
+    base_url = "http://fake/v1/"
+
+    def __init__(self, deltas, include_usage: bool):
+        self.deltas = deltas
+        self.include_usage = include_usage
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        chunks = [
+            SimpleNamespace(
+                id="chatcmpl-bench",
+                usage=None,
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))],
+            )
+            for delta in self.deltas
+        ]
+        if self.include_usage and kwargs.get("stream_options"):
+            chunks.append(SimpleNamespace(
+                id="chatcmpl-bench",
+                usage=SimpleNamespace(prompt_tokens=20, completion_tokens=len(self.deltas)),
+                choices=[],
+            ))
+        return FakeStream(chunks)
+
+
+def make_deltas(num_tokens: int):
+    encoding = tiktoken.encoding_for_model("gpt-4o")
+    tokens = encoding.encode(SAMPLE_TEXT * (num_tokens // 40 + 1))[:num_tokens]
+    return [encoding.decode([token]) for token in tokens]
+
+
+def bench_per_delta_encoding(deltas, streams: int) -> float:
+    """
+    기존 방식: 델타마다 tiktoken 인코딩
+    """
+    encoding = tiktoken.encoding_for_model("gpt-4o")
+    start = time.perf_counter()
+    for _ in range(streams):
+        completion_tokens = 0
+        for delta in deltas:
+            completion_tokens += len(encoding.encode(delta))
+    return time.perf_counter() - start
+
+
+async def bench_generate_stream(deltas, streams: int, include_usage: bool) -> float:
+    service = ChatService(openai_client=FakeOpenAIClient(deltas, include_usage), doc_service=object())
+    messages = [ChatMessage(role="user", content="벤치마크 질문입니다.")]
+    start = time.perf_counter()
+    for _ in range(streams):
+        async for _frame in service.generate_stream(messages, model="gpt-4o"):
+            pass
+    return time.perf_counter() - start
+
+
+async def run(num_tokens: int, streams: int) -> None:
+    deltas = make_deltas(num_tokens)
+    total = num_tokens * streams
+
+    legacy = bench_per_delta_encoding(deltas, streams)
+    with_usage = await bench_generate_stream(deltas, streams, include_usage=True)
+    estimated = await bench_generate_stream(deltas, streams, include_usage=False)
+
+    print(f"deltas per stream:               {num_tokens} x {streams} streams")
+    print(f"per-delta encode only (legacy):  {total / legacy:,.0f} tokens/sec (encode cost alone)")
+    print(f"generate_stream + usage chunk:   {total / with_usage:,.0f} tokens/sec")
+    print(f"generate_stream + estimator:     {total / estimated:,.0f} tokens/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=2000, help="스트림당 델타 수")
+    parser.add_argument("--streams", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.tokens, args.streams))
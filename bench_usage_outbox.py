@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.services.outbox import UsageOutbox
+
+# 사용량 아웃박스 처리량 벤치마크
+# 사용법: python bench_usage_outbox.py --events 100000 --backend-latency 0.005
+
+
+class StubBackend:
+    """
+    지연 시간만 흉내 내는 가짜 백엔드
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.records = 0
+        self.requests = 0
+
+    async def log_api_usage_records(self, token, records):
+        await asyncio.sleep(self.latency)
+        self.requests += 1
+        self.records += len(records)
+        return [None] * len(records)
+
+    @staticmethod
+    def is_retryable_error(error):
+        return True
+
+
+def make_record(i: int) -> dict:
+    return {
+        "userId": i % 50,
+        "orgId": i % 5,
+        "apiType": "chat",
+        "tokensUsed": 1200,
+        "estimatedCost": 0.0024,
+        "metadata": {"model": "gpt-4o", "prompt_tokens": 1000, "completion_tokens": 200, "request_id": f"chatcmpl-{i}"},
+    }
+
+
+async def run(events: int, backend_latency: float, batch_size: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = StubBackend(backend_latency)
+        outbox = UsageOutbox(
+            backend,
+            service_token="service-token",
+            path=os.path.join(tmp, "usage_outbox.db"),
+            batch_size=batch_size,
+            poll_interval=0.05,
+        )
+        outbox.start()
+
+        # 1) 이벤트 적재 (이벤트 루프 측 비용)
+        start = time.perf_counter()
+        for i in range(events):
+            await outbox.submit(f"token-{i % 3}", make_record(i))
+        submit_elapsed = time.perf_counter() - start
+
+        # 2) 디스크 커밋 완료까지
+        while outbox.appended < events:
+            await asyncio.sleep(0.001)
+        commit_elapsed = time.perf_counter() - start
+
+        # 3) 백엔드 전송 완료까지
+        while backend.records < events:
+            await asyncio.sleep(0.01)
+        replay_elapsed = time.perf_counter() - start
+
+        await outbox.stop()
+
+        print(f"events:            {events}")
+        print(f"submit:            {events / submit_elapsed:,.0f} events/sec (event loop)")
+        print(f"durable commit:    {events / commit_elapsed:,.0f} events/sec ({outbox.commits} group commits)")
+        print(f"end-to-end replay: {events / replay_elapsed:,.0f} events/sec ({backend.requests} batch POSTs)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--backend-latency", type=float, default=0.005)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.events, args.backend_latency, args.batch_size))
@@ -0,0 +1,208 @@
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 로컬 테스트용 가짜 OpenAI 호환 서버
+# 사용법: python fake_openai_server.py --port 8900 --latency 0.2 --rate-limit-ratio 0.1 --error-ratio 0.05
+# 앱 실행 시 OPENAI_API_BASE=http://127.0.0.1:8900/v1 로 지정합니다.
+
+EMBEDDING_DIM = 1536
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    /v1/chat/completions (스트리밍/비스트리밍)와 /v1/embeddings를 흉내 내는 핸들러
+    """
+
+    # 서버 옵션 (main에서 설정)
+    latency = 0.1
+    latency_jitter = 0.05
+    rate_limit_ratio = 0.0
+    error_ratio = 0.0
+    retry_after = 1.0
+    stream_tokens = 50
+    stream_interval = 0.01
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # 요청마다 출력하지 않음
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("x-ratelimit-remaining-requests", str(random.randint(100, 1000)))
+        self.send_header("x-ratelimit-remaining-tokens", str(random.randint(10000, 100000)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _inject_failure(self) -> bool:
+        """
+        설정된 비율로 429/5xx 오류를 응답합니다.
+        """
+        roll = random.random()
+        if roll < self.rate_limit_ratio:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"retry-after": str(self.retry_after)}
+            )
+            return True
+        if roll < self.rate_limit_ratio + self.error_ratio:
+            self._send_json(500, {"error": {"message": "The server had an error", "type": "server_error"}})
+            return True
+        return False
+
+    def _sleep_latency(self) -> None:
+        time.sleep(max(0.0, self.latency + random.uniform(-self.latency_jitter, self.latency_jitter)))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON", "type": "invalid_request_error"}})
+            return
+
+        if self.path.endswith("/chat/completions"):
+            self._sleep_latency()
+            if self._inject_failure():
+                return
+            if body.get("stream"):
+                self._stream_completion(body)
+            else:
+                self._completion(body)
+        elif self.path.endswith("/embeddings"):
+            self._sleep_latency()
+            if self._inject_failure():
+                return
+            self._embeddings(body)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def _completion(self, body: dict) -> None:
+        prompt_tokens = sum(len(m.get("content") or "") // 4 + 3 for m in body.get("messages", []))
+        completion_tokens = self.stream_tokens
+        self._send_json(200, {
+            "id": f"chatcmpl-fake-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "토큰 " * completion_tokens},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _stream_completion(self, body: dict) -> None:
+        completion_id = f"chatcmpl-fake-{uuid.uuid4().hex}"
+        model = body.get("model", "gpt-4o")
+        prompt_tokens = sum(len(m.get("content") or "") // 4 + 3 for m in body.get("messages", []))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_chunk(choices, usage=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices,
+            }
+            if usage is not None:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            for _ in range(self.stream_tokens):
+                send_chunk([{"index": 0, "delta": {"content": "토큰 "}, "finish_reason": None}])
+                if self.stream_interval:
+                    time.sleep(self.stream_interval)
+            send_chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (body.get("stream_options") or {}).get("include_usage"):
+                send_chunk([], usage={
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": self.stream_tokens,
+                    "total_tokens": prompt_tokens + self.stream_tokens,
+                })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 클라이언트가 스트림을 중단함
+            pass
+
+    def _embeddings(self, body: dict) -> None:
+        inputs = body.get("input", [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            # 단일 문자열 또는 단일 토큰 배열
+            inputs = [inputs]
+        data = []
+        for index, item in enumerate(inputs):
+            rng = random.Random(json.dumps(item, ensure_ascii=False))
+            data.append({
+                "object": "embedding",
+                "index": index,
+                "embedding": [rng.uniform(-1.0, 1.0) for _ in range(EMBEDDING_DIM)],
+            })
+        self._send_json(200, {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.1, help="응답 지연 (초)")
+    parser.add_argument("--latency-jitter", type=float, default=0.05)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="429 응답 비율")
+    parser.add_argument("--error-ratio", type=float, default=0.0, help="500 응답 비율")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 응답의 Retry-After (초)")
+    parser.add_argument("--stream-tokens", type=int, default=50)
+    parser.add_argument("--stream-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    FakeOpenAIHandler.latency = args.latency
+    FakeOpenAIHandler.latency_jitter = args.latency_jitter
+    FakeOpenAIHandler.rate_limit_ratio = args.rate_limit_ratio
+    FakeOpenAIHandler.error_ratio = args.error_ratio
+    FakeOpenAIHandler.retry_after = args.retry_after
+    FakeOpenAIHandler.stream_tokens = args.stream_tokens
+    FakeOpenAIHandler.stream_interval = args.stream_interval
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    print(f"fake OpenAI server: http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()